@@ -0,0 +1,178 @@
+# app/audit.py
+"""Buffered writer for the audit_logs collection.
+
+Mutations that don't need their audit entry committed atomically hand it to
+``AuditWriter.add`` and return immediately; a background thread writes the
+queued entries as Firestore batches once ``batch_size`` entries are waiting
+or ``flush_interval`` seconds have passed. When the buffer is full, callers
+block for up to ``put_timeout`` seconds and then write their entry
+synchronously, so a slow backend slows callers down instead of dropping
+entries or growing memory without bound.
+"""
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "audit_logs"
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        get_client,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 5000,
+        put_timeout: float = 0.5,
+        max_attempts: int = 3,
+    ):
+        self._get_client = get_client
+        self.batch_size = max(1, min(int(batch_size), 500))
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # guards _closed and counts add() calls still putting an entry, so
+        # close() doesn't stop the thread under an entry being queued
+        self._state = threading.Condition()
+        self._closed = False
+        self._adding = 0
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.sync_writes = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    def add(self, entry: dict):
+        """Queue ``entry``; falls back to a synchronous write when full.
+
+        After ``close()`` entries are written synchronously.
+        """
+        with self._state:
+            closed = self._closed
+            if not closed:
+                self._adding += 1
+        if closed:
+            self.write_now(entry)
+            return
+        try:
+            self._ensure_started()
+            self._queue.put(entry, timeout=self.put_timeout)
+            self.enqueued += 1
+            if self._queue.qsize() >= self.batch_size:
+                self._wake.set()
+        except queue.Full:
+            log.warning("Audit buffer full; writing entry synchronously")
+            self.write_now(entry)
+        finally:
+            with self._state:
+                self._adding -= 1
+                self._state.notify_all()
+
+    def write_now(self, entry: dict):
+        """Write a single entry immediately (strict mode)."""
+        client = self._get_client()
+        if client is None:
+            raise RuntimeError(
+                "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
+            )
+        client.collection(AUDIT_COLLECTION).add(entry)
+        self.sync_writes += 1
+
+    def _drain(self, limit: int) -> list:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _commit(self, entries: list):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                client = self._get_client()
+                if client is None:
+                    raise RuntimeError("Firestore client unavailable")
+                batch = client.batch()
+                collection = client.collection(AUDIT_COLLECTION)
+                for entry in entries:
+                    batch.set(collection.document(), entry)
+                batch.commit()
+                self.written += len(entries)
+                return
+            except Exception as e:
+                log.warning(
+                    "Audit flush of %d entries failed (attempt %d/%d): %s",
+                    len(entries), attempt, self.max_attempts, e,
+                )
+                if attempt < self.max_attempts:
+                    time.sleep(min(2.0, 0.1 * 2 ** attempt))
+        self.failed += len(entries)
+        log.error("Dropped %d audit entries after retries", len(entries))
+
+    def _flush_pending(self):
+        while True:
+            entries = self._drain(self.batch_size)
+            if entries:
+                self._commit(entries)
+            if len(entries) < self.batch_size:
+                return
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self._flush_pending()
+            if self._stopping.is_set() and self._queue.empty():
+                return
+
+    def close(self, timeout: float = 5.0) -> bool:
+        """Write everything queued so far and stop the background thread.
+
+        Returns False if entries were still pending when ``timeout`` expired.
+        Entries added afterwards are written synchronously.
+        """
+        deadline = time.monotonic() + timeout
+        with self._state:
+            self._closed = True
+            self._state.wait_for(
+                lambda: self._adding == 0,
+                max(0.0, deadline - time.monotonic()),
+            )
+        timeout = max(0.0, deadline - time.monotonic())
+        self._stopping.set()
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._flush_pending()
+            return self._queue.empty()
+        self._wake.set()
+        thread.join(timeout)
+        return self._queue.empty()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "syncWrites": self.sync_writes,
+            "failed": self.failed,
+        }
@@ -1,7 +1,10 @@
 # app/auth.py
 from fastapi import Header, HTTPException
+import hashlib
 import os
-from .config import FIREBASE_SERVICE_ACCOUNT
+import time
+from .cache import TTLCache
+from .config import FIREBASE_SERVICE_ACCOUNT, TOKEN_CACHE_MAX_ENTRIES
 
 # Try to import firebase_admin lazily and tolerate environments where
 # dependencies are unavailable (e.g., incompatible Python on Render).
@@ -42,6 +45,25 @@ if _FIREBASE_IMPORTED:
 else:
     FIREBASE_ADMIN_AVAILABLE = False
 
+# Decoded tokens keyed by sha256(id_token); the raw token is never stored.
+# Entries expire at the token's own `exp` claim so caching never extends a
+# token's lifetime.
+_token_cache = (
+    TTLCache(max_entries=TOKEN_CACHE_MAX_ENTRIES)
+    if TOKEN_CACHE_MAX_ENTRIES > 0 else None
+)
+
+
+def _token_cache_key(id_token: str) -> str:
+    return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+
+def token_cache_stats() -> dict:
+    """Return hit/miss counters for the verified-token cache."""
+    if _token_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_token_cache.stats()}
+
 
 def verify_firebase_token(authorization: str = Header(...)):
     """Verify firebase bearer token and return decoded token.
@@ -60,9 +82,17 @@ def verify_firebase_token(authorization: str = Header(...)):
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid auth header")
     id_token = authorization.split(" ")[1]
+    key = _token_cache_key(id_token) if _token_cache is not None else None
+    if key is not None:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            return dict(cached)
     try:
         decoded = fb_auth.verify_id_token(id_token)  # type: ignore[union-attr]
-        return decoded
     except Exception as e:
         msg = f"Token verify failed: {e}"
         raise HTTPException(status_code=401, detail=msg)
+    exp = decoded.get("exp")
+    if key is not None and isinstance(exp, (int, float)) and exp > time.time():
+        _token_cache.set(key, dict(decoded), expires_at=float(exp))
+    return decoded
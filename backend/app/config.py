@@ -31,3 +31,180 @@ if _SMTP_PASSWORD_RAW:
     SMTP_PASSWORD = _SMTP_PASSWORD_RAW.replace(" ", "")
 else:
     SMTP_PASSWORD = ""
+
+# Verified Firebase ID tokens are cached per worker until their `exp` claim
+# so repeated dashboard calls skip signature verification. Set to 0 to
+# disable the cache.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "2048"))
+
+# Per-worker read-through cache for scl_students / colleges documents.
+# Entries are refreshed on every write made through db.py; writes made by
+# other workers become visible once the TTL lapses.
+ENTITY_CACHE_MAX_ENTRIES = int(os.getenv("ENTITY_CACHE_MAX_ENTRIES", "5000"))
+ENTITY_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL_SECONDS", "30"))
+# Short-lived negative entries so repeated lookups of missing ids are cheap.
+ENTITY_CACHE_MISS_TTL_SECONDS = float(
+    os.getenv("ENTITY_CACHE_MISS_TTL_SECONDS", "5")
+)
+
+# Bulk student import (/admin/create-bulk): rows per Firestore write batch
+# (capped at 500 by Firestore) and how many batches commit in parallel.
+BULK_WRITE_BATCH_SIZE = min(
+    500, max(1, int(os.getenv("BULK_WRITE_BATCH_SIZE", "400")))
+)
+BULK_WRITE_CONCURRENCY = max(1, int(os.getenv("BULK_WRITE_CONCURRENCY", "4")))
+
+# Audit log writes: "buffered" queues entries and writes them in batches off
+# the request path; "strict" commits them with the change itself. Call sites
+# may override the default.
+AUDIT_LOG_MODE = os.getenv("AUDIT_LOG_MODE", "buffered").lower()
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(
+    os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0")
+)
+AUDIT_MAX_PENDING = int(os.getenv("AUDIT_MAX_PENDING", "5000"))
+
+# Document store used by db.py, the routes and the workers: "firestore"
+# (default), "memory" (per-process, lost on restart) or "sqlite" (file at
+# SQLITE_PATH). The local backends let the API run and be load-tested without
+# a Firebase project; STORAGE_SIMULATED_RTT_MS adds a fixed delay per call
+# to approximate network round trips.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "local_store.sqlite3")
+STORAGE_SIMULATED_RTT_MS = float(os.getenv("STORAGE_SIMULATED_RTT_MS", "0"))
+
+# Job queue for email/parse jobs and student.updated events (app/queues):
+# "pubsub" (default), "memory" (per-process) or "spool" (SQLite file at
+# JOB_QUEUE_PATH). With JOB_QUEUE_RUN_WORKERS=1 the API also runs the email
+# and parse workers in-process; it defaults to on for the memory queue,
+# whose jobs other processes can't see. A leased job that isn't acked within
+# JOB_QUEUE_ACK_DEADLINE_SECONDS is delivered again (local backends).
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "pubsub").lower()
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "job_spool.sqlite3")
+JOB_QUEUE_ACK_DEADLINE_SECONDS = float(
+    os.getenv("JOB_QUEUE_ACK_DEADLINE_SECONDS", "60")
+)
+JOB_QUEUE_RUN_WORKERS = os.getenv(
+    "JOB_QUEUE_RUN_WORKERS", "1" if JOB_QUEUE_BACKEND == "memory" else "0"
+) == "1"
+
+# student.updated events (webhooks). Defaults to the email topic for
+# backwards compatibility; point it at a dedicated topic in production.
+PUBSUB_EVENTS_TOPIC = os.getenv("PUBSUB_EVENTS_TOPIC", PUBSUB_EMAIL_TOPIC)
+EVENT_BATCH_MAX_MESSAGES = int(os.getenv("EVENT_BATCH_MAX_MESSAGES", "100"))
+EVENT_BATCH_MAX_LATENCY_MS = float(
+    os.getenv("EVENT_BATCH_MAX_LATENCY_MS", "50")
+)
+EVENT_FLOW_MAX_MESSAGES = int(os.getenv("EVENT_FLOW_MAX_MESSAGES", "1000"))
+# Merge change-sets for the same student published within this window into
+# one event. 0 publishes every change immediately.
+EVENT_COALESCE_WINDOW_MS = float(os.getenv("EVENT_COALESCE_WINDOW_MS", "0"))
+
+# Max seconds the startup hook waits for client warm-up before serving;
+# dependencies still warming afterwards show as "pending" on /readyz.
+WARMUP_DEADLINE_SECONDS = float(os.getenv("WARMUP_DEADLINE_SECONDS", "10"))
+# A required dependency that failed is re-probed (from /readyz) at most
+# once per RETRY_SECONDS.
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "15"))
+
+# Bulk email: students read per query page while resolving recipients, and
+# recipients handed to the sender per call (progress is saved after each;
+# the sender splits them into provider-sized requests sent concurrently).
+RECIPIENT_PAGE_SIZE = int(os.getenv("RECIPIENT_PAGE_SIZE", "1000"))
+BULK_EMAIL_CHUNK_SIZE = int(os.getenv("BULK_EMAIL_CHUNK_SIZE", "4000"))
+# Times a campaign resends the failed provider chunks of each batch.
+BULK_EMAIL_RETRY_ATTEMPTS = int(os.getenv("BULK_EMAIL_RETRY_ATTEMPTS", "2"))
+# Background threads per API worker that run bulk-email campaigns.
+BULK_EMAIL_WORKERS = max(1, int(os.getenv("BULK_EMAIL_WORKERS", "2")))
+
+# Per-school/college recipient index (see recipient_index.py). Shards spread
+# index writes for one target across documents; changing the shard count
+# requires a rebuild. Off by default: only student writes made through this
+# backend keep it current, and the dashboards also write scl_students
+# directly from the browser. Enable it once they go through the API.
+RECIPIENT_INDEX_ENABLED = os.getenv("RECIPIENT_INDEX_ENABLED", "0") == "1"
+RECIPIENT_INDEX_SHARDS = max(1, int(os.getenv("RECIPIENT_INDEX_SHARDS", "16")))
+
+# SendGrid bulk sends: recipients per request (one personalization each; the
+# provider allows at most 1000) and concurrent requests per process.
+SENDGRID_MAX_PERSONALIZATIONS = min(
+    1000, max(1, int(os.getenv("SENDGRID_MAX_PERSONALIZATIONS", "1000")))
+)
+SENDGRID_SEND_CONCURRENCY = max(
+    1, int(os.getenv("SENDGRID_SEND_CONCURRENCY", "4"))
+)
+
+# SMTP session pool: open sessions per process, messages sent on a session
+# before it is replaced, and idle seconds after which a NOOP checks it.
+SMTP_POOL_SIZE = max(1, int(os.getenv("SMTP_POOL_SIZE", "4")))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(
+    os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")
+)
+SMTP_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_NOOP_AFTER_SECONDS", "30"))
+
+# Outgoing email rate limits, per second: provider names (sendgrid, smtp)
+# and recipient domains (gmail.com, or * for every other domain). sendgrid
+# and domains count recipients; smtp counts messages (a BCC chunk is one).
+# Limits adapt downwards on throttle responses and recover automatically.
+EMAIL_RATE_LIMITS = os.getenv("EMAIL_RATE_LIMITS", "sendgrid=1000,smtp=10")
+# Times a throttled send is retried (after backing off) before failing.
+EMAIL_THROTTLE_MAX_RETRIES = int(os.getenv("EMAIL_THROTTLE_MAX_RETRIES", "5"))
+
+# Email worker: callbacks run concurrently, with at most MAX_MESSAGES /
+# MAX_BYTES leased at once; on SIGTERM in-flight jobs get DRAIN_SECONDS.
+EMAIL_WORKER_CONCURRENCY = max(
+    1, int(os.getenv("EMAIL_WORKER_CONCURRENCY", "8"))
+)
+# Jobs per micro-batch (one student get_all, batched email_jobs writes) and
+# how long the first job of a batch waits for others to join it.
+EMAIL_WORKER_BATCH_SIZE = min(
+    500, max(1, int(os.getenv("EMAIL_WORKER_BATCH_SIZE", "50")))
+)
+EMAIL_WORKER_BATCH_WINDOW_MS = float(
+    os.getenv("EMAIL_WORKER_BATCH_WINDOW_MS", "100")
+)
+EMAIL_WORKER_MAX_MESSAGES = int(
+    os.getenv(
+        "EMAIL_WORKER_MAX_MESSAGES",
+        str(max(EMAIL_WORKER_CONCURRENCY, EMAIL_WORKER_BATCH_SIZE) * 2),
+    )
+)
+EMAIL_WORKER_MAX_BYTES = int(
+    os.getenv("EMAIL_WORKER_MAX_BYTES", str(10 * 1024 * 1024))
+)
+EMAIL_WORKER_DRAIN_SECONDS = float(
+    os.getenv("EMAIL_WORKER_DRAIN_SECONDS", "30")
+)
+# Sent-job ledger (delivery_ledger.py): how long and how many keys the
+# worker remembers in memory before asking storage again.
+EMAIL_LEDGER_CACHE_SECONDS = float(
+    os.getenv("EMAIL_LEDGER_CACHE_SECONDS", "3600")
+)
+EMAIL_LEDGER_CACHE_SIZE = int(os.getenv("EMAIL_LEDGER_CACHE_SIZE", "100000"))
+
+# Failed email/parse jobs (dead_letters.py): transient failures are retried
+# after base * 2**(attempt - 1) seconds (full jitter, capped at MAX), and
+# jobs still failing after MAX_ATTEMPTS go to the dead_letters collection.
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+
+# Parse worker: resumes are streamed from GCS in CHUNK_BYTES pieces and
+# rejected (dead-lettered) above MAX_BYTES. Regex matches up to
+# SCAN_OVERLAP characters long are found across chunk boundaries.
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(10 * 1024 * 1024)))
+RESUME_CHUNK_BYTES = int(os.getenv("RESUME_CHUNK_BYTES", str(256 * 1024)))
+RESUME_SCAN_OVERLAP = int(os.getenv("RESUME_SCAN_OVERLAP", "512"))
+# PDF/DOCX text extraction runs in EXTRACT_WORKERS processes (default: one
+# per core), each limited to EXTRACT_MEMORY_MB of address space and
+# EXTRACT_TIMEOUT_SECONDS per file. Only the first MAX_TEXT_CHARS of a
+# resume's text are kept for parsing.
+RESUME_EXTRACT_WORKERS = int(os.getenv("RESUME_EXTRACT_WORKERS", "0")) or None
+RESUME_EXTRACT_TIMEOUT_SECONDS = float(
+    os.getenv("RESUME_EXTRACT_TIMEOUT_SECONDS", "30")
+)
+RESUME_EXTRACT_MEMORY_MB = int(os.getenv("RESUME_EXTRACT_MEMORY_MB", "512"))
+RESUME_MAX_TEXT_CHARS = int(os.getenv("RESUME_MAX_TEXT_CHARS", "200000"))
+# JSON file of skills, courses and branches with their synonyms (see
+# services/taxonomy.py); empty uses the bundled resume_taxonomy.json.
+RESUME_TAXONOMY_PATH = os.getenv("RESUME_TAXONOMY_PATH", "")
@@ -1,6 +1,38 @@
 # app/db.py
-from .config import PROJECT_ID, PUBSUB_EMAIL_TOPIC
+from . import recipient_index
+from .dead_letters import DeadLetterSink
+from .delivery_ledger import DeliveryLedger
+from .services.resume_cache import ParsedResumeCache
+from .audit import AuditWriter
+from .cache import TTLCache
+from .events import EventPublisher
+from .queues import get_job_queue
+from .storage.base import project_fields
+from .config import (
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL_SECONDS,
+    AUDIT_LOG_MODE,
+    AUDIT_MAX_PENDING,
+    EMAIL_LEDGER_CACHE_SECONDS,
+    EMAIL_LEDGER_CACHE_SIZE,
+    EVENT_BATCH_MAX_LATENCY_MS,
+    EVENT_BATCH_MAX_MESSAGES,
+    EVENT_COALESCE_WINDOW_MS,
+    EVENT_FLOW_MAX_MESSAGES,
+    JOB_QUEUE_BACKEND,
+    PROJECT_ID,
+    PUBSUB_EVENTS_TOPIC,
+    RECIPIENT_INDEX_ENABLED,
+    RECIPIENT_INDEX_SHARDS,
+    STORAGE_BACKEND,
+    ENTITY_CACHE_MAX_ENTRIES,
+    ENTITY_CACHE_TTL_SECONDS,
+    ENTITY_CACHE_MISS_TTL_SECONDS,
+)
+from datetime import datetime, timezone
+import copy
 import logging
+import threading
 
 log = logging.getLogger(__name__)
 
@@ -11,7 +43,18 @@ db = None
 
 
 def _get_firestore_module():
-    """Attempt to import firebase_admin.firestore; return module or None."""
+    """Return the storage module selected by STORAGE_BACKEND, or None.
+
+    Every backend module exposes the ``firebase_admin.firestore`` names used
+    here: ``client()``, ``transactional``, ``SERVER_TIMESTAMP`` and
+    ``DELETE_FIELD`` and ``Increment``.
+    """
+    if STORAGE_BACKEND == "memory":
+        from .storage import memory as _mem
+        return _mem
+    if STORAGE_BACKEND == "sqlite":
+        from .storage import sqlite as _sqlite
+        return _sqlite
     try:
         from firebase_admin import firestore as _fs  # type: ignore
         return _fs
@@ -21,7 +64,7 @@ def _get_firestore_module():
 
 
 def _get_db_client():
-    """Return a Firestore client or None if unavailable."""
+    """Return the storage client (Firestore by default) or None."""
     global db
     if db is not None:
         return db
@@ -37,20 +80,184 @@ def _get_db_client():
     return db
 
 
-# Don't create a PublisherClient at import time (it may attempt to
-# contact metadata servers while resolving default credentials). Create
-# it lazily in publish_student_updated when a publish is actually needed.
-publisher = None
+def get_db_client():
+    """Return the configured storage client or raise RuntimeError.
+
+    Used by routes and workers that query collections directly so they
+    follow STORAGE_BACKEND like the rest of the data layer.
+    """
+    client = _get_db_client()
+    if client is None:
+        raise RuntimeError(
+            "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
+        )
+    return client
+
+
+# student.updated events for webhooks. The PublisherClient is created lazily
+# on first publish (it may contact metadata servers while resolving default
+# credentials). Note: for production, use a dedicated webhook topic.
+event_publisher = EventPublisher(
+    PROJECT_ID,
+    PUBSUB_EVENTS_TOPIC,
+    batch_max_messages=EVENT_BATCH_MAX_MESSAGES,
+    batch_max_latency=EVENT_BATCH_MAX_LATENCY_MS / 1000.0,
+    flow_max_messages=EVENT_FLOW_MAX_MESSAGES,
+    coalesce_window=EVENT_COALESCE_WINDOW_MS / 1000.0,
+    queue=get_job_queue() if JOB_QUEUE_BACKEND != "pubsub" else None,
+)
+
+# Read-through caches for get_student / get_college. Writes made through this
+# module refresh the cached copy, keyed on the document's `version` field so
+# an older snapshot never overwrites a newer one.
+_NOT_FOUND = object()
+_MISSING_ENTRY = object()
+_cache_write_lock = threading.Lock()
+_student_cache = TTLCache(
+    max_entries=ENTITY_CACHE_MAX_ENTRIES,
+    default_ttl=ENTITY_CACHE_TTL_SECONDS,
+)
+_college_cache = TTLCache(
+    max_entries=ENTITY_CACHE_MAX_ENTRIES,
+    default_ttl=ENTITY_CACHE_TTL_SECONDS,
+)
+
+
+def _cache_get(cache: TTLCache, key: str, fields: list = None):
+    """Return (hit, doc) where doc is a private copy or None if missing.
+
+    ``fields`` projects the cached document to those paths.
+    """
+    value = cache.get(key, _MISSING_ENTRY)
+    if value is _MISSING_ENTRY:
+        return False, None
+    if value is _NOT_FOUND:
+        return True, None
+    if fields:
+        return True, project_fields(value, fields)
+    return True, copy.deepcopy(value)
+
+
+def _cache_put(cache: TTLCache, key: str, doc: dict):
+    """Store doc unless the cache already holds a newer version."""
+    if doc is None:
+        cache.set(key, _NOT_FOUND, ttl=ENTITY_CACHE_MISS_TTL_SECONDS)
+        return
+    with _cache_write_lock:
+        current = cache.pop(key)
+        if (
+            isinstance(current, dict)
+            and current.get("version", 1) > doc.get("version", 1)
+        ):
+            doc = current
+        cache.set(key, copy.deepcopy(doc))
+
+
+def invalidate_student(alumni_id: str):
+    _student_cache.pop(alumni_id)
+
+
+def invalidate_college(college_id: str):
+    _college_cache.pop(college_id)
+
+
+def entity_cache_stats() -> dict:
+    """Return size and hit-rate counters for the entity caches."""
+    return {
+        "students": _student_cache.stats(),
+        "colleges": _college_cache.stats(),
+    }
+
+
+# audit_logs entries written off the request path (see audit.py).
+audit_writer = AuditWriter(
+    _get_db_client,
+    batch_size=AUDIT_BATCH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_pending=AUDIT_MAX_PENDING,
+)
+
+
+def _audit_mode(mode: str = None) -> str:
+    mode = (mode or AUDIT_LOG_MODE).lower()
+    if mode not in ("strict", "buffered"):
+        raise ValueError(f"Unknown audit mode: {mode}")
+    return mode
+
+
+# Shard counts of built recipient indexes, read from their meta documents.
+_index_shards_cache = TTLCache(
+    max_entries=ENTITY_CACHE_MAX_ENTRIES,
+    default_ttl=ENTITY_CACHE_TTL_SECONDS,
+)
+
+
+def _index_writes(_db, alumni_id: str, old: dict, new: dict) -> list:
+    """Recipient-index merge-sets for a student write ([] if disabled)."""
+    if not RECIPIENT_INDEX_ENABLED:
+        return []
+    return recipient_index.index_writes(
+        _db, _get_firestore_module(), alumni_id, old, new,
+        RECIPIENT_INDEX_SHARDS, _index_shards_cache,
+    )
+
+
+def rebuild_recipient_index(progress=None) -> dict:
+    """Rebuild every school/college recipient index from a full scan."""
+    result = recipient_index.rebuild(
+        get_db_client(), _get_firestore_module(), RECIPIENT_INDEX_SHARDS,
+        progress=progress,
+    )
+    _index_shards_cache.clear()
+    return result
 
 
-def create_student_doc(data: dict) -> dict:
+def dead_letter_sink() -> DeadLetterSink:
+    """Return the store of jobs that failed for good (dead_letters.py)."""
+    return DeadLetterSink(get_db_client(), _get_firestore_module())
+
+
+def parsed_resume_cache(version) -> ParsedResumeCache:
+    """Return a cache of parsed resumes for ``version`` of the parser."""
+    return ParsedResumeCache(
+        get_db_client(), _get_firestore_module(), version
+    )
+
+
+def delivery_ledger() -> DeliveryLedger:
+    """Return a ledger of sent email jobs (see delivery_ledger.py)."""
+    return DeliveryLedger(
+        get_db_client(),
+        _get_firestore_module(),
+        cache_seconds=EMAIL_LEDGER_CACHE_SECONDS,
+        cache_size=EMAIL_LEDGER_CACHE_SIZE,
+    )
+
+
+def new_student_ids(count: int) -> list:
+    """Allocate ``count`` student document ids without a round trip."""
+    collection = get_db_client().collection("scl_students")
+    return [collection.document().id for _ in range(count)]
+
+
+def existing_student_ids(ids: list) -> set:
+    """Return which of ``ids`` have a student document (one get_all)."""
+    client = get_db_client()
+    collection = client.collection("scl_students")
+    snaps = client.get_all(
+        [collection.document(i) for i in ids], field_paths=["alumniId"]
+    )
+    return {snap.id for snap in snaps if snap.exists}
+
+
+def create_student_doc(data: dict, doc_id: str = None) -> dict:
     _db = _get_db_client()
     if _db is None:
         raise RuntimeError(
             "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
         )
 
-    doc_ref = _db.collection("scl_students").document()
+    doc_ref = _db.collection("scl_students").document(doc_id)
     alumni_id = doc_ref.id
     base = {
         "alumniId": alumni_id,
@@ -58,10 +265,81 @@ def create_student_doc(data: dict) -> dict:
         "version": 1,
     }
     base.update(data)
-    doc_ref.set(base)
+    index_writes = _index_writes(_db, alumni_id, None, base)
+    if index_writes:
+        # one commit, like a plain set; the index entry lands atomically
+        batch = _db.batch()
+        batch.set(doc_ref, base)
+        for ref, entry in index_writes:
+            batch.set(ref, entry, merge=True)
+        batch.commit()
+    else:
+        doc_ref.set(base)
+    _cache_put(_student_cache, alumni_id, base)
     return {"alumniId": alumni_id, **base}
 
 
+# Firestore rejects write batches with more than 500 operations.
+MAX_BATCH_WRITES = 500
+
+
+class BatchTooLargeError(ValueError):
+    """The rows and their index updates don't fit in one write batch."""
+
+
+def create_student_docs(rows: list, doc_ids: list = None) -> list:
+    """Create several student docs with a single batched commit.
+
+    Document ids are allocated client-side (or taken from ``doc_ids``, so a
+    retry writes the same documents), so the only round trip is the commit
+    itself (plus, with the recipient index, a cached read of the targets'
+    shard counts). Recipient-index updates are combined per shard and
+    committed in the same batch, so students never land without their
+    index entries. The batch is atomic: on failure nothing is written and
+    the error propagates. If the students plus their index updates exceed
+    MAX_BATCH_WRITES, BatchTooLargeError is raised before anything is
+    written; split the rows and retry. Returns the created documents in
+    input order.
+    """
+    if len(rows) > MAX_BATCH_WRITES:
+        raise BatchTooLargeError(
+            f"At most {MAX_BATCH_WRITES} rows per batch (got {len(rows)})"
+        )
+    _db = _get_db_client()
+    if _db is None:
+        raise RuntimeError(
+            "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
+        )
+    collection = _db.collection("scl_students")
+    batch = _db.batch()
+    created = []
+    for n, data in enumerate(rows):
+        doc_ref = collection.document(doc_ids[n] if doc_ids else None)
+        base = {
+            "alumniId": doc_ref.id,
+            "linkedToCollege": False,
+            "version": 1,
+        }
+        base.update(data)
+        batch.set(doc_ref, base)
+        created.append(base)
+    index_writes = []
+    if RECIPIENT_INDEX_ENABLED:
+        index_writes = recipient_index.bulk_index_writes(
+            _db, _get_firestore_module(), created, RECIPIENT_INDEX_SHARDS,
+            _index_shards_cache,
+        )
+    if len(created) + len(index_writes) > MAX_BATCH_WRITES:
+        raise BatchTooLargeError(
+            f"{len(created)} rows need {len(index_writes)} index writes; "
+            f"at most {MAX_BATCH_WRITES} writes fit in one batch"
+        )
+    for ref, entry in index_writes:
+        batch.set(ref, entry, merge=True)
+    batch.commit()
+    return created
+
+
 def create_college_doc(data: dict) -> dict:
     _db = _get_db_client()
     if _db is None:
@@ -73,117 +351,267 @@ def create_college_doc(data: dict) -> dict:
     base = {"collegeId": college_id, "version": 1}
     base.update(data)
     doc_ref.set(base)
+    _cache_put(_college_cache, college_id, base)
     return {"collegeId": college_id, **base}
 
 
-def get_college(college_id: str) -> dict:
+def _read_entity(
+    cache: TTLCache,
+    collection: str,
+    doc_id: str,
+    fresh: bool = False,
+    fields: list = None,
+) -> dict:
+    """Cached document read shared by get_student / get_college.
+
+    With ``fields`` only those paths are returned; a cached full document
+    is projected locally, otherwise Firestore is asked for the field mask
+    and the partial result is not cached.
+    """
+    if not fresh:
+        hit, cached = _cache_get(cache, doc_id, fields)
+        if hit:
+            return cached
     _db = _get_db_client()
     if _db is None:
         raise RuntimeError(
             "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
         )
-    doc = _db.collection("colleges").document(college_id).get()
-    return doc.to_dict() if doc.exists else None
+    doc_ref = _db.collection(collection).document(doc_id)
+    if fields:
+        doc = doc_ref.get(field_paths=list(fields))
+        if not doc.exists:
+            _cache_put(cache, doc_id, None)
+            return None
+        return doc.to_dict() or {}
+    doc = doc_ref.get()
+    data = doc.to_dict() if doc.exists else None
+    _cache_put(cache, doc_id, data)
+    return data
 
 
-def link_student_to_college(
-    alumni_id: str,
-    college_id: str,
-    admin_uid: str,
+def get_college(
+    college_id: str, fresh: bool = False, fields: list = None
 ) -> dict:
-    """Link an SCL student doc to a college and mark it linked.
+    """Return the college document (or just ``fields`` of it) or None.
 
-    Returns the updated document, or None if not found.
+    Served from the per-worker cache unless ``fresh`` is set.
+    """
+    return _read_entity(_college_cache, "colleges", college_id, fresh, fields)
+
+
+class VersionConflict(Exception):
+    """Raised when a student write targets a stale ``version``."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Version conflict (current {current_version})")
+        self.current_version = current_version
+
+
+def _apply_changes(data: dict, changes: dict) -> dict:
+    """Return ``data`` with Firestore-style ``changes`` applied locally.
+
+    Dotted keys update nested maps the same way ``DocumentReference.update``
+    does. SERVER_TIMESTAMP is replaced with the local UTC time so callers get
+    the merged document without a follow-up read.
+    """
+    fs = _get_firestore_module()
+    server_ts = fs.SERVER_TIMESTAMP if fs else None
+    delete_field = fs.DELETE_FIELD if fs else None
+    now = datetime.now(timezone.utc)
+    merged = copy.deepcopy(data)
+    for path, value in changes.items():
+        target = merged
+        *parents, leaf = path.split(".")
+        for part in parents:
+            child = target.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                target[part] = child
+            target = child
+        if delete_field is not None and value is delete_field:
+            target.pop(leaf, None)
+        elif server_ts is not None and value is server_ts:
+            target[leaf] = now
+        else:
+            target[leaf] = value
+    return merged
+
+
+def _update_student_txn(
+    alumni_id: str,
+    make_changes,
+    make_audit,
+    expected_version: int = None,
+    audit_mode: str = None,
+):
+    """Read, version-check and update a student in a single transaction.
+
+    ``make_changes(data)`` returns the field changes for the current
+    document (``version`` is bumped here) and ``make_audit(changes)`` the
+    audit_logs entry. In "strict" audit mode the entry is committed
+    atomically with the update; in "buffered" mode it is handed to
+    ``audit_writer`` after the commit. Recipient-index changes (email,
+    schoolId or collegeId) are written in the same transaction. Returns
+    ``(merged_doc, changes)``, or ``(None, None)`` if the student does not
+    exist. Raises VersionConflict when ``expected_version`` no longer
+    matches the stored document.
     """
     _db = _get_db_client()
     if _db is None:
         raise RuntimeError(
             "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
         )
+    fs = _get_firestore_module()
+    strict_audit = _audit_mode(audit_mode) == "strict"
     student_ref = _db.collection("scl_students").document(alumni_id)
-    doc = student_ref.get()
-    if not doc.exists:
-        return None
+
+    @fs.transactional
+    def _run(transaction):
+        snap = student_ref.get(transaction=transaction)
+        if not snap.exists:
+            return None, None
+        data = snap.to_dict() or {}
+        current = data.get("version", 1)
+        if expected_version is not None and expected_version != current:
+            raise VersionConflict(current)
+        changes = make_changes(data)
+        changes["version"] = current + 1
+        merged = _apply_changes(data, changes)
+        transaction.update(student_ref, changes)
+        for ref, entry in _index_writes(_db, alumni_id, data, merged):
+            transaction.set(ref, entry, merge=True)
+        if strict_audit:
+            transaction.set(
+                _db.collection("audit_logs").document(), make_audit(changes)
+            )
+        return merged, changes
+
+    try:
+        updated, changes = _run(_db.transaction())
+    except VersionConflict:
+        invalidate_student(alumni_id)
+        raise
+    if updated is None:
+        _cache_put(_student_cache, alumni_id, None)
+        return None, None
+    if not strict_audit:
+        audit_writer.add(make_audit(changes))
+    _cache_put(_student_cache, alumni_id, updated)
+    return updated, changes
+
+
+def link_student_to_college(
+    alumni_id: str,
+    college_id: str,
+    admin_uid: str,
+    audit_mode: str = None,
+) -> dict:
+    """Link an SCL student doc to a college and mark it linked.
+
+    ``audit_mode`` is "strict" or "buffered" (default: AUDIT_LOG_MODE).
+    Returns the updated document, or None if not found.
+    """
     fs = _get_firestore_module()
-    changes = {
-        "collegeId": college_id,
-        "linkedToCollege": True,
-        "lastLinkedAt": (fs.SERVER_TIMESTAMP if fs else None),
-        "lastLinkedBy": admin_uid,
-    }
-    # bump version
-    data = doc.to_dict()
-    changes["version"] = data.get("version", 1) + 1
-    student_ref.update(changes)
-    # audit
-    _db.collection("audit_logs").add({
-        "alumniId": alumni_id,
-        "actor": admin_uid,
-        "action": "link_to_college",
-        "collegeId": college_id,
-    })
+
+    def _changes(data: dict) -> dict:
+        return {
+            "collegeId": college_id,
+            "linkedToCollege": True,
+            "lastLinkedAt": (fs.SERVER_TIMESTAMP if fs else None),
+            "lastLinkedBy": admin_uid,
+        }
+
+    def _audit(changes: dict) -> dict:
+        return {
+            "alumniId": alumni_id,
+            "actor": admin_uid,
+            "action": "link_to_college",
+            "collegeId": college_id,
+        }
+
+    updated, changes = _update_student_txn(
+        alumni_id, _changes, _audit, audit_mode=audit_mode
+    )
+    if updated is None:
+        return None
     publish_student_updated(alumni_id, changes)
-    return student_ref.get().to_dict()
+    return updated
 
 
-def get_student(alumni_id: str) -> dict:
-    _db = _get_db_client()
-    if _db is None:
-        raise RuntimeError(
-            "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
-        )
+def get_student(
+    alumni_id: str, fresh: bool = False, fields: list = None
+) -> dict:
+    """Return the student document (or just ``fields`` of it) or None.
 
-    doc = _db.collection("scl_students").document(alumni_id).get()
-    return doc.to_dict() if doc.exists else None
+    Served from the per-worker cache unless ``fresh`` is set; use ``fresh``
+    where a stale ``version`` would change the outcome.
+    """
+    return _read_entity(
+        _student_cache, "scl_students", alumni_id, fresh, fields
+    )
 
 
-def patch_student(alumni_id: str, changes: dict, updated_by: str) -> dict:
-    _db = _get_db_client()
-    if _db is None:
-        raise RuntimeError(
-            "Firestore not configured; set GOOGLE_APPLICATION_CREDENTIALS."
-        )
+def patch_student(
+    alumni_id: str,
+    changes: dict,
+    updated_by: str,
+    expected_version: int = None,
+    audit_mode: str = None,
+) -> dict:
+    """Apply ``changes`` to a student, bump its version and audit the write.
 
-    doc_ref = _db.collection("scl_students").document(alumni_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        return None
-    data = doc.to_dict()
-    new_version = data.get("version", 1) + 1
-    changes["version"] = new_version
+    When ``expected_version`` is given it is checked inside the transaction
+    and VersionConflict is raised on mismatch. ``audit_mode`` is "strict" or
+    "buffered" (default: AUDIT_LOG_MODE). Returns the updated document,
+    or None if not found.
+    """
     fs = _get_firestore_module()
-    changes["lastUpdatedAt"] = (fs.SERVER_TIMESTAMP if fs else None)
-    changes["lastUpdatedBy"] = updated_by
-    doc_ref.update(changes)
-    # audit log
-    _db.collection("audit_logs").add({
-        "alumniId": alumni_id,
-        "actor": updated_by,
-        "changes": changes
-    })
+
+    def _changes(data: dict) -> dict:
+        out = dict(changes)
+        out["lastUpdatedAt"] = (fs.SERVER_TIMESTAMP if fs else None)
+        out["lastUpdatedBy"] = updated_by
+        return out
+
+    def _audit(applied: dict) -> dict:
+        return {
+            "alumniId": alumni_id,
+            "actor": updated_by,
+            "changes": applied,
+        }
+
+    updated, applied = _update_student_txn(
+        alumni_id,
+        _changes,
+        _audit,
+        expected_version=expected_version,
+        audit_mode=audit_mode,
+    )
+    if updated is None:
+        return None
     # publish pubsub event for webhooks
-    publish_student_updated(alumni_id, changes)
-    return doc_ref.get().to_dict()
+    publish_student_updated(alumni_id, applied)
+    return updated
+
+
+def _resolved_changes(changes: dict) -> dict:
+    """Replace write sentinels so a change-set can be serialized."""
+    fs = _get_firestore_module()
+    server_ts = fs.SERVER_TIMESTAMP if fs else None
+    delete_field = fs.DELETE_FIELD if fs else None
+    now = datetime.now(timezone.utc)
+    out = {}
+    for key, value in changes.items():
+        if server_ts is not None and value is server_ts:
+            value = now
+        elif delete_field is not None and value is delete_field:
+            value = None
+        out[key] = value
+    return out
 
 
 def publish_student_updated(alumni_id: str, changes: dict):
-    global publisher
-    if publisher is None:
-        try:
-            # Lazy import of Pub/Sub to avoid startup failures if package
-            # isn't installed/compatible in the environment.
-            from google.cloud import pubsub_v1  # type: ignore
-            publisher = pubsub_v1.PublisherClient()
-        except Exception as e:
-            log.info("Publisher not available; skipping publish: %s", e)
-            return
-
-    topic_path = publisher.topic_path(PROJECT_ID, PUBSUB_EMAIL_TOPIC)
-    # Note: For production, create a specific webhook topic
-    import json
-    payload = json.dumps({
-        "event": "student.updated",
-        "alumniId": alumni_id,
-        "changes": changes
-    }).encode("utf-8")
-    publisher.publish(topic_path, payload)
+    event_publisher.publish_student_updated(
+        alumni_id, _resolved_changes(changes)
+    )
@@ -0,0 +1,253 @@
+# app/dead_letters.py
+"""Retry with backoff and dead-lettering for failed queue jobs.
+
+Workers hand every failed message to ``RetryPolicy.failed``:
+
+- permanent failures (a refused recipient, a 4xx from the provider, a
+  missing or undecodable file, a malformed job) go straight to the
+  dead-letter sink and are acked; authentication and sender errors are
+  retried, since they are fixed by configuration rather than the job;
+- transient failures are retried after an exponential backoff with full
+  jitter, ``base * 2**(attempt - 1)`` capped at ``max_delay``, until
+  ``max_attempts`` is reached, after which the job is dead-lettered too.
+
+The local queues (app/queues) redeliver a nacked message after the
+backoff. A Pub/Sub message is not nacked: its ack deadline is set to the
+backoff (Pub/Sub allows at most 600 seconds) and it is released from the
+subscriber's lease management, so Pub/Sub redelivers it once the deadline
+expires. ``delivery_attempt`` is only filled in by Pub/Sub when the
+subscription has a dead-letter policy; without one, attempts are counted
+per worker process.
+
+Dead letters are documents in ``dead_letters`` holding the raw job
+(base64-encoded in ``dataBase64``, with a readable copy in ``data``), the
+error and the attempt count; GET /admin/dead-letters lists them and POST
+/admin/dead-letters/{id}/replay queues one again.
+"""
+import base64
+import json
+import logging
+import random
+import smtplib
+
+from .cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+DEAD_LETTER_COLLECTION = "dead_letters"
+# Pub/Sub's upper bound for an ack deadline
+MAX_ACK_DEADLINE_SECONDS = 600
+
+
+class PermanentJobError(Exception):
+    """A job failure that retrying cannot fix."""
+
+
+def _chain(error: BaseException):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+# SMTP replies about the recipient mailbox itself: unavailable, not local,
+# over quota, bad address
+_RECIPIENT_SMTP_CODES = (550, 551, 552, 553)
+
+
+def _is_permanent(error: BaseException) -> bool:
+    if isinstance(error, PermanentJobError):
+        return True
+    if isinstance(error, (json.JSONDecodeError, UnicodeDecodeError)):
+        # the job payload itself is malformed
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # 4xx refusals (greylisting, full mailbox) may clear up
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(500 <= code < 600 for code in codes)
+    if isinstance(
+        error,
+        (
+            smtplib.SMTPAuthenticationError,
+            smtplib.SMTPSenderRefused,
+            smtplib.SMTPHeloError,
+        ),
+    ):
+        # our credentials or sender setup, not the job: retry until fixed
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in _RECIPIENT_SMTP_CODES
+    # SendGrid (status_code) and Google API (code) HTTP errors; auth,
+    # timeouts and throttling are not the job's fault
+    status = getattr(error, "status_code", None) or getattr(
+        error, "code", None
+    )
+    return (
+        isinstance(status, int)
+        and 400 <= status < 500
+        and status not in (401, 403, 408, 429)
+    )
+
+
+def is_permanent(error: BaseException) -> bool:
+    """True if ``error`` (or an exception it wraps) can't be retried away."""
+    return any(_is_permanent(e) for e in _chain(error))
+
+
+def backoff_delay(attempt: int, base: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff for the ``attempt``-th failure."""
+    ceiling = min(max_delay, base * 2 ** max(0, attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def redeliver_after(message, delay: float):
+    """Settle ``message`` so that it is delivered again in ``delay`` seconds.
+
+    Local queue messages have ``nack_after``. A Pub/Sub message gets its ack
+    deadline set to the delay (at most MAX_ACK_DEADLINE_SECONDS) and is
+    dropped from the subscriber's lease management, so it is redelivered
+    when the deadline expires instead of at once as after ``nack``.
+    """
+    nack_after = getattr(message, "nack_after", None)
+    if nack_after is not None:
+        nack_after(delay)
+        return
+    modify = getattr(message, "modify_ack_deadline", None)
+    drop = getattr(message, "drop", None)
+    if modify is None or drop is None:
+        message.nack()
+        return
+    seconds = int(min(MAX_ACK_DEADLINE_SECONDS, max(0.0, delay)))
+    if seconds <= 0:
+        message.nack()
+        return
+    modify(seconds)
+    drop()
+
+
+class DeadLetterSink:
+    def __init__(self, client, fs):
+        self.client = client
+        self.fs = fs
+        self.written = 0
+
+    def _collection(self):
+        return self.client.collection(DEAD_LETTER_COLLECTION)
+
+    def add(
+        self,
+        topic: str,
+        message,
+        error: BaseException,
+        attempts: int,
+        reason: str,
+    ):
+        data = message.data
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        data = bytes(data or b"")
+        self._collection().add({
+            "topic": topic,
+            "messageId": getattr(message, "message_id", None),
+            "data": data.decode("utf-8", errors="replace"),
+            "dataBase64": base64.b64encode(data).decode("ascii"),
+            "attributes": dict(getattr(message, "attributes", None) or {}),
+            "error": f"{type(error).__name__}: {error}",
+            "reason": reason,
+            "attempts": attempts,
+            "failedAt": self.fs.SERVER_TIMESTAMP,
+        })
+        self.written += 1
+
+    def list(self, topic: str = None, limit: int = 50) -> list:
+        """Newest first; with ``topic`` this needs the (topic, failedAt
+        desc) composite index from firestore.indexes.json."""
+        query = self._collection()
+        if topic:
+            query = query.where("topic", "==", topic)
+        query = query.order_by(
+            "failedAt", direction=self.fs.Query.DESCENDING
+        ).limit(limit)
+        return [
+            dict(snap.to_dict() or {}, id=snap.id) for snap in query.stream()
+        ]
+
+    def get(self, dead_letter_id: str):
+        snap = self._collection().document(dead_letter_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    def delete(self, dead_letter_id: str):
+        self._collection().document(dead_letter_id).delete()
+
+    @staticmethod
+    def payload(entry: dict) -> bytes:
+        """The original job bytes of a dead letter.
+
+        Entries written before ``dataBase64`` existed only have the text in
+        ``data``.
+        """
+        if entry.get("dataBase64") is not None:
+            return base64.b64decode(entry["dataBase64"])
+        return (entry.get("data") or "").encode("utf-8")
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        topic: str,
+        sink: DeadLetterSink,
+        max_attempts: int = 5,
+        base: float = 10.0,
+        max_delay: float = 600.0,
+    ):
+        self.topic = topic
+        self.sink = sink
+        self.max_attempts = max(1, max_attempts)
+        self.base = base
+        self.max_delay = max_delay
+        # message id -> failures seen by this process (Pub/Sub without a
+        # dead-letter policy doesn't report delivery attempts)
+        self._attempts = TTLCache(max_entries=10_000, default_ttl=3600)
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def _attempt(self, message) -> int:
+        seen = self._attempts.get(message.message_id, 0) + 1
+        self._attempts.set(message.message_id, seen)
+        return max(getattr(message, "delivery_attempt", None) or 0, seen)
+
+    def failed(self, message, error: BaseException):
+        """Schedule a retry of ``message`` or dead-letter it, then settle."""
+        attempt = self._attempt(message)
+        permanent = is_permanent(error)
+        if permanent or attempt >= self.max_attempts:
+            reason = "permanent" if permanent else "exhausted"
+            try:
+                self.sink.add(self.topic, message, error, attempt, reason)
+            except Exception:
+                log.exception("Could not dead-letter %s", message.message_id)
+                message.nack()
+                return
+            log.warning(
+                "Dead-lettered %s job %s after %d attempt(s) (%s): %s",
+                self.topic, message.message_id, attempt, reason, error,
+            )
+            self._attempts.pop(message.message_id)
+            self.dead_lettered += 1
+            message.ack()
+            return
+        delay = backoff_delay(attempt, self.base, self.max_delay)
+        log.info(
+            "Retrying %s job %s in %.1fs (attempt %d): %s",
+            self.topic, message.message_id, delay, attempt, error,
+        )
+        self.retried += 1
+        redeliver_after(message, delay)
+
+    def stats(self) -> dict:
+        return {
+            "retried": self.retried,
+            "deadLettered": self.dead_lettered,
+            "maxAttempts": self.max_attempts,
+        }
@@ -0,0 +1,87 @@
+# app/delivery_ledger.py
+"""Idempotency ledger for queued email jobs.
+
+Pub/Sub delivers at least once: a nack, an expired ack deadline or a worker
+restart hands the same job out again. Every job carries an
+``idempotencyKey`` (alumniId + template + campaign, see ``job_key``), and
+the email worker records the key of each sent job in ``email_ledger``
+in the same batch commit as its ``email_jobs`` entry. Before sending, keys
+are looked up (front cache first, then one ``get_all``) and jobs already
+in the ledger are acked without calling the provider.
+
+Ledger documents are tiny (``{"sentAt"}``) and keyed by a 32-character
+digest. The front cache only remembers keys for EMAIL_LEDGER_CACHE_SECONDS,
+so it can be dropped at any time. Two workers holding the same job at the
+same moment can still both send it; the ledger closes the much more
+common redelivery-after-send window.
+"""
+from hashlib import blake2b
+import logging
+
+from .cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+LEDGER_COLLECTION = "email_ledger"
+
+
+def job_key(job: dict) -> str:
+    """Return the job's idempotency key, deriving it if it has none."""
+    key = job.get("idempotencyKey")
+    if key:
+        return key
+    parts = (
+        job.get("alumniId") or "",
+        job.get("template") or "",
+        job.get("campaignId") or "",
+    )
+    return blake2b(
+        "\x1f".join(parts).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+class DeliveryLedger:
+    def __init__(
+        self,
+        client,
+        fs,
+        cache_seconds: float = 3600.0,
+        cache_size: int = 100_000,
+    ):
+        self.client = client
+        self.fs = fs
+        self._recent = TTLCache(
+            max_entries=cache_size, default_ttl=cache_seconds
+        )
+        self.duplicates = 0
+
+    def _ref(self, key: str):
+        return self.client.collection(LEDGER_COLLECTION).document(key)
+
+    def delivered(self, keys) -> set:
+        """Return the subset of ``keys`` already recorded as sent."""
+        keys = set(keys)
+        done = {key for key in keys if self._recent.get(key)}
+        unknown = keys - done
+        if unknown:
+            refs = [self._ref(key) for key in unknown]
+            for snap in self.client.get_all(refs, field_paths=["sentAt"]):
+                if snap.exists:
+                    done.add(snap.id)
+                    self._recent.set(snap.id, True)
+        self.duplicates += len(done)
+        return done
+
+    def record(self, batch, key: str):
+        """Add the ledger write for ``key`` to ``batch``.
+
+        Call ``remember`` once the batch has committed.
+        """
+        batch.set(self._ref(key), {"sentAt": self.fs.SERVER_TIMESTAMP})
+
+    def remember(self, keys):
+        for key in keys:
+            self._recent.set(key, True)
+
+    def stats(self) -> dict:
+        return {"duplicatesSkipped": self.duplicates, **self._recent.stats()}
@@ -0,0 +1,215 @@
+# app/events.py
+"""Batched, optionally coalescing publisher for ``student.updated`` events.
+
+The Pub/Sub client is created lazily with explicit batch settings and
+publisher flow control. Every publish future is tracked so failures and
+publish latency show up in ``stats()`` instead of being silently dropped.
+With a local job queue (JOB_QUEUE_BACKEND memory or spool) events are
+published to that queue instead.
+
+With a coalescing window, change-sets for the same ``alumniId`` that arrive
+within the window are merged (later values win) and published as a single
+event, which keeps bulk edits from flooding webhook consumers.
+"""
+from datetime import datetime
+import json
+import logging
+import threading
+import time
+
+from .queues.pubsub import LazyClient
+
+log = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class EventPublisher:
+    def __init__(
+        self,
+        project_id: str,
+        topic: str,
+        batch_max_messages: int = 100,
+        batch_max_bytes: int = 1024 * 1024,
+        batch_max_latency: float = 0.05,
+        flow_max_messages: int = 1000,
+        flow_max_bytes: int = 10 * 1024 * 1024,
+        coalesce_window: float = 0.0,
+        retry_unavailable_after: float = 60.0,
+        queue=None,
+    ):
+        self.project_id = project_id
+        self.topic = topic
+        self.batch_max_messages = batch_max_messages
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_max_latency = batch_max_latency
+        self.flow_max_messages = flow_max_messages
+        self.flow_max_bytes = flow_max_bytes
+        self.coalesce_window = coalesce_window
+        self.queue = queue
+        self._publisher = LazyClient(
+            self._create_client, retry_unavailable_after
+        )
+        self._topic_path = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flusher = None
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self.published = 0
+        self.failed = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def _create_client(self):
+        # Lazy import of Pub/Sub to avoid startup failures if package
+        # isn't installed/compatible in the environment.
+        from google.cloud import pubsub_v1  # type: ignore
+        from google.cloud.pubsub_v1.types import (  # type: ignore
+            LimitExceededBehavior,
+        )
+        client = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=self.batch_max_messages,
+                max_bytes=self.batch_max_bytes,
+                max_latency=self.batch_max_latency,
+            ),
+            publisher_options=pubsub_v1.types.PublisherOptions(
+                flow_control=pubsub_v1.types.PublishFlowControl(
+                    message_limit=self.flow_max_messages,
+                    byte_limit=self.flow_max_bytes,
+                    limit_exceeded_behavior=LimitExceededBehavior.BLOCK,
+                ),
+            ),
+        )
+        self._topic_path = client.topic_path(self.project_id, self.topic)
+        return client
+
+    def warm(self) -> bool:
+        """Create the client ahead of the first publish."""
+        if self.queue is not None:
+            return self.queue.warm()
+        return self._publisher.get() is not None
+
+    def publish_student_updated(self, alumni_id: str, changes: dict):
+        if self.coalesce_window <= 0 or self._closed.is_set():
+            self._send(alumni_id, changes, 1)
+            return
+        with self._lock:
+            pending = self._pending.get(alumni_id)
+            if pending is None:
+                self._pending[alumni_id] = [dict(changes), 1]
+            else:
+                pending[0].update(changes)
+                pending[1] += 1
+                self.coalesced += 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="event-flusher", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(timeout=self.coalesce_window)
+            self.flush()
+
+    def flush(self):
+        """Publish all coalesced change-sets now."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for alumni_id, (changes, count) in pending.items():
+            self._send(alumni_id, changes, count)
+
+    def _send(self, alumni_id: str, changes: dict, count: int):
+        client = self._publisher.get() if self.queue is None else None
+        if client is None and self.queue is None:
+            with self._lock:
+                self.skipped += 1
+            return
+        event = {
+            "event": "student.updated",
+            "alumniId": alumni_id,
+            "changes": changes,
+        }
+        if count > 1:
+            event["coalescedCount"] = count
+        payload = json.dumps(event, default=_json_default).encode("utf-8")
+        if self.queue is not None:
+            # counts hand-offs; the queue's stats track delivery to Pub/Sub
+            accepted = self.queue.publish(self.topic, payload)
+            with self._lock:
+                if accepted:
+                    self.published += 1
+                else:
+                    self.failed += 1
+            return
+        started = time.monotonic()
+        try:
+            future = client.publish(self._topic_path, payload)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.warning("Publish of student.updated failed: %s", e)
+            return
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(lambda f: self._on_done(f, started))
+
+    def _on_done(self, future, started: float):
+        latency = time.monotonic() - started
+        exc = future.exception()
+        with self._lock:
+            self.in_flight -= 1
+            if exc is not None:
+                self.failed += 1
+            else:
+                self.published += 1
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+        if exc is not None:
+            log.warning("Publish of student.updated failed: %s", exc)
+
+    def close(self, timeout: float = 5.0):
+        """Publish pending events and wait for in-flight publishes."""
+        self._closed.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+        self.flush()
+        if self._publisher.client is not None:
+            try:
+                self._publisher.client.stop()
+            except Exception as e:
+                log.warning("Publisher stop failed: %s", e)
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.in_flight == 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            ok = self.published
+            return {
+                "ready": (
+                    self._publisher.client is not None
+                    or self.queue is not None
+                ),
+                "published": ok,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "coalesced": self.coalesced,
+                "pending": len(self._pending),
+                "inFlight": self.in_flight,
+                "avgLatencyMs": (
+                    round(self._latency_total / ok * 1000, 2) if ok else 0.0
+                ),
+                "maxLatencyMs": round(self._latency_max * 1000, 2),
+            }
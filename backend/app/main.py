@@ -1,6 +1,8 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
@@ -22,9 +24,38 @@ from .routes.students import router as students_router
 from .routes.admin import router as admin_router
 from .routes.webhooks import router as webhooks_router
 from .routes.bulk_email import router as bulk_email_router
+from .auth import token_cache_stats
+from .config import JOB_QUEUE_RUN_WORKERS, WARMUP_DEADLINE_SECONDS
+from .db import audit_writer, entity_cache_stats, event_publisher
+from .queues import get_job_queue
+from .services import campaign_service, email_service, index_rebuild
+from .warmup import readiness, warm_up
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):  # pragma: no cover - env dependent
+    _startup_banner()
+    # Create storage/Pub/Sub/SendGrid clients before taking traffic.
+    await run_in_threadpool(warm_up, WARMUP_DEADLINE_SECONDS)
+    workers = _start_workers() if JOB_QUEUE_RUN_WORKERS else []
+    yield
+    # Stop background bulk sends at their next chunk boundary.
+    await run_in_threadpool(campaign_service.shutdown, 10.0)
+    index_rebuild.shutdown()
+    for worker, future in workers:
+        await run_in_threadpool(worker.drain, future)
+    # Write out buffered audit entries before the worker exits.
+    flushed = await run_in_threadpool(audit_writer.close, 10.0)
+    if not flushed:
+        log.warning(
+            "Audit writer still had %d pending entries at shutdown",
+            audit_writer.stats()["pending"],
+        )
+    await run_in_threadpool(event_publisher.close, 10.0)
+    email_service.close_smtp_pool()
 
 
-app = FastAPI(title="Alumni SCL API")
+app = FastAPI(title="Alumni SCL API", lifespan=lifespan)
 
 # Minimal logging config (Render sometimes drops DEBUG without handlers)
 if os.getenv("APP_DEBUG", "0") == "1":  # pragma: no cover - runtime env
@@ -91,6 +122,19 @@ def healthz():
     return {"ok": True, "degraded": degraded}
 
 
+@app.get("/readyz")
+def readyz():
+    """Readiness probe: 503 until warm-up finished and storage is usable.
+
+    Unlike /healthz this reflects external dependencies, so load balancers
+    only route to workers whose clients are warm.
+    """
+    report = readiness()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503, content=report
+    )
+
+
 @app.get("/favicon.ico", include_in_schema=False)
 def favicon():  # pragma: no cover - browser convenience route
     # Return empty 204 to avoid noisy 404s in logs. Frontend serves the actual
@@ -110,10 +154,27 @@ def app_info():
         "platform": platform.platform(),
         "fastapi": getattr(FastAPI, "__module__", "fastapi"),
         "cwd": _os.getcwd(),
+        "tokenCache": token_cache_stats(),
+        "entityCache": entity_cache_stats(),
+        "auditWriter": audit_writer.stats(),
+        "events": event_publisher.stats(),
+        "smtpPool": email_service.smtp_pool_stats(),
+        "emailRates": email_service.rate_limiter.metrics(),
+        "jobQueue": get_job_queue().stats(),
     }
 
 
-@app.on_event("startup")
+def _start_workers():  # pragma: no cover - env dependent
+    """Run the email and parse workers in this process (local queues)."""
+    from .workers import email_worker, parse_worker
+
+    log.info("Running email and parse workers in-process")
+    return [
+        (email_worker, email_worker.subscribe()),
+        (parse_worker, parse_worker.subscribe()),
+    ]
+
+
 def _startup_banner():  # pragma: no cover - env dependent
     log.info("Starting Alumni SCL API")
     log.info("Python %s", os.sys.version.split()[0])
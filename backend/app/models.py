@@ -60,6 +60,9 @@ class BulkEmailRequest(BaseModel):
               Admins can specify a schoolId or collegeId depending on scope.
     htmlBody: Optional HTML content; if provided will be sent as HTML.
     previewOnly: If true, returns the list of recipient emails without sending.
+    template: Optional registered template (e.g. 'announcement') that wraps
+              subject/body. {name}, {alumniId} and {college} in the text are
+              filled per recipient either way.
     """
     subject: str
     body: str
@@ -67,3 +70,4 @@ class BulkEmailRequest(BaseModel):
     targetId: Optional[str] = None
     htmlBody: Optional[str] = None
     previewOnly: bool = False
+    template: Optional[str] = None
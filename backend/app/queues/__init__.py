@@ -0,0 +1,42 @@
+# app/queues/__init__.py
+"""Job queue used for email/parse jobs and student.updated events.
+
+JOB_QUEUE_BACKEND selects Pub/Sub (default), an in-memory queue or a
+SQLite file spool. The local backends let the API and the workers run in
+one process (JOB_QUEUE_RUN_WORKERS) or on one machine without the Pub/Sub
+emulator.
+"""
+import threading
+
+from ..config import (
+    JOB_QUEUE_ACK_DEADLINE_SECONDS,
+    JOB_QUEUE_BACKEND,
+    JOB_QUEUE_PATH,
+    PROJECT_ID,
+)
+
+_queue = None
+_lock = threading.Lock()
+
+
+def _create():
+    if JOB_QUEUE_BACKEND == "memory":
+        from .memory import MemoryQueue
+        return MemoryQueue(ack_deadline=JOB_QUEUE_ACK_DEADLINE_SECONDS)
+    if JOB_QUEUE_BACKEND == "spool":
+        from .spool import SpoolQueue
+        return SpoolQueue(
+            JOB_QUEUE_PATH, ack_deadline=JOB_QUEUE_ACK_DEADLINE_SECONDS
+        )
+    from .pubsub import PubSubQueue
+    return PubSubQueue(PROJECT_ID)
+
+
+def get_job_queue():
+    """Return the process-wide job queue."""
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                _queue = _create()
+    return _queue
@@ -0,0 +1,255 @@
+# app/queues/base.py
+"""Shared behaviour of the in-process job queues (memory and spool).
+
+Both mirror the slice of Pub/Sub the app uses: ``publish(topic, data)``
+and ``subscribe(topic, callback)`` returning a future-like handle whose
+``cancel()`` stops pulling and waits for running callbacks, like a
+streaming pull with ``await_callbacks_on_shutdown``. Messages handed to
+callbacks have ``data``, ``attributes``, ``message_id``,
+``delivery_attempt``, ``ack()`` and ``nack()``, plus ``nack_after(seconds)``
+to redeliver only after a backoff.
+
+A leased message that is neither acked nor nacked within
+``ack_deadline`` seconds becomes deliverable again; a callback that raises
+nacks its message. Like the Pub/Sub client's lease management, a
+subscription keeps extending the leases of messages it has delivered and
+that are not settled yet (a callback may hand them to a batch), for up to
+``max_lease`` seconds. Each delivery carries its own lease: a late ack or
+nack of an earlier delivery doesn't touch the redelivered copy.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Pub/Sub's default max_lease_duration
+MAX_LEASE_SECONDS = 3600.0
+
+
+class QueuedMessage:
+    __slots__ = (
+        "_queue", "_settled", "_lease", "topic", "message_id", "data",
+        "attributes", "delivery_attempt",
+    )
+
+    def __init__(self, queue, topic, message_id, data, attributes, attempt):
+        self._queue = queue
+        self._settled = False
+        # the attempt number identifies this delivery's lease
+        self._lease = attempt
+        self.topic = topic
+        self.message_id = message_id
+        self.data = data
+        self.attributes = attributes
+        self.delivery_attempt = attempt
+
+    def _settle(self, ack: bool, delay: float = 0.0):
+        if self._settled:
+            return
+        self._settled = True
+        if ack:
+            self._queue.acked += 1
+            self._queue._ack(self.topic, self.message_id, self._lease)
+        else:
+            self._queue.nacked += 1
+            self._queue._nack(self.topic, self.message_id, self._lease, delay)
+
+    def ack(self):
+        self._settle(True)
+
+    def nack(self):
+        self._settle(False)
+
+    def nack_after(self, seconds: float):
+        """Return the message to the queue, deliverable after ``seconds``."""
+        self._settle(False, max(0.0, seconds))
+
+
+class Subscription:
+    """Future-like handle for a running subscription."""
+
+    def __init__(
+        self,
+        queue,
+        topic,
+        callback,
+        max_messages,
+        concurrency,
+        max_lease: float = MAX_LEASE_SECONDS,
+    ):
+        self.queue = queue
+        self.topic = topic
+        self.callback = callback
+        self.max_messages = max(1, max_messages)
+        self.max_lease = max_lease
+        # delivered, unsettled messages -> time of delivery
+        self._held = {}
+        self._extended_at = time.monotonic()
+        self._slots = threading.Semaphore(self.max_messages)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, concurrency or self.max_messages),
+            thread_name_prefix=f"queue-{topic}",
+        )
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._pull_loop, name=f"queue-pull-{topic}", daemon=True
+        )
+        self._thread.start()
+
+    def _handle(self, message: QueuedMessage):
+        try:
+            self.callback(message)
+        except Exception:
+            log.exception("Job callback failed on %s", self.topic)
+            message.nack()
+        finally:
+            self._slots.release()
+
+    def _extend_leases(self):
+        """Renew the leases of held messages every third of a deadline."""
+        now = time.monotonic()
+        if now - self._extended_at < self.queue.ack_deadline / 3:
+            return
+        self._extended_at = now
+        for message, delivered in list(self._held.items()):
+            if message._settled or now - delivered > self.max_lease:
+                del self._held[message]
+        if self._held:
+            self.queue._extend(
+                self.topic, [(m.message_id, m._lease) for m in self._held]
+            )
+
+    def _pull_loop(self):
+        try:
+            while not self._cancelled.is_set():
+                self._extend_leases()
+                if not self._slots.acquire(timeout=0.2):
+                    continue
+                free = 1
+                while free < self.max_messages and self._slots.acquire(
+                    blocking=False
+                ):
+                    free += 1
+                messages = self.queue._pull(self.topic, free)
+                for _ in range(free - len(messages)):
+                    self._slots.release()
+                if not messages:
+                    self.queue._wait(self.topic, self._cancelled)
+                    continue
+                now = time.monotonic()
+                for message in messages:
+                    self._held[message] = now
+                    self._executor.submit(self._handle, message)
+        except Exception as e:
+            log.exception("Job queue pull loop for %s failed", self.topic)
+            self._error = e
+        finally:
+            # like await_callbacks_on_shutdown: let running callbacks finish
+            self._executor.shutdown(wait=True)
+            self._done.set()
+
+    def cancel(self):
+        """Stop pulling; running callbacks still complete."""
+        self._cancelled.set()
+        self.queue._wake(self.topic)
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: float = None):
+        if not self._done.wait(timeout):
+            raise FutureTimeout()
+        if self._error is not None:
+            raise self._error
+
+
+class InProcessQueue:
+    """Job queue over ``_put``/``_pull``/``_ack``/``_nack`` primitives."""
+
+    def __init__(self, ack_deadline: float = 60.0, poll_interval: float = 1.0):
+        self.ack_deadline = ack_deadline
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._subscriptions = []
+        self.published = 0
+        self.acked = 0
+        self.nacked = 0
+
+    # persistence primitives -------------------------------------------------
+    def _put(self, topic: str, data: bytes, attributes: dict):
+        raise NotImplementedError
+
+    def _pull(self, topic: str, max_messages: int) -> list:
+        """Lease up to ``max_messages`` QueuedMessages."""
+        raise NotImplementedError
+
+    def _ack(self, topic: str, message_id, lease):
+        """Delete the message if ``lease`` is still its current lease."""
+        raise NotImplementedError
+
+    def _nack(self, topic: str, message_id, lease, delay: float = 0.0):
+        """Release the message if ``lease`` is still its current lease."""
+        raise NotImplementedError
+
+    def _extend(self, topic: str, leases: list):
+        """Push back the deadline of current ``[(message_id, lease)]``."""
+        raise NotImplementedError
+
+    def _depth(self) -> dict:
+        raise NotImplementedError
+
+    # shared behaviour -------------------------------------------------------
+    def _wait(self, topic: str, cancelled: threading.Event):
+        with self._cond:
+            if not cancelled.is_set():
+                self._cond.wait(self.poll_interval)
+
+    def _wake(self, topic: str):
+        with self._cond:
+            self._cond.notify_all()
+
+    def warm(self) -> bool:
+        return True
+
+    def publish(self, topic: str, data: bytes, **attributes) -> bool:
+        self._put(topic, data, attributes)
+        self.published += 1
+        self._wake(topic)
+        return True
+
+    def subscribe(
+        self,
+        topic: str,
+        callback,
+        max_messages: int = 100,
+        max_bytes: int = None,
+        concurrency: int = None,
+    ) -> Subscription:
+        """Deliver ``topic`` to ``callback`` on ``concurrency`` threads.
+
+        At most ``max_messages`` are leased at once; ``max_bytes`` is only
+        accepted for parity with the Pub/Sub backend.
+        """
+        subscription = Subscription(
+            self, topic, callback, max_messages, concurrency
+        )
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def close(self):
+        for subscription in self._subscriptions:
+            subscription.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "published": self.published,
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "depth": self._depth(),
+        }
@@ -0,0 +1,101 @@
+# app/queues/memory.py
+"""In-memory job queue (JOB_QUEUE_BACKEND=memory).
+
+Jobs live in this process only and are lost on restart, so the API runs
+the workers in-process (JOB_QUEUE_RUN_WORKERS). Meant for local runs,
+tests and benchmarks.
+"""
+from collections import deque
+import heapq
+import itertools
+import time
+
+from .base import InProcessQueue, QueuedMessage
+
+
+class MemoryQueue(InProcessQueue):
+    backend = "memory"
+
+    def __init__(self, ack_deadline: float = 60.0):
+        super().__init__(ack_deadline=ack_deadline)
+        self._ids = itertools.count(1)
+        # topic -> deque of [id, data, attributes, attempts]
+        self._ready = {}
+        # topic -> {id: (entry, lease deadline)}
+        self._leased = {}
+        # topic -> heap of (available at, id, entry) for delayed retries
+        self._delayed = {}
+
+    def _put(self, topic: str, data: bytes, attributes: dict):
+        with self._cond:
+            self._ready.setdefault(topic, deque()).append(
+                [str(next(self._ids)), data, dict(attributes), 0]
+            )
+
+    def _pull(self, topic: str, max_messages: int) -> list:
+        now = time.monotonic()
+        with self._cond:
+            ready = self._ready.setdefault(topic, deque())
+            leased = self._leased.setdefault(topic, {})
+            expired = [
+                message_id for message_id, (_, deadline) in leased.items()
+                if deadline <= now
+            ]
+            for message_id in expired:
+                ready.append(leased.pop(message_id)[0])
+            delayed = self._delayed.get(topic)
+            while delayed and delayed[0][0] <= now:
+                ready.append(heapq.heappop(delayed)[2])
+            out = []
+            while ready and len(out) < max_messages:
+                entry = ready.popleft()
+                entry[3] += 1
+                leased[entry[0]] = (entry, now + self.ack_deadline)
+                out.append(QueuedMessage(self, topic, *entry))
+            return out
+
+    def _release(self, topic: str, message_id, lease):
+        """Remove and return a leased entry held under ``lease``."""
+        leased = self._leased.get(topic, {})
+        current = leased.get(message_id)
+        if current is None or current[0][3] != lease:
+            return None
+        return leased.pop(message_id)
+
+    def _ack(self, topic: str, message_id, lease):
+        with self._cond:
+            self._release(topic, message_id, lease)
+
+    def _nack(self, topic: str, message_id, lease, delay: float = 0.0):
+        with self._cond:
+            leased = self._release(topic, message_id, lease)
+            if leased is None:
+                return
+            if delay > 0:
+                heapq.heappush(
+                    self._delayed.setdefault(topic, []),
+                    (time.monotonic() + delay, int(message_id), leased[0]),
+                )
+            else:
+                self._ready[topic].append(leased[0])
+                self._cond.notify_all()
+
+    def _extend(self, topic: str, leases: list):
+        deadline = time.monotonic() + self.ack_deadline
+        with self._cond:
+            leased = self._leased.get(topic, {})
+            for message_id, lease in leases:
+                current = leased.get(message_id)
+                if current is not None and current[0][3] == lease:
+                    leased[message_id] = (current[0], deadline)
+
+    def _depth(self) -> dict:
+        with self._cond:
+            return {
+                topic: {
+                    "ready": len(self._ready.get(topic, ())),
+                    "leased": len(self._leased.get(topic, ())),
+                    "delayed": len(self._delayed.get(topic, ())),
+                }
+                for topic in set(self._ready) | set(self._leased)
+            }
@@ -0,0 +1,173 @@
+# app/queues/pubsub.py
+"""Google Cloud Pub/Sub job queue (JOB_QUEUE_BACKEND=pubsub, the default).
+
+``google.cloud.pubsub_v1`` is imported when the first client is needed, so
+the API and workers can be imported without the package or credentials.
+A topic ``name`` is consumed through the subscription ``{name}-sub``.
+
+Publishing is asynchronous: ``publish`` returns once the client has
+accepted the message, and a done-callback counts it as published or
+failed (and logs the failure), so ``stats`` reflects what reached Pub/Sub.
+
+``LazyClient`` is also used by the ``student.updated`` publisher in
+events.py.
+"""
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class LazyClient:
+    """A client built by ``factory()`` on first use.
+
+    ``get()`` returns None while the client is unavailable: a failed
+    creation is not retried for ``retry_unavailable_after`` seconds, so
+    callers don't each pay for credential resolution when Pub/Sub isn't
+    configured. Creation runs under a lock of its own, so callers' locks
+    aren't held while it resolves credentials.
+    """
+
+    def __init__(self, factory, retry_unavailable_after: float = 60.0):
+        self._factory = factory
+        self.retry_unavailable_after = retry_unavailable_after
+        self.client = None
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.client is not None:
+            return self.client
+        if time.monotonic() < self._unavailable_until:
+            return None
+        with self._lock:
+            if self.client is None:
+                try:
+                    self.client = self._factory()
+                except Exception as e:
+                    log.warning("Pub/Sub publisher unavailable: %s", e)
+                    self._unavailable_until = (
+                        time.monotonic() + self.retry_unavailable_after
+                    )
+                    return None
+            return self.client
+
+
+def _publisher_client():
+    from google.cloud import pubsub_v1  # type: ignore
+    return pubsub_v1.PublisherClient()
+
+
+class PubSubQueue:
+    backend = "pubsub"
+
+    def __init__(self, project_id: str, retry_unavailable_after: float = 60.0):
+        self.project_id = project_id
+        self._publisher = LazyClient(
+            _publisher_client, retry_unavailable_after
+        )
+        self._subscriber = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.failed = 0
+        self.dropped = 0
+        self.in_flight = 0
+
+    def warm(self) -> bool:
+        return self._publisher.get() is not None
+
+    def publish(self, topic: str, data: bytes, **attributes) -> bool:
+        """Hand ``data`` to the publisher; False if it couldn't take it.
+
+        Without Pub/Sub the job is counted as dropped. Failures after the
+        client accepted the message are counted and logged by ``_on_done``.
+        """
+        publisher = self._publisher.get()
+        if publisher is None:
+            with self._lock:
+                self.dropped += 1
+            log.warning("Pub/Sub unavailable; dropped job for %s", topic)
+            return False
+        try:
+            future = publisher.publish(
+                publisher.topic_path(self.project_id, topic),
+                data,
+                **attributes,
+            )
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.warning("Publish to %s failed: %s", topic, e)
+            return False
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(lambda f: self._on_done(f, topic))
+        return True
+
+    def _on_done(self, future, topic: str):
+        exc = future.exception()
+        with self._lock:
+            self.in_flight -= 1
+            if exc is None:
+                self.published += 1
+            else:
+                self.failed += 1
+        if exc is not None:
+            log.warning("Publish to %s failed: %s", topic, exc)
+
+    def subscribe(
+        self,
+        topic: str,
+        callback,
+        max_messages: int = 100,
+        max_bytes: int = 10 * 1024 * 1024,
+        concurrency: int = None,
+    ):
+        """Start a streaming pull; returns its StreamingPullFuture."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        from google.cloud import pubsub_v1  # type: ignore
+        from google.cloud.pubsub_v1.subscriber import (  # type: ignore
+            scheduler,
+        )
+
+        with self._lock:
+            if self._subscriber is None:
+                self._subscriber = pubsub_v1.SubscriberClient()
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, concurrency or max_messages),
+            thread_name_prefix=f"queue-{topic}",
+        )
+        return self._subscriber.subscribe(
+            self._subscriber.subscription_path(
+                self.project_id, f"{topic}-sub"
+            ),
+            callback=callback,
+            flow_control=pubsub_v1.types.FlowControl(
+                max_messages=max_messages, max_bytes=max_bytes
+            ),
+            scheduler=scheduler.ThreadScheduler(executor=executor),
+            # cancel() waits for running callbacks instead of abandoning them
+            await_callbacks_on_shutdown=True,
+        )
+
+    def close(self):
+        if self._subscriber is not None:
+            self._subscriber.close()
+        if self._publisher.client is not None:
+            # sends batched messages that haven't gone out yet
+            try:
+                self._publisher.client.stop()
+            except Exception as e:
+                log.warning("Publisher stop failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "ready": self._publisher.client is not None,
+            "published": self.published,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "inFlight": self.in_flight,
+        }
@@ -0,0 +1,130 @@
+# app/queues/spool.py
+"""SQLite file-spool job queue (JOB_QUEUE_BACKEND=spool).
+
+Jobs are rows in a ``jobs`` table of the file at JOB_QUEUE_PATH, so they
+survive restarts and can be shared by the API and separately started
+workers on one machine. A pull leases rows by setting ``leased_until`` and
+counting the attempt, which identifies the lease; an ack deletes the row
+and a nack clears the lease, optionally pushing ``available_at`` back for
+a retry backoff, unless the row has been leased again since. Workers in another
+process notice new jobs within ``poll_interval`` seconds.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from .base import InProcessQueue, QueuedMessage
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT NOT NULL,
+        data BLOB NOT NULL,
+        attributes TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        leased_until REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (topic, available_at)",
+)
+
+
+class SpoolQueue(InProcessQueue):
+    backend = "spool"
+
+    def __init__(
+        self,
+        path: str,
+        ack_deadline: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        super().__init__(ack_deadline, poll_interval)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    def _put(self, topic: str, data: bytes, attributes: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (topic, data, attributes, available_at) "
+                "VALUES (?, ?, ?, ?)",
+                (topic, data, json.dumps(attributes), time.time()),
+            )
+
+    def _pull(self, topic: str, max_messages: int) -> list:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE jobs SET leased_until = ?, attempts = attempts + 1 "
+                "WHERE id IN ("
+                " SELECT id FROM jobs WHERE topic = ? AND available_at <= ?"
+                " AND (leased_until IS NULL OR leased_until < ?)"
+                " ORDER BY id LIMIT ?"
+                ") RETURNING id, data, attributes, attempts",
+                (now + self.ack_deadline, topic, now, now, max_messages),
+            ).fetchall()
+        rows.sort()
+        return [
+            QueuedMessage(
+                self, topic, str(row_id), bytes(data), json.loads(attrs),
+                attempts,
+            )
+            for row_id, data, attrs, attempts in rows
+        ]
+
+    def _ack(self, topic: str, message_id, lease):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id = ? AND attempts = ?",
+                (int(message_id), lease),
+            )
+
+    def _nack(self, topic: str, message_id, lease, delay: float = 0.0):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET leased_until = NULL, available_at = ? "
+                "WHERE id = ? AND attempts = ?",
+                (time.time() + delay, int(message_id), lease),
+            )
+        self._wake(topic)
+
+    def _extend(self, topic: str, leases: list):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET leased_until = ? "
+                "WHERE id = ? AND attempts = ? AND leased_until IS NOT NULL",
+                [
+                    (time.time() + self.ack_deadline, int(message_id), lease)
+                    for message_id, lease in leases
+                ],
+            )
+
+    def _depth(self) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT topic,"
+                " SUM(leased_until >= ?),"
+                " SUM(available_at > ? AND"
+                "     (leased_until IS NULL OR leased_until < ?)),"
+                " COUNT(*)"
+                " FROM jobs GROUP BY topic",
+                (now, now, now),
+            ).fetchall()
+        return {
+            topic: {
+                "ready": total - (leased or 0) - (delayed or 0),
+                "leased": leased or 0,
+                "delayed": delayed or 0,
+            }
+            for topic, leased, delayed, total in rows
+        }
@@ -0,0 +1,241 @@
+# app/rate_limit.py
+"""Adaptive token-bucket rate limiting for outgoing email.
+
+``SendRateLimiter`` keeps one bucket per provider ("sendgrid", "smtp") and
+per configured recipient domain. Each send takes one token per recipient
+from the bucket of every recipient domain and, from its provider bucket,
+one per recipient or one per message when the caller says how many
+messages it sends (an SMTP BCC message is one submission however many
+recipients it has). Sends wait when a bucket is in debt, so large chunks
+are paced rather than rejected.
+
+Buckets adapt to the provider: a throttle response (SendGrid 429, SMTP
+421/451) halves the bucket's rate and pauses it for the advertised
+retry-after (or an exponential backoff), and every second of successful
+sends afterwards raises the rate again by a tenth of the configured
+maximum. Sends therefore settle just under the rate the provider accepts
+and recover on their own once throttling stops. A throttled domain
+without a limit of its own gets a bucket at the provider's rate in
+recipients per second (for a provider limited per message, its rate times
+the recipients per message sent so far).
+"""
+from collections import deque
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Window for the observed send rate reported by ``metrics``.
+_OBSERVE_SECONDS = 10.0
+
+
+def parse_limits(spec: str) -> dict:
+    """Parse "sendgrid=100,smtp=10,gmail.com=20" into {key: per second}.
+
+    Keys with a dot are recipient domains; "*" sets a limit applied to each
+    domain without its own entry.
+    """
+    limits = {}
+    for item in (spec or "").split(","):
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+        if not key or not sep:
+            continue
+        try:
+            limits[key] = float(value)
+        except ValueError:
+            log.warning("Ignoring invalid email rate limit %r", item)
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None):
+        self.max_rate = rate
+        self.min_rate = max(0.1, rate * 0.05)
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._last_increase = 0.0
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
+        self._sent = deque()
+        self.throttled_count = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        start = max(self._last, self._paused_until)
+        if now > start:
+            self._tokens = min(
+                self.burst, self._tokens + (now - start) * self.rate
+            )
+        self._last = now
+
+    def reserve(self, n: float = 1) -> float:
+        """Take ``n`` tokens and return the seconds to wait before sending.
+
+        Tokens may go negative; later callers then wait for the debt too.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= n
+            wait = max(0.0, self._paused_until - now)
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            self.waited += wait
+            return wait
+
+    def throttled(self, retry_after: float = None):
+        with self._lock:
+            now = time.monotonic()
+            self._consecutive_throttles += 1
+            self.throttled_count += 1
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            pause = retry_after
+            if pause is None:
+                pause = min(60.0, 2.0 ** self._consecutive_throttles)
+            self._paused_until = max(self._paused_until, now + pause)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_increase = now
+
+    def succeeded(self, n: float = 1):
+        with self._lock:
+            now = time.monotonic()
+            self._consecutive_throttles = 0
+            self._sent.append((now, n))
+            while self._sent and now - self._sent[0][0] > _OBSERVE_SECONDS:
+                self._sent.popleft()
+            if self.rate < self.max_rate and now - self._last_increase >= 1:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate * 0.1
+                )
+                self._last_increase = now
+
+    def metrics(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(
+                n for t, n in self._sent if now - t <= _OBSERVE_SECONDS
+            )
+            return {
+                "ratePerSecond": round(self.rate, 2),
+                "maxRatePerSecond": self.max_rate,
+                "observedPerSecond": round(recent / _OBSERVE_SECONDS, 2),
+                "pausedSeconds": round(max(0.0, self._paused_until - now), 2),
+                "throttled": self.throttled_count,
+                "waitedSeconds": round(self.waited, 2),
+            }
+
+
+def _domain(email: str) -> str:
+    return email.rpartition("@")[2].strip().lower()
+
+
+class SendRateLimiter:
+    def __init__(self, limits: dict):
+        self.limits = dict(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # provider -> [recipients, tokens] charged so far
+        self._charged = {}
+
+    def _bucket(self, key: str, domain: bool = False):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            return bucket
+        rate = self.limits.get(key)
+        if rate is None and domain:
+            rate = self.limits.get("*")
+        if not rate or rate <= 0:
+            return None
+        with self._lock:
+            return self._buckets.setdefault(key, TokenBucket(rate))
+
+    def _domain_counts(self, recipients) -> dict:
+        counts = {}
+        for email in recipients:
+            domain = _domain(email)
+            counts[domain] = counts.get(domain, 0) + 1
+        return counts
+
+    def acquire(
+        self, provider: str, recipients: list, messages: int = None
+    ) -> float:
+        """Block until ``recipients`` may be sent through ``provider``.
+
+        The provider is charged ``messages`` tokens if given, otherwise one
+        per recipient.
+        """
+        waits = []
+        tokens = len(recipients) if messages is None else messages
+        with self._lock:
+            charged = self._charged.setdefault(provider, [0, 0])
+            charged[0] += len(recipients)
+            charged[1] += tokens
+        bucket = self._bucket(provider)
+        if bucket is not None:
+            waits.append(bucket.reserve(tokens))
+        for domain, count in self._domain_counts(recipients).items():
+            bucket = self._bucket(domain, domain=True)
+            if bucket is not None:
+                waits.append(bucket.reserve(count))
+        wait = max(waits, default=0.0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def _recipient_rate(self, provider: str) -> float:
+        """The provider's limit converted to recipients per second."""
+        rate = self.limits.get(provider)
+        with self._lock:
+            recipients, tokens = self._charged.get(provider, (0, 0))
+        if rate and tokens:
+            rate *= max(1.0, recipients / tokens)
+        return rate
+
+    def succeeded(
+        self, provider: str, recipients: list, messages: int = None
+    ):
+        bucket = self._bucket(provider)
+        if bucket is not None:
+            bucket.succeeded(
+                len(recipients) if messages is None else messages
+            )
+        for domain, count in self._domain_counts(recipients).items():
+            bucket = self._bucket(domain, domain=True)
+            if bucket is not None:
+                bucket.succeeded(count)
+
+    def throttled(
+        self, provider: str, domains=None, retry_after: float = None
+    ) -> bool:
+        """Back off ``provider``, or only ``domains`` when given.
+
+        A throttled domain without a limit of its own starts being tracked
+        at the provider's rate in recipients per second. Returns False if no
+        bucket applies, in which case the caller has to wait on its own.
+        """
+        handled = False
+        for key in list(domains) if domains else [provider]:
+            bucket = self._bucket(key, domain=bool(domains))
+            rate = self._recipient_rate(provider) if domains else None
+            if bucket is None and rate:
+                with self._lock:
+                    bucket = self._buckets.setdefault(key, TokenBucket(rate))
+            if bucket is None:
+                continue
+            bucket.throttled(retry_after)
+            handled = True
+            log.warning(
+                "Email send throttled (%s); backing off to %.1f/s",
+                key, bucket.rate,
+            )
+        return handled
+
+    def metrics(self) -> dict:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.metrics() for key, bucket in buckets.items()}
@@ -0,0 +1,398 @@
+# app/recipient_index.py
+"""Per-school / per-college recipient index for bulk email.
+
+Each target (a schoolId or collegeId) owns a number of shard documents in
+``recipient_index``, each holding maps of ``alumniId -> normalized email``
+and ``alumniId -> first name`` (for personalized sends) plus a ``count``.
+Student writes in db.py add the matching index updates to the same batch
+or transaction, so resolving a target's recipients reads a handful of
+documents instead of every student, and the recipient count comes from
+the same read. Writes that bypass db.py, such
+as the dashboards adding or reassigning students straight from the
+browser, are not indexed, which is why RECIPIENT_INDEX_ENABLED is off by
+default.
+
+Shards spread writes when many students of one college are created at
+once, and keep each document within Firestore's limits (1 MiB and 20,000
+fields per document): a rebuild gives a target RECIPIENT_INDEX_SHARDS
+shards, or more if it has over MAX_SHARD_ENTRIES students per shard, and
+records the count in the target's ``meta`` document, which student writes
+read (through a cache) to find an entry's shard. The maps are exempt from
+indexing (firestore.indexes.json), so their entries don't count towards
+the per-document index entry limit either. Because counters are
+maintained incrementally, an index is only trusted once a full rebuild
+has written its ``meta`` document; until then callers fall back to
+scanning students. Rebuild with
+``python -m app.recipient_index rebuild`` or in the background with POST
+/admin/recipient-index/rebuild (see services/index_rebuild.py).
+"""
+from zlib import crc32
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+INDEX_COLLECTION = "recipient_index"
+# student fields whose values are bulk-email targets
+INDEXED_FIELDS = ("schoolId", "collegeId")
+# bumped when the shard layout changes; older indexes need a rebuild
+INDEX_FORMAT = 3
+# Entries per shard a rebuild aims for. An entry is two map fields of about
+# 100 bytes together, so a target can grow to a few times this before a
+# shard nears a document limit; read_target warns well before that.
+MAX_SHARD_ENTRIES = 4000
+# Firestore caps a commit at 10 MiB; stay well below it
+MAX_COMMIT_BYTES = 8 * 1024 * 1024
+
+
+def normalize_email(email) -> str:
+    """Return the comparison form of an address ('' if unusable)."""
+    if not isinstance(email, str):
+        return ""
+    email = email.strip()
+    return email.lower() if "@" in email else ""
+
+
+def shard_of(alumni_id: str, shards: int) -> int:
+    return crc32(alumni_id.encode("utf-8")) % shards
+
+
+def shards_for(entries: int, minimum: int) -> int:
+    """Shard count a rebuild gives a target with ``entries`` students."""
+    return max(minimum, -(-entries // MAX_SHARD_ENTRIES))
+
+
+def _shard_id(field: str, target_id: str, shard: int) -> str:
+    return f"{field}:{target_id}:{shard}"
+
+
+def _meta_id(field: str, target_id: str) -> str:
+    return f"{field}:{target_id}:meta"
+
+
+def _entries(doc: dict) -> dict:
+    """Return {(field, target_id): (email, name)} for a student's targets."""
+    if not doc:
+        return {}
+    email = normalize_email(doc.get("email"))
+    if not email:
+        return {}
+    name = doc.get("firstName")
+    entry = (email, name.strip() if isinstance(name, str) else "")
+    return {
+        (field, doc[field]): entry
+        for field in INDEXED_FIELDS
+        if isinstance(doc.get(field), str) and doc[field]
+    }
+
+
+def target_shards(client, keys, shards: int, cache=None) -> dict:
+    """Return ``{(field, target_id): shard count}`` for ``keys``.
+
+    Built targets use the count in their ``meta`` document, others
+    ``shards``. ``cache`` (a TTLCache) saves the ``meta`` reads; a count
+    cached across a rebuild that changed it can put an entry in the wrong
+    shard until the next rebuild.
+    """
+    counts, missing = {}, []
+    for key in keys:
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            missing.append(key)
+        else:
+            counts[key] = cached
+    if missing:
+        collection = client.collection(INDEX_COLLECTION)
+        refs = {
+            _meta_id(*key): collection.document(_meta_id(*key))
+            for key in missing
+        }
+        built = {
+            snap.id: (snap.to_dict() or {}).get("shards")
+            for snap in client.get_all(list(refs.values()))
+            if snap.exists
+        }
+        for key in missing:
+            count = built.get(_meta_id(*key)) or shards
+            counts[key] = count
+            if cache is not None:
+                cache.set(key, count)
+    return counts
+
+
+def index_writes(
+    client, fs, alumni_id: str, old: dict, new: dict, shards, cache=None
+):
+    """Return ``[(ref, data)]`` merge-sets moving a student's entries.
+
+    ``old`` / ``new`` are the student document before and after the write
+    (None for a create). Only shards whose entry changes are touched; see
+    ``target_shards`` for ``shards`` and ``cache``.
+    """
+    before, after = _entries(old), _entries(new)
+    changed = [
+        key for key in set(before) | set(after)
+        if before.get(key) != after.get(key)
+    ]
+    if not changed:
+        return []
+    counts = target_shards(client, changed, shards, cache)
+    collection = client.collection(INDEX_COLLECTION)
+    writes = []
+    for key in changed:
+        field, target_id = key
+        shard = shard_of(alumni_id, counts[key])
+        data = {"field": field, "targetId": target_id, "shard": shard}
+        if key in after:
+            email, name = after[key]
+            data["emails"] = {alumni_id: email}
+            data["names"] = {alumni_id: name}
+            if key not in before:
+                data["count"] = fs.Increment(1)
+        else:
+            data["emails"] = {alumni_id: fs.DELETE_FIELD}
+            data["names"] = {alumni_id: fs.DELETE_FIELD}
+            data["count"] = fs.Increment(-1)
+        ref = collection.document(_shard_id(field, target_id, shard))
+        writes.append((ref, data))
+    return writes
+
+
+def bulk_index_writes(client, fs, docs: list, shards, cache=None) -> list:
+    """Combine the index writes for newly created students per shard."""
+    entries = [(doc["alumniId"], _entries(doc)) for doc in docs]
+    counts = target_shards(
+        client, {key for _, e in entries for key in e}, shards, cache
+    )
+    combined = {}
+    for alumni_id, doc_entries in entries:
+        for (field, target_id), (email, name) in doc_entries.items():
+            shard = shard_of(alumni_id, counts[field, target_id])
+            key = _shard_id(field, target_id, shard)
+            entry = combined.setdefault(key, {
+                "field": field,
+                "targetId": target_id,
+                "shard": shard,
+                "emails": {},
+                "names": {},
+                "count": 0,
+            })
+            entry["emails"][alumni_id] = email
+            entry["names"][alumni_id] = name
+            entry["count"] += 1
+    collection = client.collection(INDEX_COLLECTION)
+    writes = []
+    for key, data in combined.items():
+        data["count"] = fs.Increment(data["count"])
+        writes.append((collection.document(key), data))
+    return writes
+
+
+class IndexedTarget:
+    """The shards of one built target index, read with a single get_all.
+
+    ``count`` is the number of distinct addresses, so students sharing an
+    address count once, as when the students are scanned.
+    """
+
+    def __init__(self, shards: list):
+        self.shards = shards
+        self.count = len({
+            email
+            for data in shards
+            for email in (data.get("emails") or {}).values()
+        })
+
+    def __iter__(self):
+        """Yield ``(alumniId, email, name)`` shard by shard."""
+        for data in self.shards:
+            names = data.get("names") or {}
+            for alumni_id, email in (data.get("emails") or {}).items():
+                yield alumni_id, email, names.get(alumni_id, "")
+
+
+def read_target(client, field: str, target_id: str, shards):
+    """Return the IndexedTarget for a target, or None if it isn't built.
+
+    The ``meta`` document and the first ``shards`` shards are read with one
+    get_all; a target built with more shards needs a second one.
+    """
+    collection = client.collection(INDEX_COLLECTION)
+
+    def _read(first, last):
+        refs = [
+            collection.document(_shard_id(field, target_id, n))
+            for n in range(first, last)
+        ]
+        if not first:
+            refs.insert(0, collection.document(_meta_id(field, target_id)))
+        return {snap.id: snap for snap in client.get_all(refs)}
+
+    docs = _read(0, shards)
+    meta = docs.pop(_meta_id(field, target_id), None)
+    if meta is None or not meta.exists:
+        return None
+    built = meta.to_dict() or {}
+    if built.get("format") != INDEX_FORMAT:
+        log.info(
+            "Recipient index %s=%s was built in an older format; "
+            "rebuild it", field, target_id,
+        )
+        return None
+    count = built.get("shards") or shards
+    if count > shards:
+        docs.update(_read(shards, count))
+    data = [
+        docs[_shard_id(field, target_id, n)].to_dict() or {}
+        for n in range(count)
+        if docs[_shard_id(field, target_id, n)].exists
+    ]
+    if any((d.get("count") or 0) > 2 * MAX_SHARD_ENTRIES for d in data):
+        log.warning(
+            "Recipient index %s=%s has outgrown its %d shards; rebuild it "
+            "before a shard reaches Firestore's document limits",
+            field, target_id, count,
+        )
+    return IndexedTarget(data)
+
+
+def _approx_size(data: dict) -> int:
+    """Rough serialized size of a document, for sizing commits."""
+    return len(json.dumps(data, default=str).encode("utf-8"))
+
+
+def _pages(query, page_size: int):
+    """Yield the pages of ``query`` in document id order."""
+    query = query.order_by("__name__").limit(page_size)
+    last = None
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        page = list(page_query.stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def rebuild(
+    client,
+    fs,
+    shards,
+    page_size: int = 1000,
+    batch_size: int = 400,
+    batch_bytes: int = MAX_COMMIT_BYTES,
+    progress=None,
+):
+    """Rebuild every target index from ``scl_students``.
+
+    A first scan reads only the target fields to list the targets; then
+    each target's students are queried and its complete shards and
+    ``meta`` document written, so memory holds one target at a time.
+    Targets get ``shards`` shards, or more when they are large (see
+    ``shards_for``). Index documents of targets that no longer have
+    students are deleted. A batch is committed after ``batch_size`` writes
+    or once the documents in it add up to about ``batch_bytes``, since
+    shards of large targets are big. ``progress(counts)``, if given, is
+    called with the running totals after each target. Student writes that
+    land while a target is rebuilt may be missed; run it when bulk ingests
+    are not in progress (re-running is safe).
+    """
+    students = client.collection("scl_students")
+    targets = set()
+    scanned = 0
+    for page in _pages(students.select(list(INDEXED_FIELDS)), page_size):
+        for snap in page:
+            scanned += 1
+            doc = snap.to_dict() or {}
+            targets.update(
+                (field, doc[field]) for field in INDEXED_FIELDS
+                if isinstance(doc.get(field), str) and doc[field]
+            )
+
+    collection = client.collection(INDEX_COLLECTION)
+    written = set()
+    batch = client.batch()
+    pending = pending_bytes = 0
+
+    def _put(doc_id: str, data: dict):
+        nonlocal batch, pending, pending_bytes
+        size = _approx_size(data)
+        if pending and pending_bytes + size > batch_bytes:
+            batch.commit()
+            batch, pending, pending_bytes = client.batch(), 0, 0
+        batch.set(collection.document(doc_id), data)
+        written.add(doc_id)
+        pending += 1
+        pending_bytes += size
+        if pending >= batch_size:
+            batch.commit()
+            batch, pending, pending_bytes = client.batch(), 0, 0
+
+    counts = {
+        "studentsScanned": scanned,
+        "targets": len(targets),
+        "targetsDone": 0,
+        "entries": 0,
+        "staleDocsDeleted": 0,
+    }
+    for field, target_id in sorted(targets):
+        key = (field, target_id)
+        target_entries = {}
+        query = students.where(field, "==", target_id).select(
+            ["email", "firstName", field]
+        )
+        for page in _pages(query, page_size):
+            for snap in page:
+                entry = _entries(snap.to_dict() or {}).get(key)
+                if entry is not None:
+                    target_entries[snap.id] = entry
+        count = shards_for(len(target_entries), shards)
+        shard_maps = [{} for _ in range(count)]
+        for alumni_id, entry in target_entries.items():
+            shard_maps[shard_of(alumni_id, count)][alumni_id] = entry
+        for n, shard_entries in enumerate(shard_maps):
+            _put(_shard_id(field, target_id, n), {
+                "field": field,
+                "targetId": target_id,
+                "shard": n,
+                "emails": {k: e for k, (e, _) in shard_entries.items()},
+                "names": {k: name for k, (_, name) in shard_entries.items()},
+                "count": len(shard_entries),
+            })
+        _put(_meta_id(field, target_id), {
+            "field": field,
+            "targetId": target_id,
+            "shards": count,
+            "format": INDEX_FORMAT,
+            "count": len(target_entries),
+            "builtAt": fs.SERVER_TIMESTAMP,
+        })
+        counts["entries"] += len(target_entries)
+        counts["targetsDone"] += 1
+        if progress is not None:
+            progress(dict(counts))
+    for snap in collection.select([]).stream():
+        if snap.id not in written:
+            batch.delete(snap.reference)
+            counts["staleDocsDeleted"] += 1
+            pending += 1
+            if pending >= batch_size:
+                batch.commit()
+                batch, pending, pending_bytes = client.batch(), 0, 0
+    if pending:
+        batch.commit()
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .auth import FIREBASE_ADMIN_AVAILABLE  # noqa: F401 - init app
+    from .db import rebuild_recipient_index
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(rebuild_recipient_index(), indent=2))
@@ -1,13 +1,18 @@
 # app/routes/admin.py
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from ..models import BulkUploadPayload, CollegeCreate
 from ..auth import verify_firebase_token
 from ..db import (
-    create_student_doc,
     create_college_doc,
+    dead_letter_sink,
     link_student_to_college,
 )
-from ..services.email_service import enqueue_email_job
+from ..queues import get_job_queue
+from ..services.index_rebuild import get_rebuild, start_rebuild
+from ..services.ingest_service import ingest_students
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -19,20 +24,15 @@ def create_bulk(
 ):
     if not token.get("admin", False):
         raise HTTPException(status_code=403, detail="Not allowed")
-    created = []
-    for row in payload.rows:
-        row["collegeId"] = payload.collegeId
-        s = create_student_doc(row)
-        # enqueue onboarding email job
-        job = {
-            "alumniId": s["alumniId"],
-            "collegeId": payload.collegeId,
-            "template": "onboarding",
-            "vars": {"name": row.get("firstName"), "alumniId": s["alumniId"]},
-        }
-        enqueue_email_job(job)
-        created.append(s["alumniId"])
-    return {"ok": True, "createdCount": len(created), "ids": created}
+    # batched writes + onboarding email jobs; failures are reported per row
+    summary = ingest_students(payload.rows, payload.collegeId)
+    return {
+        "ok": True,
+        "createdCount": summary["createdCount"],
+        "failedCount": summary["failedCount"],
+        "ids": summary["ids"],
+        "failed": [r for r in summary["results"] if not r["ok"]],
+    }
 
 
 @router.post("/colleges", summary="Create a college record")
@@ -57,7 +57,75 @@ def link_student(
     if not token.get("admin", False):
         raise HTTPException(status_code=403, detail="Not allowed")
     admin_uid = token.get("uid")
-    updated = link_student_to_college(alumniId, collegeId, admin_uid)
+    # linking is rare and security relevant: commit its audit entry atomically
+    updated = link_student_to_college(
+        alumniId, collegeId, admin_uid, audit_mode="strict"
+    )
     if not updated:
         raise HTTPException(status_code=404, detail="Student not found")
     return {"ok": True, "student": updated}
+
+
+@router.post(
+    "/recipient-index/rebuild",
+    summary="Rebuild the bulk-email recipient index from all students",
+)
+def rebuild_index(token: dict = Depends(verify_firebase_token)):
+    if not token.get("admin", False):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    # runs in the background; poll the job for progress
+    job = start_rebuild(created_by=token.get("uid"))
+    return JSONResponse(status_code=202, content={"ok": True, **job})
+
+
+@router.get(
+    "/recipient-index/rebuild/{job_id}",
+    summary="Progress of a recipient index rebuild",
+)
+def rebuild_index_status(
+    job_id: str, token: dict = Depends(verify_firebase_token)
+):
+    if not token.get("admin", False):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    job = get_rebuild(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"ok": True, **job}
+
+
+@router.get("/dead-letters", summary="List jobs that failed for good")
+def list_dead_letters(
+    topic: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    token: dict = Depends(verify_firebase_token),
+):
+    if not token.get("admin", False):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return {
+        "ok": True,
+        "deadLetters": dead_letter_sink().list(topic=topic, limit=limit),
+    }
+
+
+@router.post(
+    "/dead-letters/{dead_letter_id}/replay",
+    summary="Queue a dead-lettered job again",
+)
+def replay_dead_letter(
+    dead_letter_id: str, token: dict = Depends(verify_firebase_token)
+):
+    if not token.get("admin", False):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    sink = dead_letter_sink()
+    entry = sink.get(dead_letter_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    queued = get_job_queue().publish(
+        entry["topic"],
+        sink.payload(entry),
+        **(entry.get("attributes") or {}),
+    )
+    if not queued:
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    sink.delete(dead_letter_id)
+    return {"ok": True, "topic": entry["topic"]}
@@ -3,11 +3,21 @@
 Allows a school or college user to send an email to all their students.
 Admins (token.admin == True) may specify targetId explicitly for either scope.
 Non-admin callers default to token uid for school scope.
+
+Sends run as background campaigns: POST returns a jobId immediately and
+GET /bulk-email/{jobId} reports progress. previewOnly stays synchronous.
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from ..auth import verify_firebase_token
+from ..db import get_db_client
 from ..models import BulkEmailRequest
-from ..services.email_service import send_bulk_emails
+from ..services.campaign_service import (
+    cancel_campaign,
+    get_campaign,
+    start_campaign,
+)
+from ..services.recipients import RecipientResolver
 
 router = APIRouter(prefix="/bulk-email", tags=["bulk-email"])
 
@@ -30,55 +40,85 @@ def send_bulk(
     if not target_id:
         raise HTTPException(status_code=400, detail="Missing targetId")
 
-    # Import firestore lazily to avoid crashing if firebase_admin isn't present
+    # Storage client is created lazily; report 503 if it isn't available
     try:
-        from firebase_admin import firestore  # type: ignore
-        db = firestore.client()
+        get_db_client()
     except Exception as e:
         raise HTTPException(
             status_code=503,
             detail=f"Firestore unavailable: {e}"
         )
-    collection = db.collection("scl_students")
-    field = "schoolId" if scope == "school" else "collegeId"
-
-    # Query for matching students
-    query = collection.where(field, "==", target_id)
-    docs = list(query.stream())
-    seen = set()
-    emails = []
-    for d in docs:
-        data = d.to_dict() or {}
-        e = data.get("email")
-        if e and e not in seen:
-            seen.add(e)
-            emails.append(e)
-
     if payload.previewOnly:
+        # Recipients come from the recipient index or are streamed page by
+        # page, and are deduplicated on the fly
+        recipients = RecipientResolver(scope, target_id)
+        # a built recipient index answers the count from its shards
+        count = recipients.indexed_count
+        sample = []
+        for email in recipients:
+            if len(sample) < 50:  # limit echo
+                sample.append(email)
+            elif count is not None:
+                break
         return {
             "ok": True,
             "preview": {
-                "recipientCount": len(emails),
-                "emails": emails[:50],  # limit echo
+                "recipientCount": (
+                    recipients.unique if count is None else count
+                ),
+                "emails": sample,
             },
         }
 
-    if not emails:
-        return {"ok": False, "message": "No recipient emails found"}
-
-    # Send
     try:
-        resp = send_bulk_emails(
-            emails,
+        campaign = start_campaign(
+            scope,
+            target_id,
             subject=payload.subject.strip(),
-            plain_text=payload.body,
-            html_text=payload.htmlBody,
+            body=payload.body,
+            html_body=payload.htmlBody,
+            created_by=token.get("uid"),
+            template=payload.template,
         )
-        return {
+    except KeyError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown template: {payload.template}",
+        )
+    return JSONResponse(
+        status_code=202,
+        content={
             "ok": True,
-            "sent": len(emails),
-            "status": resp.get("status"),
-            "skipped": len(docs) - len(emails),
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Bulk send failed: {e}")
+            "jobId": campaign["jobId"],
+            "status": campaign["status"],
+        },
+    )
+
+
+def _authorized_campaign(job_id: str, token: dict) -> dict:
+    campaign = get_campaign(job_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if (
+        not token.get("admin", False)
+        and campaign.get("createdBy") != token.get("uid")
+    ):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return campaign
+
+
+@router.get("/{job_id}", summary="Progress of a bulk email job")
+def bulk_job_status(
+    job_id: str,
+    token: dict = Depends(verify_firebase_token),
+):
+    return {"ok": True, "job": _authorized_campaign(job_id, token)}
+
+
+@router.post("/{job_id}/cancel", summary="Cancel a running bulk email job")
+def bulk_job_cancel(
+    job_id: str,
+    token: dict = Depends(verify_firebase_token),
+):
+    _authorized_campaign(job_id, token)
+    return {"ok": True, "job": cancel_campaign(job_id)}
@@ -1,8 +1,14 @@
 # app/routes/students.py
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from ..models import StudentCreate, StudentPatch, ResumeParsePayload
 from ..auth import verify_firebase_token
-from ..db import create_student_doc, get_student, patch_student
+from ..db import (
+    VersionConflict,
+    create_student_doc,
+    get_student,
+    patch_student,
+)
 from ..services.resume_service import parse_and_update_student
 
 router = APIRouter(prefix="/scl/students", tags=["students"])
@@ -23,10 +29,19 @@ def create_student(
 
 @router.get("/{alumni_id}")
 def get_student_endpoint(
-    alumni_id: str, token: dict = Depends(verify_firebase_token)
+    alumni_id: str,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated field paths to return (default: all)",
+    ),
+    token: dict = Depends(verify_firebase_token),
 ):
-    student = get_student(alumni_id)
-    if not student:
+    mask = None
+    if fields:
+        mask = [f.strip() for f in fields.split(",") if f.strip()] or None
+    student = get_student(alumni_id, fields=mask)
+    # a mask matching no stored field gives {} for an existing student
+    if student is None:
         raise HTTPException(status_code=404, detail="Not found")
     return student
  
@@ -52,14 +67,31 @@ def patch_student_endpoint(
         # allow admin override
         if not token.get("admin", False):
             raise HTTPException(status_code=403, detail="Not allowed")
-    # version check and patch
+    # version check and patch; the cached copy may lag writes made by other
+    # workers, so confirm against Firestore before reporting a conflict.
+    if patch.version != student.get("version", 1):
+        student = get_student(alumni_id, fresh=True) or student
     if patch.version != student.get("version", 1):
         detail = {
             "message": "Version conflict",
             "current_version": student.get("version"),
         }
         raise HTTPException(status_code=409, detail=detail)
-    updated = patch_student(alumni_id, patch.changes, token.get("uid"))
+    try:
+        updated = patch_student(
+            alumni_id,
+            patch.changes,
+            token.get("uid"),
+            expected_version=patch.version,
+        )
+    except VersionConflict as e:
+        detail = {
+            "message": "Version conflict",
+            "current_version": e.current_version,
+        }
+        raise HTTPException(status_code=409, detail=detail)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Not found")
     return {"ok": True, "student": updated}
 
 
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ..auth import verify_firebase_token
+from ..db import get_db_client
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
@@ -19,10 +20,9 @@ def register_webhook(
 ):
     if not token.get("admin", False):
         raise HTTPException(status_code=403, detail="Not allowed")
-    # Import firestore lazily to avoid crashing if firebase_admin isn't present
+    # Storage client is created lazily; report 503 if it isn't available
     try:
-        from firebase_admin import firestore  # type: ignore
-        db = firestore.client()
+        db = get_db_client()
     except Exception as e:
         raise HTTPException(
             status_code=503,
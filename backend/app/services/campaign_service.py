@@ -0,0 +1,332 @@
+# app/services/campaign_service.py
+"""Background bulk-email campaigns.
+
+``start_campaign`` records a campaign and hands it to a small in-process
+thread pool, so POST /bulk-email returns a job id right away instead of
+holding a gunicorn worker for the whole send. Progress is kept in memory
+and mirrored to the ``email_campaigns`` collection after every chunk, which
+lets any worker answer GET /bulk-email/{jobId} and request cancellation.
+
+The subject and body are compiled as an email template once per campaign
+(or a registered template such as "announcement" is bound to them), so
+``{name}``, ``{alumniId}`` and ``{college}`` are filled per recipient
+without re-parsing the text for each message.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+import uuid
+
+from ..config import (
+    BULK_EMAIL_CHUNK_SIZE,
+    BULK_EMAIL_RETRY_ATTEMPTS,
+    BULK_EMAIL_WORKERS,
+    SENDER_NAME,
+)
+from ..db import get_college, get_db_client
+from .email_service import retry_failed_chunks, send_bulk_emails
+from .recipients import RecipientResolver, chunked
+from .templates import compile_template, get_template, text_to_html
+
+log = logging.getLogger(__name__)
+
+CAMPAIGN_COLLECTION = "email_campaigns"
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+_executor = ThreadPoolExecutor(
+    max_workers=BULK_EMAIL_WORKERS, thread_name_prefix="campaign"
+)
+_lock = threading.Lock()
+_campaigns = {}
+# finished campaigns kept in memory; older ones are served from storage
+_MAX_FINISHED = 200
+
+
+class Campaign:
+    def __init__(
+        self,
+        scope: str,
+        target_id: str,
+        subject: str,
+        body: str,
+        html_body: str = None,
+        created_by: str = None,
+        template: str = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.scope = scope
+        self.target_id = target_id
+        self.subject = subject
+        self.body = body
+        self.html_body = html_body
+        self.created_by = created_by
+        self.template = template
+        self.status = "queued"
+        self.resolved = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.chunks = 0
+        self.errors = []
+        self.message = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+
+    def snapshot(self) -> dict:
+        elapsed = None
+        if self.started is not None:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        queued = 0
+        if self.status not in FINAL_STATUSES:
+            queued = max(0, self.resolved - self.sent - self.failed)
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "scope": self.scope,
+            "targetId": self.target_id,
+            "subject": self.subject,
+            "template": self.template,
+            "createdBy": self.created_by,
+            "createdAt": self.created_at.isoformat(),
+            "counts": {
+                "queued": queued,
+                "sent": self.sent,
+                "failed": self.failed,
+                "skipped": self.skipped,
+            },
+            "chunks": self.chunks,
+            "elapsedSeconds": round(elapsed, 2) if elapsed else 0.0,
+            "throughputPerSecond": (
+                round(self.sent / elapsed, 1) if elapsed else 0.0
+            ),
+            "errors": self.errors[-5:],
+            "message": self.message,
+            "cancelRequested": self.cancel_event.is_set(),
+        }
+
+
+def _persist(campaign: Campaign):
+    data = campaign.snapshot()
+    # never clear a cancel requested through another worker
+    if not data["cancelRequested"]:
+        del data["cancelRequested"]
+    try:
+        get_db_client().collection(CAMPAIGN_COLLECTION).document(
+            campaign.id
+        ).set(data, merge=True)
+    except Exception as e:
+        log.warning("Could not persist campaign %s: %s", campaign.id, e)
+
+
+def _cancel_requested(campaign: Campaign) -> bool:
+    """Check the local flag, then a cancel recorded by another worker."""
+    if campaign.cancel_event.is_set():
+        return True
+    try:
+        doc = get_db_client().collection(CAMPAIGN_COLLECTION).document(
+            campaign.id
+        ).get(field_paths=["cancelRequested"])
+    except Exception:
+        return False
+    if doc.exists and (doc.to_dict() or {}).get("cancelRequested"):
+        campaign.cancel_event.set()
+        return True
+    return False
+
+
+def _target_name(campaign: Campaign) -> str:
+    if campaign.scope == "college":
+        college = get_college(campaign.target_id, fields=["name"]) or {}
+        if college.get("name"):
+            return college["name"]
+    return SENDER_NAME
+
+
+def _campaign_template(campaign: Campaign):
+    """Compile (or look up) the campaign's template and bind shared fields."""
+    shared = {}
+    if campaign.template:
+        template = get_template(campaign.template)
+        shared.update(
+            subject=campaign.subject,
+            message=campaign.body,
+            message_html=campaign.html_body or text_to_html(campaign.body),
+        )
+    else:
+        template = compile_template(
+            f"campaign:{campaign.id}",
+            campaign.subject,
+            campaign.body,
+            campaign.html_body,
+        )
+    if "college" in template.fields:
+        shared["college"] = _target_name(campaign)
+    return template.bind(shared)
+
+
+def _send_with_retries(campaign: Campaign, template, batch: list) -> dict:
+    """Send a batch, then resend only its failed provider chunks.
+
+    ``batch`` holds recipient dicts when the template still has
+    per-recipient fields, plain addresses otherwise.
+    """
+    if template.fields:
+        rendered, substitutions = template.merge_fields(batch)
+        recipients = [r["email"] for r in batch]
+    else:
+        rendered, substitutions = template.render({}), None
+        recipients = batch
+    kwargs = {
+        "subject": rendered.subject,
+        "plain_text": rendered.text,
+        "html_text": rendered.html,
+    }
+    result = send_bulk_emails(
+        recipients, substitutions=substitutions, **kwargs
+    )
+    for attempt in range(BULK_EMAIL_RETRY_ATTEMPTS):
+        if result["ok"] or campaign.cancel_event.is_set():
+            break
+        log.info(
+            "Campaign %s: retrying %d failed recipients",
+            campaign.id, result["failed"],
+        )
+        time.sleep(2 ** attempt)
+        result = retry_failed_chunks(result, **kwargs)
+    return result
+
+
+def _run(campaign: Campaign):
+    campaign.status = "running"
+    campaign.started = time.monotonic()
+    _persist(campaign)
+    recipients = RecipientResolver(campaign.scope, campaign.target_id)
+    try:
+        template = _campaign_template(campaign)
+        source = recipients.recipients() if template.fields else recipients
+        for chunk in chunked(source, BULK_EMAIL_CHUNK_SIZE):
+            campaign.resolved = recipients.unique
+            campaign.skipped = recipients.skipped
+            if _cancel_requested(campaign):
+                break
+            try:
+                result = _send_with_retries(campaign, template, chunk)
+            except Exception as e:
+                campaign.failed += len(chunk)
+                campaign.errors.append(str(e))
+                campaign.chunks += 1
+                log.warning("Campaign %s chunk failed: %s", campaign.id, e)
+            else:
+                campaign.sent += result["sent"]
+                campaign.failed += result["failed"]
+                campaign.chunks += len(result["chunks"])
+                campaign.errors.extend(
+                    c["error"] for c in result["chunks"] if not c["ok"]
+                )
+            _persist(campaign)
+        campaign.resolved = recipients.unique
+        campaign.skipped = recipients.skipped
+        if campaign.cancel_event.is_set():
+            campaign.status = "cancelled"
+        elif campaign.sent == 0 and campaign.failed:
+            campaign.status = "failed"
+        else:
+            campaign.status = "completed"
+            if recipients.unique == 0:
+                campaign.message = "No recipient emails found"
+    except Exception as e:
+        log.exception("Campaign %s aborted", campaign.id)
+        campaign.status = "failed"
+        campaign.errors.append(str(e))
+    finally:
+        campaign.finished = time.monotonic()
+        _persist(campaign)
+
+
+def start_campaign(
+    scope: str,
+    target_id: str,
+    subject: str,
+    body: str,
+    html_body: str = None,
+    created_by: str = None,
+    template: str = None,
+) -> dict:
+    """Queue a bulk send and return its initial snapshot.
+
+    ``template`` names a registered template (see templates.py) that wraps
+    the subject and body; without it they are used as the template.
+    """
+    if template:
+        get_template(template)  # KeyError for unknown names, before queueing
+    campaign = Campaign(
+        scope, target_id, subject, body, html_body, created_by, template
+    )
+    with _lock:
+        finished = [
+            c.id for c in _campaigns.values() if c.status in FINAL_STATUSES
+        ]
+        for old_id in finished[:max(0, len(finished) - _MAX_FINISHED)]:
+            del _campaigns[old_id]
+        _campaigns[campaign.id] = campaign
+    _persist(campaign)
+    _executor.submit(_run, campaign)
+    return campaign.snapshot()
+
+
+def get_campaign(job_id: str) -> dict:
+    """Return the campaign snapshot from this worker or storage, or None."""
+    with _lock:
+        campaign = _campaigns.get(job_id)
+    if campaign is not None:
+        return campaign.snapshot()
+    doc = get_db_client().collection(CAMPAIGN_COLLECTION).document(
+        job_id
+    ).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def cancel_campaign(job_id: str) -> dict:
+    """Request cancellation; chunks already sent are not recalled."""
+    with _lock:
+        campaign = _campaigns.get(job_id)
+    if campaign is not None:
+        if campaign.status not in FINAL_STATUSES:
+            campaign.cancel_event.set()
+            _persist(campaign)
+        return campaign.snapshot()
+    ref = get_db_client().collection(CAMPAIGN_COLLECTION).document(job_id)
+    doc = ref.get()
+    if not doc.exists:
+        return None
+    data = doc.to_dict() or {}
+    if data.get("status") not in FINAL_STATUSES:
+        ref.set({"cancelRequested": True}, merge=True)
+        data["cancelRequested"] = True
+    return data
+
+
+def shutdown(timeout: float = 5.0):
+    """Stop running campaigns at their next chunk and mark them interrupted."""
+    with _lock:
+        running = [
+            c for c in _campaigns.values() if c.status not in FINAL_STATUSES
+        ]
+    for campaign in running:
+        campaign.cancel_event.set()
+    _executor.shutdown(wait=False, cancel_futures=True)
+    deadline = time.monotonic() + timeout
+    for campaign in running:
+        while (
+            campaign.finished is None and campaign.started is not None
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.05)
+        if campaign.status in ("cancelled", "queued", "running"):
+            campaign.status = "interrupted"
+            campaign.message = "Worker shut down before the send finished"
+            _persist(campaign)
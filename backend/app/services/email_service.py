@@ -1,18 +1,36 @@
 # app/services/email_service.py
+from concurrent.futures import ThreadPoolExecutor
 import json
 import smtplib
-import ssl
+import threading
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from sendgrid.helpers.mail import (
+    HtmlContent,
+    Mail,
+    Personalization,
+    Substitution,
+    To,
+)
+from ..delivery_ledger import job_key
+from ..queues import get_job_queue
+from ..rate_limit import SendRateLimiter, parse_limits
+from ..smtp_pool import SMTPPool
 from ..config import (
+    EMAIL_RATE_LIMITS,
+    EMAIL_THROTTLE_MAX_RETRIES,
     SENDGRID_API_KEY,
-    PROJECT_ID,
+    SENDGRID_MAX_PERSONALIZATIONS,
+    SENDGRID_SEND_CONCURRENCY,
     PUBSUB_EMAIL_TOPIC,
     SENDER_EMAIL,
     SENDER_NAME,
     SMTP_HOST,
+    SMTP_MAX_MESSAGES_PER_CONNECTION,
+    SMTP_NOOP_AFTER_SECONDS,
+    SMTP_POOL_SIZE,
     SMTP_PORT,
     SMTP_USERNAME,
     SMTP_PASSWORD,
@@ -21,19 +39,157 @@ import logging
 
 log = logging.getLogger(__name__)
 
-# Create publisher lazily so importing the module doesn't attempt to
-# resolve Google credentials (which can block or error in local dev).
-publisher = None
+# The SendGrid client is stateless apart from its API key, so one instance
+# is shared by all sends in the process.
+sg_client = None
+# Bounded pool shared by all bulk sends in the process, so concurrent
+# campaigns can't open more than SENDGRID_SEND_CONCURRENCY requests.
+_send_pool = ThreadPoolExecutor(
+    max_workers=SENDGRID_SEND_CONCURRENCY, thread_name_prefix="sendgrid"
+)
 
 
 def _get_sg_client():
     """Return configured SendGrid client or raise informative error."""
+    global sg_client
     if not SENDGRID_API_KEY:
         raise RuntimeError(
             "SENDGRID_API_KEY is not configured. Set it in backend/.env and "
             "restart the server."
         )
-    return SendGridAPIClient(SENDGRID_API_KEY)
+    if sg_client is None:
+        sg_client = SendGridAPIClient(SENDGRID_API_KEY)
+    return sg_client
+
+
+# Paces sends per provider and recipient domain (see rate_limit.py).
+rate_limiter = SendRateLimiter(parse_limits(EMAIL_RATE_LIMITS))
+# SMTP replies that mean "slow down" rather than "rejected".
+SMTP_THROTTLE_CODES = (421, 451)
+
+
+def _retry_after(headers) -> float:
+    """Seconds to wait from Retry-After / X-RateLimit-Reset, or None."""
+    if not headers:
+        return None
+    try:
+        value = headers.get("Retry-After")
+        if value is not None:
+            return max(0.0, float(value))
+        reset = headers.get("X-RateLimit-Reset")
+        if reset is not None:
+            return max(0.0, float(reset) - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _domains(addresses) -> set:
+    return {a.rpartition("@")[2].strip().lower() for a in addresses}
+
+
+def _throttle_info(e: Exception):
+    """Return (domains, retry_after) if ``e`` is a throttle response.
+
+    ``domains`` is None when the whole provider is throttled and the set of
+    recipient domains when an SMTP server deferred only some recipients.
+    """
+    if getattr(e, "status_code", None) == 429:
+        return None, _retry_after(getattr(e, "headers", None))
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        deferred = [
+            addr for addr, (code, _) in e.recipients.items()
+            if code in SMTP_THROTTLE_CODES
+        ]
+        if deferred:
+            return _domains(deferred), None
+        return False
+    if (
+        isinstance(e, smtplib.SMTPResponseException)
+        and e.smtp_code in SMTP_THROTTLE_CODES
+    ):
+        return None, None
+    return False
+
+
+def _limited_send(provider: str, recipients: list, send, messages=None):
+    """Call ``send()`` within the rate limits, backing off on throttling.
+
+    ``messages`` is how many messages ``send`` submits, for providers
+    limited per message rather than per recipient (see rate_limit.py).
+    Throttle responses are retried up to EMAIL_THROTTLE_MAX_RETRIES times;
+    other errors and the last throttle propagate to the caller.
+    """
+    for attempt in range(EMAIL_THROTTLE_MAX_RETRIES + 1):
+        rate_limiter.acquire(provider, recipients, messages)
+        try:
+            result = send()
+        except Exception as e:
+            throttle = _throttle_info(e)
+            if throttle is False or attempt == EMAIL_THROTTLE_MAX_RETRIES:
+                raise
+            domains, retry_after = throttle
+            if not rate_limiter.throttled(provider, domains, retry_after):
+                time.sleep(retry_after or min(60.0, 2.0 ** attempt))
+            continue
+        rate_limiter.succeeded(provider, recipients, messages)
+        return result
+
+
+def _provider_error(e: Exception) -> RuntimeError:
+    """Turn a SendGrid exception into a RuntimeError with its detail."""
+    status = getattr(e, "status_code", None)
+    body = getattr(e, "body", None)
+    detail = None
+    if isinstance(body, (bytes, bytearray)):
+        try:
+            detail = body.decode("utf-8", errors="ignore")
+        except Exception:
+            detail = str(body)
+    else:
+        detail = str(body or e)
+
+    if status in (401, 403):
+        return RuntimeError(
+            "Email provider unauthorized (" f"{status}). "
+            "Check SENDGRID_API_KEY and verify sender "
+            f"{SENDER_EMAIL}. Provider said: {detail}"
+        )
+    return RuntimeError(
+        f"Email provider error ({status}). Provider said: {detail}"
+    )
+
+
+# Authenticated SMTP sessions reused across sends (see smtp_pool.py).
+smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+
+def _get_smtp_pool() -> SMTPPool:
+    global smtp_pool
+    if smtp_pool is None:
+        with _smtp_pool_lock:
+            if smtp_pool is None:
+                smtp_pool = SMTPPool(
+                    SMTP_HOST,
+                    SMTP_PORT,
+                    SMTP_USERNAME,
+                    SMTP_PASSWORD,
+                    max_size=SMTP_POOL_SIZE,
+                    max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION,
+                    noop_after=SMTP_NOOP_AFTER_SECONDS,
+                )
+    return smtp_pool
+
+
+def close_smtp_pool():
+    """Close pooled SMTP sessions (on shutdown)."""
+    if smtp_pool is not None:
+        smtp_pool.close()
+
+
+def smtp_pool_stats() -> dict:
+    return smtp_pool.stats() if smtp_pool is not None else {"open": 0}
 
 
 def _use_smtp() -> bool:
@@ -52,11 +208,15 @@ def _send_via_smtp(
     subject: str,
     plain_text: str,
     html_text: str | None = None,
-):
-    """Send email using SMTP with TLS.
+) -> dict:
+    """Send email using SMTP with TLS over a pooled session.
 
     Uses BCC to send one message to multiple recipients without exposing
-    recipient addresses to each other.
+    recipient addresses to each other. Recipients the server defers with a
+    4xx reply while accepting the others have their domains throttled and
+    are sent again, up to EMAIL_THROTTLE_MAX_RETRIES times. Returns the
+    recipients that were not delivered, ``{address: (code, message)}``;
+    raises if the first attempt is refused for every recipient.
     """
     if not to_emails:
         raise RuntimeError("No recipients provided for SMTP send")
@@ -71,33 +231,57 @@ def _send_via_smtp(
     if html_text:
         msg.attach(MIMEText(html_text, "html", "utf-8"))
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.ehlo()
-        # Upgrade to TLS if supported (587)
+    message = msg.as_string()
+    undelivered, pending = {}, list(to_emails)
+    for attempt in range(EMAIL_THROTTLE_MAX_RETRIES + 1):
         try:
-            server.starttls(context=context)
-            server.ehlo()
-        except Exception:
-            # If port is already TLS (e.g., 465 over SMTP_SSL), ignore
-            pass
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.sendmail(SENDER_EMAIL, to_emails, msg.as_string())
+            # one BCC message: the smtp limit counts submissions
+            refused = _limited_send(
+                "smtp",
+                pending,
+                lambda: _get_smtp_pool().send(SENDER_EMAIL, pending, message),
+                messages=1,
+            )
+        except smtplib.SMTPRecipientsRefused as e:
+            if not attempt:
+                raise
+            refused = e.recipients
+        deferred = [
+            addr for addr, (code, _) in refused.items() if 400 <= code < 500
+        ]
+        undelivered.update(
+            (addr, reply) for addr, reply in refused.items()
+            if addr not in deferred
+        )
+        if not deferred or attempt == EMAIL_THROTTLE_MAX_RETRIES:
+            undelivered.update((addr, refused[addr]) for addr in deferred)
+            break
+        if not rate_limiter.throttled("smtp", _domains(deferred)):
+            time.sleep(min(60.0, 2.0 ** attempt))
+        pending = deferred
+    return undelivered
+
+
+def _refused_error(refused: dict) -> str:
+    addr, (code, reply) = next(iter(refused.items()))
+    if isinstance(reply, bytes):
+        reply = reply.decode("utf-8", errors="replace")
+    return (
+        f"SMTP refused {len(refused)} recipient(s), e.g. {addr}: "
+        f"{code} {reply}"
+    )
 
 
 def enqueue_email_job(job: dict):
-    global publisher
-    if publisher is None:
-        try:
-            from google.cloud import pubsub_v1  # type: ignore
-            publisher = pubsub_v1.PublisherClient()
-        except Exception as e:
-            log.info("Pub/Sub unavailable; skipping enqueue: %s", e)
-            return
+    """Queue ``job`` for the email worker.
 
-    topic_path = publisher.topic_path(PROJECT_ID, PUBSUB_EMAIL_TOPIC)
+    Adds an ``idempotencyKey`` (alumniId + template + campaignId) unless the
+    caller set one, so redelivered copies are skipped by the worker.
+    Returns False if the queue dropped the job (Pub/Sub unavailable).
+    """
+    job = dict(job, idempotencyKey=job_key(job))
     data = json.dumps(job).encode("utf-8")
-    publisher.publish(topic_path, data)
+    return get_job_queue().publish(PUBSUB_EMAIL_TOPIC, data)
 
 
 def send_email_direct(
@@ -108,10 +292,14 @@ def send_email_direct(
 ):
     if _use_smtp():
         try:
-            _send_via_smtp([to_email], subject, plain_text, html_text)
-            return 250, {}
+            refused = _send_via_smtp(
+                [to_email], subject, plain_text, html_text
+            )
         except Exception as e:
             raise RuntimeError(f"SMTP send failed: {e}")
+        if refused:
+            raise RuntimeError(f"SMTP send failed: {_refused_error(refused)}")
+        return 250, {}
     else:
         sg = _get_sg_client()
         # Use configured sender email/name from app config
@@ -125,85 +313,237 @@ def send_email_direct(
             plain_text_content=plain_text,
         )
         if html_text:
-            message.html = html_text
+            message.add_content(HtmlContent(html_text))
         try:
-            resp = sg.send(message)
-        except Exception as e:
-            status = getattr(e, "status_code", None)
-            body = getattr(e, "body", None)
-            detail = None
-            if isinstance(body, (bytes, bytearray)):
-                try:
-                    detail = body.decode("utf-8", errors="ignore")
-                except Exception:
-                    detail = str(body)
-            else:
-                detail = str(body or e)
-
-            if status in (401, 403):
-                raise RuntimeError(
-                    "Email provider unauthorized (" f"{status}). "
-                    "Check SENDGRID_API_KEY and verify sender "
-                    f"{SENDER_EMAIL}. Provider said: {detail}"
-                )
-            raise RuntimeError(
-                f"Email provider error ({status}). Provider said: {detail}"
+            resp = _limited_send(
+                "sendgrid", [to_email], lambda: sg.send(message)
             )
+        except Exception as e:
+            raise _provider_error(e)
         return resp.status_code, resp.headers
 
 
+def _apply_substitutions(text: str, substitutions: dict) -> str:
+    if not text or not substitutions:
+        return text
+    for token, value in substitutions.items():
+        text = text.replace(token, value)
+    return text
+
+
+def _failed_chunk(chunk: dict, to_emails, substitutions, error, status):
+    chunk.update(
+        ok=False,
+        status=status,
+        error=error,
+        sent=chunk["count"] - len(to_emails),
+        failed=len(to_emails),
+        recipients=list(to_emails),
+    )
+    if substitutions is not None:
+        chunk["substitutions"] = list(substitutions)
+    return chunk
+
+
+def _send_sendgrid_chunk(
+    index: int,
+    to_emails: list,
+    subject: str,
+    plain_text: str,
+    html_text: str = None,
+    substitutions: list = None,
+) -> dict:
+    """Send one chunk with a personalization per recipient."""
+    chunk = {"index": index, "count": len(to_emails)}
+    from_addr = (SENDER_EMAIL, SENDER_NAME) if SENDER_NAME else SENDER_EMAIL
+    try:
+        if substitutions is None:
+            # is_multiple: recipients don't see each other's addresses
+            message = Mail(
+                from_email=from_addr,
+                to_emails=to_emails,
+                subject=subject,
+                plain_text_content=plain_text,
+                is_multiple=True,
+            )
+        else:
+            message = Mail(
+                from_email=from_addr,
+                subject=subject,
+                plain_text_content=plain_text,
+            )
+            for email, subs in zip(to_emails, substitutions):
+                personalization = Personalization()
+                personalization.add_to(To(email))
+                for token, value in subs.items():
+                    personalization.add_substitution(
+                        Substitution(token, value)
+                    )
+                message.add_personalization(personalization)
+        if html_text:
+            message.add_content(HtmlContent(html_text))
+        sg = _get_sg_client()
+        resp = _limited_send("sendgrid", to_emails, lambda: sg.send(message))
+    except Exception as e:
+        return _failed_chunk(
+            chunk, to_emails, substitutions, str(_provider_error(e)),
+            getattr(e, "status_code", None),
+        )
+    chunk.update(
+        ok=True, status=resp.status_code, error=None,
+        sent=len(to_emails), failed=0,
+    )
+    return chunk
+
+
+def _send_smtp_chunk(
+    index: int,
+    to_emails: list,
+    subject: str,
+    plain_text: str,
+    html_text: str = None,
+    substitutions: list = None,
+) -> dict:
+    """Send personalized messages one by one over pooled SMTP sessions.
+
+    Without ``substitutions`` the chunk goes out as one BCC message and
+    errors other than refused recipients propagate.
+    """
+    chunk = {"index": index, "count": len(to_emails)}
+    failed, failed_subs, error = [], [], None
+    if substitutions is None:
+        refused = _send_via_smtp(to_emails, subject, plain_text, html_text)
+        if refused:
+            return _failed_chunk(
+                chunk, list(refused), None, _refused_error(refused), None
+            )
+    for email, subs in zip(to_emails, substitutions or ()):
+        try:
+            refused = _send_via_smtp(
+                [email],
+                _apply_substitutions(subject, subs),
+                _apply_substitutions(plain_text, subs),
+                _apply_substitutions(html_text, subs),
+            )
+        except Exception as e:
+            error = f"SMTP send failed: {e}"
+        else:
+            if not refused:
+                continue
+            error = _refused_error(refused)
+        failed.append(email)
+        failed_subs.append(subs)
+    if failed:
+        return _failed_chunk(chunk, failed, failed_subs, error, None)
+    chunk.update(
+        ok=True, status=250, error=None, sent=len(to_emails), failed=0
+    )
+    return chunk
+
+
+def _summarize(chunks: list) -> dict:
+    sent = sum(c["sent"] for c in chunks)
+    failed = sum(c["failed"] for c in chunks)
+    return {
+        "ok": failed == 0,
+        "status": 202 if failed == 0 else (207 if sent else 502),
+        "sent": sent,
+        "failed": failed,
+        "chunks": sorted(chunks, key=lambda c: c["index"]),
+    }
+
+
+def _send_chunks(chunks: list, subject, plain_text, html_text) -> list:
+    """Send ``[(index, emails, substitutions)]`` on the shared pool."""
+    send = _send_smtp_chunk if _use_smtp() else _send_sendgrid_chunk
+    futures = [
+        _send_pool.submit(
+            send, index, emails, subject, plain_text, html_text, subs
+        )
+        for index, emails, subs in chunks
+    ]
+    return [f.result() for f in futures]
+
+
 def send_bulk_emails(
     to_emails: list,
     subject: str = "",
     plain_text: str = "",
     html_text: str = None,
+    chunk_size: int = None,
+    substitutions: list = None,
 ):
-    """Send a single email to multiple recipients via SendGrid.
+    """Send one email to many recipients without exposing their addresses.
+
+    With SendGrid, recipients are split into chunks of up to
+    SENDGRID_MAX_PERSONALIZATIONS (one personalization per recipient) that
+    are sent concurrently; a failed chunk doesn't affect the others. Returns
+    ``{"ok", "status", "sent", "failed", "chunks"}`` where each chunk has
+    ``index``, ``count``, ``sent``, ``failed``, ``ok``, ``status`` and
+    ``error``; failed chunks also keep their failed ``recipients`` for
+    ``retry_failed_chunks``.
 
-    to_emails: list of email addresses (strings)
+    ``substitutions`` (one ``{token: value}`` map per recipient, see
+    templates.EmailTemplate.merge_fields) personalizes the subject and
+    bodies: SendGrid applies them per personalization, SMTP sends one
+    message per recipient. Without them, SMTP sends a single BCC message,
+    raises on error and reports recipients the server refused as a failed
+    chunk.
     """
     if not to_emails:
         return {"ok": False, "message": "no recipients"}
-    if _use_smtp():
+    if substitutions is not None and len(substitutions) != len(to_emails):
+        raise ValueError("substitutions must match to_emails")
+    if _use_smtp() and substitutions is None:
         try:
-            _send_via_smtp(to_emails, subject, plain_text, html_text)
-            return {"status": 250}
+            chunk = _send_smtp_chunk(
+                0, to_emails, subject, plain_text, html_text
+            )
         except Exception as e:
             raise RuntimeError(f"SMTP send failed: {e}")
-    else:
-        sg = _get_sg_client()
-        from_addr = (
-            (SENDER_EMAIL, SENDER_NAME) if SENDER_NAME else SENDER_EMAIL
-        )
-        message = Mail(
-            from_email=from_addr,
-            to_emails=to_emails,
-            subject=subject,
-            plain_text_content=plain_text,
+        return _summarize([chunk])
+    size = min(
+        chunk_size or SENDGRID_MAX_PERSONALIZATIONS,
+        SENDGRID_MAX_PERSONALIZATIONS,
+    )
+    chunks = [
+        (
+            n,
+            to_emails[start:start + size],
+            substitutions[start:start + size] if substitutions else None,
         )
-        if html_text:
-            message.html = html_text
-        try:
-            resp = sg.send(message)
-            return {"status": resp.status_code}
-        except Exception as e:
-            status = getattr(e, "status_code", None)
-            body = getattr(e, "body", None)
-            detail = None
-            if isinstance(body, (bytes, bytearray)):
-                try:
-                    detail = body.decode("utf-8", errors="ignore")
-                except Exception:
-                    detail = str(body)
-            else:
-                detail = str(body or e)
-
-            if status in (401, 403):
-                raise RuntimeError(
-                    "Email provider unauthorized (" f"{status}). "
-                    "Check SENDGRID_API_KEY and verify sender "
-                    f"{SENDER_EMAIL}. Provider said: {detail}"
-                )
-            raise RuntimeError(
-                f"Email provider error ({status}). Provider said: {detail}"
-            )
+        for n, start in enumerate(range(0, len(to_emails), size))
+    ]
+    return _summarize(_send_chunks(chunks, subject, plain_text, html_text))
+
+
+def retry_failed_chunks(
+    result: dict,
+    subject: str = "",
+    plain_text: str = "",
+    html_text: str = None,
+) -> dict:
+    """Resend only the failed recipients of a ``send_bulk_emails`` result.
+
+    Returns a new result covering all chunks; recipients that were already
+    sent are carried over and not sent again.
+    """
+    chunks = result.get("chunks") or []
+    failed = {c["index"]: c for c in chunks if c["failed"]}
+    if not failed:
+        return result
+    retried = _send_chunks(
+        [
+            (c["index"], c["recipients"], c.get("substitutions"))
+            for c in failed.values()
+        ],
+        subject,
+        plain_text,
+        html_text,
+    )
+    for chunk in retried:
+        previous = failed[chunk["index"]]
+        chunk["count"] = previous["count"]
+        chunk["sent"] += previous["sent"]
+    kept = [c for c in chunks if not c["failed"]]
+    return _summarize(kept + retried)
@@ -0,0 +1,166 @@
+# app/services/extract.py
+"""Text extraction for uploaded resumes (PDF, DOCX, plain text).
+
+Extraction is CPU-bound, so PDF and DOCX files are parsed in a process
+pool (RESUME_EXTRACT_WORKERS processes, one per core by default) instead of
+on the worker's callback threads. At most one job per pool process is
+submitted at a time, so a job starts running as soon as it is submitted
+and its timeout doesn't include time spent queued behind other files.
+Each child process caps its address space at RESUME_EXTRACT_MEMORY_MB,
+and a job that runs longer than RESUME_EXTRACT_TIMEOUT_SECONDS has the
+pool torn down and recreated, because a running child can't be stopped
+any other way. The slow file fails for good (it would time out again);
+jobs that were sharing the pool at that moment fail and are retried.
+
+PDF support needs ``pypdf``; DOCX is read with the standard library.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from xml.etree import ElementTree
+
+from ..dead_letters import PermanentJobError
+
+log = logging.getLogger(__name__)
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ExtractionError(PermanentJobError):
+    """The file can't be turned into text (corrupt, unsupported, too big)."""
+
+
+def detect_format(head: bytes, filename: str = "") -> str:
+    """Return "pdf", "docx", "text" or "unsupported" from magic bytes."""
+    name = (filename or "").lower()
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        # any zip; only .docx containers are understood
+        return "docx" if not name or name.endswith(".docx") else "unsupported"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        # legacy .doc (OLE2)
+        return "unsupported"
+    if b"\x00" in head[:1024] and not head.startswith(
+        (b"\xff\xfe", b"\xfe\xff")
+    ):
+        return "unsupported"
+    return "text"
+
+
+def _pdf_text(data: bytes) -> str:
+    try:
+        from pypdf import PdfReader  # type: ignore
+    except ImportError:
+        raise RuntimeError("pypdf is required to parse PDF resumes")
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _docx_text(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        xml = archive.read("word/document.xml")
+    paragraphs = []
+    for para in ElementTree.fromstring(xml).iter(f"{_W}p"):
+        paragraphs.append("".join(
+            node.text or "" for node in para.iter(f"{_W}t")
+        ))
+    return "\n".join(paragraphs)
+
+
+def _extract(data: bytes, fmt: str, max_chars: int) -> str:
+    """Runs in a pool process."""
+    try:
+        text = _pdf_text(data) if fmt == "pdf" else _docx_text(data)
+    except MemoryError:
+        raise ExtractionError(f"{fmt} extraction exceeded its memory limit")
+    except (RuntimeError, ExtractionError):
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Unreadable {fmt} file: {e}")
+    return text[:max_chars]
+
+
+def _limit_memory(max_bytes: int):
+    """Pool initializer: cap the child's address space (Linux/macOS)."""
+    if not max_bytes:
+        return
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError) as e:
+        log.warning("Could not limit extraction memory: %s", e)
+
+
+class ExtractionPool:
+    def __init__(
+        self,
+        workers: int = None,
+        timeout: float = 30.0,
+        memory_mb: int = 512,
+        max_chars: int = 200_000,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 * 1024 if memory_mb else 0
+        self.max_chars = max_chars
+        self._pool = None
+        self._lock = threading.Lock()
+        # one submitted job per process: nothing waits in the pool's queue
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self.extracted = 0
+        self.timeouts = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs gRPC threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_limit_memory,
+                    initargs=(self.memory_bytes,),
+                )
+            return self._pool
+
+    def _reset(self, pool: ProcessPoolExecutor):
+        """Kill a pool with a stuck job; the next call starts a new one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        processes = getattr(pool, "_processes", None) or {}
+        for process in list(processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def extract(self, data: bytes, fmt: str) -> str:
+        """Return up to ``max_chars`` of text for a detected format."""
+        if fmt == "text":
+            return data.decode("utf-8", errors="ignore")[:self.max_chars]
+        if fmt not in ("pdf", "docx"):
+            raise ExtractionError(f"Unsupported resume format: {fmt}")
+        with self._slots:
+            pool = self._get_pool()
+            future = pool.submit(_extract, data, fmt, self.max_chars)
+            try:
+                text = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                self.timeouts += 1
+                self._reset(pool)
+                raise ExtractionError(
+                    f"{fmt} extraction took longer than {self.timeout:.0f}s"
+                )
+        self.extracted += 1
+        return text
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
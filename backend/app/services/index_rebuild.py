@@ -0,0 +1,104 @@
+# app/services/index_rebuild.py
+"""Background rebuilds of the bulk-email recipient index.
+
+``start_rebuild`` hands the rebuild (see recipient_index.rebuild) to a
+single background thread, so POST /admin/recipient-index/rebuild returns a
+job id right away instead of scanning every student inside the request.
+Progress is mirrored to the ``index_rebuilds`` collection after each
+target, which lets any worker answer GET
+/admin/recipient-index/rebuild/{jobId}. A worker runs one rebuild at a
+time; starting another while it runs returns the running one.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import logging
+import threading
+import uuid
+
+from ..db import get_db_client, rebuild_recipient_index
+
+log = logging.getLogger(__name__)
+
+REBUILD_COLLECTION = "index_rebuilds"
+FINAL_STATUSES = ("completed", "failed", "interrupted")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index")
+_lock = threading.Lock()
+_current = None
+_stopping = threading.Event()
+
+
+class RebuildInterrupted(Exception):
+    """The worker is shutting down."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _update(job: dict, **changes) -> dict:
+    with _lock:
+        job.update(changes)
+        data = dict(job)
+    try:
+        get_db_client().collection(REBUILD_COLLECTION).document(
+            data["jobId"]
+        ).set(data, merge=True)
+    except Exception as e:
+        log.warning("Could not persist index rebuild %s: %s", data["jobId"], e)
+    return data
+
+
+def _run(job: dict):
+    _update(job, status="running", startedAt=_now())
+
+    def _progress(counts: dict):
+        _update(job, counts=counts)
+        if _stopping.is_set():
+            raise RebuildInterrupted()
+
+    try:
+        counts = rebuild_recipient_index(progress=_progress)
+    except RebuildInterrupted:
+        _update(job, status="interrupted", finishedAt=_now())
+    except Exception as e:
+        log.exception("Recipient index rebuild %s failed", job["jobId"])
+        _update(job, status="failed", error=str(e), finishedAt=_now())
+    else:
+        _update(job, status="completed", counts=counts, finishedAt=_now())
+
+
+def start_rebuild(created_by: str = None) -> dict:
+    """Queue a rebuild (unless one is running) and return its snapshot."""
+    global _current
+    with _lock:
+        if _current is not None and _current["status"] not in FINAL_STATUSES:
+            return dict(_current)
+        job = {
+            "jobId": uuid.uuid4().hex,
+            "status": "queued",
+            "createdBy": created_by,
+            "createdAt": _now(),
+            "counts": {},
+        }
+        _current = job
+    data = _update(job)
+    _executor.submit(_run, job)
+    return data
+
+
+def get_rebuild(job_id: str) -> dict:
+    """Return the rebuild snapshot from this worker or storage, or None."""
+    with _lock:
+        if _current is not None and _current["jobId"] == job_id:
+            return dict(_current)
+    doc = get_db_client().collection(REBUILD_COLLECTION).document(
+        job_id
+    ).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def shutdown():
+    """Stop a running rebuild after its current target."""
+    _stopping.set()
+    _executor.shutdown(wait=False, cancel_futures=True)
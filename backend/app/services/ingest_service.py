@@ -0,0 +1,144 @@
+# app/services/ingest_service.py
+"""Bulk student import used by /admin/create-bulk.
+
+Rows are split into Firestore write batches that commit in parallel on a
+small thread pool. A failed batch is retried row by row so one bad row only
+fails itself, and every row gets its own result entry. Document ids are
+allocated before the first attempt, so the retry reuses them and skips
+rows whose batch did commit after all (e.g. a commit that timed out on
+the client), instead of creating those students twice.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import logging
+import time
+
+from ..config import BULK_WRITE_BATCH_SIZE, BULK_WRITE_CONCURRENCY
+from ..db import (
+    MAX_BATCH_WRITES,
+    BatchTooLargeError,
+    create_student_doc,
+    create_student_docs,
+    existing_student_ids,
+    new_student_ids,
+)
+from .email_service import enqueue_email_job
+
+log = logging.getLogger(__name__)
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def _write_chunk(start: int, rows: list, ids: list) -> List[Dict[str, Any]]:
+    """Commit one chunk; fall back to per-row writes if the batch fails.
+
+    A chunk whose recipient-index updates don't fit next to its students
+    is split in half until each part commits in one atomic batch.
+    """
+    try:
+        created = create_student_docs(rows, ids)
+        return [
+            {"row": start + i, "ok": True, "alumniId": doc["alumniId"]}
+            for i, doc in enumerate(created)
+        ]
+    except BatchTooLargeError:
+        if len(rows) > 1:
+            half = len(rows) // 2
+            return _write_chunk(start, rows[:half], ids[:half]) + (
+                _write_chunk(start + half, rows[half:], ids[half:])
+            )
+        raise
+    except Exception as e:
+        log.warning(
+            "Batch of %d rows at %d failed (%s); retrying per row",
+            len(rows), start, e,
+        )
+    try:
+        existing = existing_student_ids(ids)
+    except Exception as e:
+        # can't tell whether the batch landed; don't risk duplicates
+        return [
+            {"row": start + i, "ok": False, "error": str(e)}
+            for i in range(len(rows))
+        ]
+    results = []
+    for i, (row, alumni_id) in enumerate(zip(rows, ids)):
+        try:
+            if alumni_id not in existing:
+                create_student_doc(row, alumni_id)
+            results.append(
+                {"row": start + i, "ok": True, "alumniId": alumni_id}
+            )
+        except Exception as e:
+            results.append({"row": start + i, "ok": False, "error": str(e)})
+    return results
+
+
+def _onboarding_job(row: dict, alumni_id: str, college_id: str) -> dict:
+    return {
+        "alumniId": alumni_id,
+        "collegeId": college_id,
+        "template": "onboarding",
+        "vars": {"name": row.get("firstName"), "alumniId": alumni_id},
+    }
+
+
+def ingest_students(
+    rows: List[Dict[str, Any]],
+    college_id: str,
+    batch_size: int = BULK_WRITE_BATCH_SIZE,
+    concurrency: int = BULK_WRITE_CONCURRENCY,
+    send_onboarding: bool = True,
+) -> Dict[str, Any]:
+    """Create student docs for ``rows`` and queue their onboarding emails.
+
+    Returns a summary with per-row results (``row`` is the index into
+    ``rows``) in input order; failures never abort the remaining rows.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+    prepared = [dict(row, collegeId=college_id) for row in rows]
+    started = time.perf_counter()
+
+    ids = new_student_ids(len(prepared))
+    chunks = [
+        (start, part, ids[start:start + len(part)])
+        for start, part in _chunks(prepared, batch_size)
+    ]
+    if concurrency <= 1 or len(chunks) <= 1:
+        chunk_results = [_write_chunk(*chunk) for chunk in chunks]
+    else:
+        workers = min(concurrency, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            chunk_results = list(
+                pool.map(lambda c: _write_chunk(*c), chunks)
+            )
+    results = [r for part in chunk_results for r in part]
+
+    if send_onboarding:
+        for r in results:
+            if not r["ok"]:
+                continue
+            try:
+                enqueue_email_job(
+                    _onboarding_job(
+                        prepared[r["row"]], r["alumniId"], college_id
+                    )
+                )
+            except Exception as e:
+                log.warning(
+                    "Onboarding email enqueue failed for %s: %s",
+                    r["alumniId"], e,
+                )
+
+    elapsed = time.perf_counter() - started
+    created = [r["alumniId"] for r in results if r["ok"]]
+    return {
+        "createdCount": len(created),
+        "failedCount": len(results) - len(created),
+        "ids": created,
+        "results": results,
+        "elapsedMs": round(elapsed * 1000, 1),
+    }
@@ -0,0 +1,144 @@
+# app/services/recipients.py
+"""Streaming recipient resolution for bulk email.
+
+Students are read page by page (ordered by document id, ``start_after`` the
+last document of the previous page) with only the ``email`` field selected,
+so memory stays flat no matter how many students a school or college has.
+Duplicate addresses are dropped using a set of 8-byte digests of the
+normalized address rather than the addresses themselves.
+
+When the target's recipient index has been built (see recipient_index.py)
+its shards are read instead, and the recipient count is available without
+iterating.
+"""
+from hashlib import blake2b
+from typing import Iterator, List
+
+from .. import recipient_index
+from ..config import (
+    RECIPIENT_INDEX_ENABLED,
+    RECIPIENT_INDEX_SHARDS,
+    RECIPIENT_PAGE_SIZE,
+)
+from ..db import get_db_client
+from ..recipient_index import normalize_email
+from ..storage.base import DOCUMENT_ID
+
+SCOPE_FIELDS = {"school": "schoolId", "college": "collegeId"}
+
+
+def iter_student_pages(
+    field: str,
+    value: str,
+    page_size: int = RECIPIENT_PAGE_SIZE,
+    fields=("email",),
+) -> Iterator[list]:
+    """Yield pages of student snapshots where ``field == value``."""
+    collection = get_db_client().collection("scl_students")
+    query = (
+        collection.where(field, "==", value)
+        .select(list(fields))
+        .order_by(DOCUMENT_ID)
+        .limit(page_size)
+    )
+    last = None
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        page = list(page_query.stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+class RecipientResolver:
+    """Iterate the unique emails of a school's or college's students.
+
+    Counters are updated as iteration proceeds: ``scanned`` documents (or
+    index entries), ``unique`` addresses yielded and ``skipped`` (missing,
+    invalid or duplicate addresses). ``source`` is "index" or "scan".
+    """
+
+    def __init__(
+        self, scope: str, target_id: str, page_size: int = RECIPIENT_PAGE_SIZE
+    ):
+        self.field = SCOPE_FIELDS[scope]
+        self.target_id = target_id
+        self.page_size = page_size
+        self.scanned = 0
+        self.unique = 0
+        self._index = None
+        self._index_checked = False
+
+    def _load_index(self):
+        if not self._index_checked:
+            self._index_checked = True
+            if RECIPIENT_INDEX_ENABLED:
+                self._index = recipient_index.read_target(
+                    get_db_client(), self.field, self.target_id,
+                    RECIPIENT_INDEX_SHARDS,
+                )
+        return self._index
+
+    @property
+    def source(self) -> str:
+        return "index" if self._load_index() is not None else "scan"
+
+    @property
+    def indexed_count(self):
+        """Distinct indexed addresses (None without a built index).
+
+        Shared addresses count once, matching ``unique`` after a scan.
+        """
+        index = self._load_index()
+        return index.count if index is not None else None
+
+    @property
+    def skipped(self) -> int:
+        return self.scanned - self.unique
+
+    def _raw_recipients(self) -> Iterator[tuple]:
+        index = self._load_index()
+        if index is not None:
+            yield from index
+            return
+        for page in iter_student_pages(
+            self.field, self.target_id, self.page_size,
+            fields=("email", "firstName"),
+        ):
+            for doc in page:
+                data = doc.to_dict() or {}
+                yield doc.id, data.get("email"), data.get("firstName")
+
+    def recipients(self) -> Iterator[dict]:
+        """Yield ``{"email", "alumniId", "name"}`` per unique address."""
+        seen = set()
+        for alumni_id, raw, name in self._raw_recipients():
+            self.scanned += 1
+            key = normalize_email(raw)
+            if not key:
+                continue
+            digest = blake2b(key.encode("utf-8"), digest_size=8).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            self.unique += 1
+            # the normalized form, as stored in the index
+            yield {"email": key, "alumniId": alumni_id, "name": name}
+
+    def __iter__(self) -> Iterator[str]:
+        for recipient in self.recipients():
+            yield recipient["email"]
+
+
+def chunked(items, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most ``size`` items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,78 @@
+# app/services/resume_cache.py
+"""Content-addressed cache of parsed resumes.
+
+Entries live in ``resume_cache`` under ``{kind}-v{version}-{sha256}``:
+``kind`` separates uploaded files ("file", hashed over the raw bytes) from
+text posted to the parse endpoint ("text"), and ``version`` is
+resume_service.PARSER_VERSION, so changing the parser never serves old
+results. A small per-process LRU in front of the collection answers
+repeated uploads without a read.
+"""
+import hashlib
+
+from ..cache import TTLCache
+
+CACHE_COLLECTION = "resume_cache"
+
+
+def content_digest(content) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class ParsedResumeCache:
+    def __init__(self, client, fs, version, max_entries: int = 1024):
+        self.client = client
+        self.fs = fs
+        self.version = version
+        self._recent = TTLCache(max_entries=max_entries, default_ttl=3600)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind: str, digest: str) -> str:
+        return f"{kind}-v{self.version}-{digest}"
+
+    def _ref(self, key: str):
+        return self.client.collection(CACHE_COLLECTION).document(key)
+
+    def get(self, key: str):
+        entry = self._recent.get(key)
+        if entry is None:
+            snap = self._ref(key).get()
+            if snap.exists:
+                entry = snap.to_dict()
+                self._recent.set(key, entry)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, data: dict, batch=None):
+        """Merge ``data`` into the entry, in ``batch`` if one is given.
+
+        With a batch, call ``remember`` once it has committed.
+        """
+        data = dict(data, updatedAt=self.fs.SERVER_TIMESTAMP)
+        if batch is not None:
+            batch.set(self._ref(key), data, merge=True)
+            return
+        self._ref(key).set(data, merge=True)
+        self.remember(key, data)
+
+    def remember(self, key: str, data: dict):
+        entry = dict(self._recent.get(key) or {})
+        for field, value in data.items():
+            if isinstance(value, dict) and isinstance(entry.get(field), dict):
+                entry[field] = {**entry[field], **value}
+            else:
+                entry[field] = value
+        self._recent.set(key, entry)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self.version,
+        }
@@ -1,57 +1,39 @@
 import re
+import threading
 from typing import Dict, Any, List
 import logging
-from ..db import patch_student
+from ..db import get_student, parsed_resume_cache, patch_student
+from .resume_cache import content_digest
+from .taxonomy import get_taxonomy
 
 log = logging.getLogger(__name__)
 
 # Very small, rule-based resume parser. This is intentionally lightweight so
-# it has no heavy dependencies. For production, replace/extend with an ML API
-# or a dedicated resume parsing library.
+# it has no heavy dependencies. Skills, courses and branches are matched
+# against the taxonomy in taxonomy.py. For production, replace/extend with
+# an ML API or a dedicated resume parsing library.
 
 YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
-SKILL_KEYWORDS = [
-    "python",
-    "java",
-    "c++",
-    "c#",
-    "javascript",
-    "typescript",
-    "react",
-    "node",
-    "django",
-    "flask",
-    "sql",
-    "postgres",
-    "mysql",
-    "aws",
-    "azure",
-    "gcp",
-    "docker",
-    "kubernetes",
-]
-
-COURSE_KEYWORDS = [
-    "btech",
-    "b.e.",
-    "b.e",
-    "b.sc",
-    "bachelor",
-    "ms",
-    "m.tech",
-    "m.sc",
-    "mba",
-]
-
-BRANCH_KEYWORDS = [
-    "computer",
-    "electrical",
-    "mechanical",
-    "civil",
-    "ece",
-    "it",
-    "information technology",
-]
+
+# Bump whenever parsing rules (here or in parse_worker) change so cached
+# results of the old parser are no longer used (see resume_cache.py).
+PARSER_VERSION = 2
+
+_resume_cache = None
+_resume_cache_lock = threading.Lock()
+
+
+def get_resume_cache():
+    """Return the process-wide parsed-resume cache."""
+    global _resume_cache
+    if _resume_cache is None:
+        with _resume_cache_lock:
+            if _resume_cache is None:
+                # a different taxonomy file changes results too
+                _resume_cache = parsed_resume_cache(
+                    f"{PARSER_VERSION}.{get_taxonomy().fingerprint}"
+                )
+    return _resume_cache
 
 
 def extract_years(text: str) -> List[int]:
@@ -67,51 +49,46 @@ def extract_years(text: str) -> List[int]:
 
 
 def extract_skills(text: str) -> List[str]:
-    lower = text.lower()
-    found = []
-    for k in SKILL_KEYWORDS:
-        if k in lower:
-            found.append(k)
-    return found
+    return get_taxonomy().find(text)["skills"]
 
 
 def extract_course(text: str) -> str:
-    lower = text.lower()
-    for k in COURSE_KEYWORDS:
-        if k in lower:
-            return k
-    return ""
+    courses = get_taxonomy().find(text)["courses"]
+    return courses[0] if courses else ""
 
 
 def extract_branch(text: str) -> str:
-    lower = text.lower()
-    for k in BRANCH_KEYWORDS:
-        if k in lower:
-            return k
-    return ""
+    branches = get_taxonomy().find(text)["branches"]
+    return branches[0] if branches else ""
 
 
 def parse_resume_text(text: str) -> Dict[str, Any]:
     years = extract_years(text)
-    skills = extract_skills(text)
-    course = extract_course(text)
-    branch = extract_branch(text)
+    # one pass over the text for skills, courses and branches
+    found = get_taxonomy().find(text)
     estimated_grad = None
     if years:
         # assume the largest year is most likely graduation if it is recent
         estimated_grad = max(years)
     return {
         "graduationYear": estimated_grad,
-        "skills": skills,
-        "course": course,
-        "branch": branch,
+        "skills": found["skills"],
+        "course": found["courses"][0] if found["courses"] else "",
+        "branch": found["branches"][0] if found["branches"] else "",
     }
 
 
 def parse_and_update_student(
     alumni_id: str, text: str, updated_by: str
 ) -> Dict[str, Any]:
-    parsed = parse_resume_text(text)
+    cache = get_resume_cache()
+    key = cache.key("text", content_digest(text))
+    entry = cache.get(key)
+    if entry is not None:
+        parsed = entry["parsed"]
+    else:
+        parsed = parse_resume_text(text)
+        cache.put(key, {"parsed": parsed})
     changes = {}
     if parsed.get("graduationYear"):
         changes["graduationYear"] = parsed["graduationYear"]
@@ -124,6 +101,10 @@ def parse_and_update_student(
         changes["branch"] = parsed["branch"]
     if not changes:
         return {"ok": False, "message": "No structured info found"}
+    student = get_student(alumni_id)
+    if student and all(student.get(k) == v for k, v in changes.items()):
+        # same resume again: nothing to write
+        return {"ok": True, "student": student, "parsed": parsed}
     # Use db.patch_student to apply changes; it will increment version.
     updated = patch_student(alumni_id, changes, updated_by)
     if not updated:
@@ -0,0 +1,140 @@
+# app/services/taxonomy.py
+"""Skill, course and branch taxonomy for resume parsing.
+
+A taxonomy is a JSON object mapping each category ("skills", "courses",
+"branches") to ``{canonical name: [synonyms]}``. Parsed resumes report
+canonical names, and each canonical name is a synonym of itself. The
+bundled resume_taxonomy.json is used unless RESUME_TAXONOMY_PATH points to
+another file.
+
+All synonyms of all categories are compiled into one regex, built as a
+character trie so that matching costs the same per character of text no
+matter how many terms there are, and the text is scanned once. Terms only
+match whole words: "it" doesn't match inside "with", and "java" doesn't
+match the start of "javascript". Canonical names and synonyms written in
+lower case match in any case; a synonym with capitals (an acronym such as
+"IT" or "MS") only matches as written, so the English words "it" and "ms"
+are not taken for it. Spaces in a synonym match any run of whitespace.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from ..config import RESUME_TAXONOMY_PATH
+
+log = logging.getLogger(__name__)
+
+CATEGORIES = ("skills", "courses", "branches")
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(__file__), "resume_taxonomy.json"
+)
+
+# word characters plus those that end terms like "c++" and "c#"
+_AFTER = r"(?![\w+#])"
+_BEFORE = r"(?<!\w)"
+
+
+def _normalize(term: str) -> str:
+    return " ".join(term.split())
+
+
+def _trie_pattern(node: dict) -> str:
+    """Regex for a trie of ``{char: child}``; "" marks the end of a term.
+
+    Longer terms are tried first, so "node.js" wins over "node".
+    """
+    alternatives = [
+        (r"\s+" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not alternatives:
+        return ""
+    if len(alternatives) == 1 and "" not in node:
+        return alternatives[0]
+    body = "(?:" + "|".join(alternatives) + ")"
+    return body + "?" if "" in node else body
+
+
+def _compile(terms) -> str:
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_pattern(trie)
+
+
+class Taxonomy:
+    def __init__(self, data: dict):
+        # matched term -> {category: canonical name}
+        self._folded = {}
+        self._exact = {}
+        for category in CATEGORIES:
+            entries = data.get(category) or {}
+            if not isinstance(entries, dict):
+                raise ValueError(f"Taxonomy {category!r} must be an object")
+            for canonical, synonyms in entries.items():
+                terms = [canonical.lower()] + list(synonyms or [])
+                for term in map(_normalize, terms):
+                    if not term:
+                        continue
+                    if term == term.lower():
+                        table = self._folded
+                    else:
+                        table = self._exact
+                    table.setdefault(term, {})[category] = canonical
+        self.terms = len(self._folded) + len(self._exact)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+        alternatives = []
+        if self._folded:
+            alternatives.append(
+                "(?P<folded>(?i:" + _compile(self._folded) + "))"
+            )
+        if self._exact:
+            alternatives.append("(?P<exact>" + _compile(self._exact) + ")")
+        self._pattern = re.compile(
+            _BEFORE + "(?:" + "|".join(alternatives or ["(?!)"]) + ")"
+            + _AFTER
+        )
+
+    def find(self, text: str) -> dict:
+        """Return ``{category: [canonical names in order of appearance]}``."""
+        found = {category: {} for category in CATEGORIES}
+        for m in self._pattern.finditer(text or ""):
+            term = _normalize(m.group(0))
+            if m.lastgroup == "folded":
+                names = self._folded.get(term.lower(), {})
+            else:
+                names = self._exact.get(term, {})
+            for category, canonical in names.items():
+                found[category].setdefault(canonical, None)
+        return {category: list(names) for category, names in found.items()}
+
+
+def load_taxonomy(path: str = None) -> Taxonomy:
+    path = path or RESUME_TAXONOMY_PATH or DEFAULT_PATH
+    with open(path, encoding="utf-8") as f:
+        taxonomy = Taxonomy(json.load(f))
+    log.info("Loaded %d resume taxonomy terms from %s", taxonomy.terms, path)
+    return taxonomy
+
+
+_taxonomy = None
+_taxonomy_lock = threading.Lock()
+
+
+def get_taxonomy() -> Taxonomy:
+    """Return the process-wide taxonomy, loading it on first use."""
+    global _taxonomy
+    if _taxonomy is None:
+        with _taxonomy_lock:
+            if _taxonomy is None:
+                _taxonomy = load_taxonomy()
+    return _taxonomy
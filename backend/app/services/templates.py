@@ -0,0 +1,304 @@
+# app/services/templates.py
+"""Email templates compiled once per process.
+
+Placeholders are ``{field}``. Each part of a template (subject, plain text,
+HTML) is split once into literal fragments and placeholder slots, so
+rendering is a join rather than a parse. ``bind`` fills the fields that are
+the same for a whole send (college name, announcement text) and caches the
+result; per recipient only the remaining slots (name, alumniId, ...) are
+filled. Values are HTML-escaped in the HTML part unless the field is listed
+in ``raw_fields``.
+
+For provider-side personalization, ``merge_fields`` renders each part once
+with substitution tokens in place of the per-recipient slots and returns
+the per-recipient substitution maps (see email_service.send_bulk_emails).
+"""
+from collections import namedtuple
+import html
+import re
+import threading
+
+from ..cache import TTLCache
+
+# Fields that differ per recipient; everything else is bound per send.
+RECIPIENT_FIELDS = ("name", "alumniId", "email")
+
+RenderedEmail = namedtuple("RenderedEmail", "subject text html")
+
+_FIELD_RE = re.compile(r"\{(\w+)\}")
+
+
+class _Slot:
+    __slots__ = ("field",)
+
+    def __init__(self, field: str):
+        self.field = field
+
+
+def _merge_literals(pieces) -> tuple:
+    out = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            if not piece:
+                continue
+            if out and isinstance(out[-1], str):
+                out[-1] += piece
+                continue
+        out.append(piece)
+    return tuple(out)
+
+
+class _Part:
+    """One compiled template string: literals interleaved with slots."""
+
+    __slots__ = ("pieces", "escape", "raw_fields")
+
+    def __init__(self, pieces, escape: bool, raw_fields=()):
+        self.pieces = pieces
+        self.escape = escape
+        self.raw_fields = frozenset(raw_fields)
+
+    @classmethod
+    def compile(cls, source: str, escape: bool, raw_fields=(), fields=None):
+        """Parse ``source``; with ``fields`` only those names are slots."""
+        pieces, pos = [], 0
+        for match in _FIELD_RE.finditer(source):
+            if fields is not None and match.group(1) not in fields:
+                continue
+            pieces.append(source[pos:match.start()])
+            pieces.append(_Slot(match.group(1)))
+            pos = match.end()
+        pieces.append(source[pos:])
+        return cls(_merge_literals(pieces), escape, raw_fields)
+
+    @property
+    def fields(self) -> set:
+        return {p.field for p in self.pieces if isinstance(p, _Slot)}
+
+    def _value(self, field: str, value) -> str:
+        value = "" if value is None else str(value)
+        if self.escape and field not in self.raw_fields:
+            return html.escape(value)
+        return value
+
+    def bind(self, values: dict) -> "_Part":
+        pieces = [
+            self._value(p.field, values[p.field])
+            if isinstance(p, _Slot) and p.field in values else p
+            for p in self.pieces
+        ]
+        return _Part(_merge_literals(pieces), self.escape, self.raw_fields)
+
+    def render(self, values: dict) -> str:
+        return "".join(
+            self._value(p.field, values.get(p.field))
+            if isinstance(p, _Slot) else p
+            for p in self.pieces
+        )
+
+    def with_tokens(self, tokens: dict) -> str:
+        return "".join(
+            tokens[p.field] if isinstance(p, _Slot) else p
+            for p in self.pieces
+        )
+
+
+def _token(field: str, part_is_html: bool) -> str:
+    return f"[%{field}.html%]" if part_is_html else f"[%{field}%]"
+
+
+class EmailTemplate:
+    def __init__(
+        self,
+        name: str,
+        subject: str,
+        text: str,
+        html_body: str = None,
+        defaults: dict = None,
+        raw_fields=(),
+        fields=None,
+    ):
+        self._init(
+            name,
+            defaults,
+            _Part.compile(subject, False, fields=fields),
+            _Part.compile(text, False, fields=fields),
+            (
+                _Part.compile(html_body, True, raw_fields, fields)
+                if html_body else None
+            ),
+        )
+
+    def _init(self, name, defaults, subject, text, html_part):
+        self.name = name
+        self.defaults = dict(defaults or {})
+        self.subject = subject
+        self.text = text
+        self.html = html_part
+        self._bound = TTLCache(max_entries=128)
+
+    def _parts(self):
+        return [p for p in (self.subject, self.text, self.html) if p]
+
+    @property
+    def fields(self) -> set:
+        """Placeholders still to be filled."""
+        return set().union(*(p.fields for p in self._parts()))
+
+    def _values(self, values: dict) -> dict:
+        out = dict(self.defaults)
+        out.update({k: v for k, v in values.items() if v not in (None, "")})
+        return out
+
+    def bind(self, shared: dict) -> "EmailTemplate":
+        """Return a copy with the ``shared`` fields pre-rendered (cached)."""
+        key = tuple(sorted((k, str(v)) for k, v in shared.items()))
+        bound = self._bound.get(key)
+        if bound is None:
+            values = {
+                k: v for k, v in self._values(shared).items()
+                if k in shared
+            }
+            bound = object.__new__(EmailTemplate)
+            bound._init(
+                self.name,
+                self.defaults,
+                self.subject.bind(values),
+                self.text.bind(values),
+                self.html.bind(values) if self.html else None,
+            )
+            self._bound.set(key, bound)
+        return bound
+
+    def render(self, values: dict) -> RenderedEmail:
+        values = self._values(values)
+        return RenderedEmail(
+            self.subject.render(values),
+            self.text.render(values),
+            self.html.render(values) if self.html else None,
+        )
+
+    def render_batch(self, values_list) -> list:
+        """Render one RenderedEmail per recipient variable map."""
+        return [self.render(values) for values in values_list]
+
+    def merge_fields(self, values_list):
+        """Render once with tokens; return (RenderedEmail, substitutions).
+
+        ``substitutions`` holds one ``{token: value}`` map per recipient,
+        with HTML-escaped values for the tokens used in the HTML part.
+        """
+        fields = sorted(self.fields)
+        plain_tokens = {f: _token(f, False) for f in fields}
+        html_tokens = {f: _token(f, True) for f in fields}
+        rendered = RenderedEmail(
+            self.subject.with_tokens(plain_tokens),
+            self.text.with_tokens(plain_tokens),
+            self.html.with_tokens(html_tokens) if self.html else None,
+        )
+        html_fields = self.html.fields if self.html else set()
+        substitutions = []
+        for values in values_list:
+            values = self._values(values)
+            subs = {}
+            for f in fields:
+                subs[plain_tokens[f]] = self.text._value(f, values.get(f))
+                if f in html_fields:
+                    subs[html_tokens[f]] = self.html._value(f, values.get(f))
+            substitutions.append(subs)
+        return rendered, substitutions
+
+
+_DEFAULTS = {"name": "there", "college": "your college"}
+
+# name -> (subject, text, html, raw_fields)
+_SOURCES = {
+    "onboarding": (
+        "{college}: welcome to Alumni Connect",
+        "Hi {name},\n\n"
+        "Your alumni profile at {college} is ready. Your Alumni ID is "
+        "{alumniId}.\nPlease sign in and check your profile.\n",
+        "<p>Hi {name},</p>"
+        "<p>Your alumni profile at {college} is ready. Your Alumni ID is "
+        "<strong>{alumniId}</strong>.</p>"
+        "<p>Please sign in and check your profile.</p>",
+        (),
+    ),
+    "announcement": (
+        "{subject}",
+        "Hi {name},\n\n{message}\n\n- {college}\n",
+        "<p>Hi {name},</p><div>{message_html}</div><p>- {college}</p>",
+        ("message_html",),
+    ),
+    "profile_reminder": (
+        "{college}: please update your alumni profile",
+        "Hi {name},\n\nA few details are missing from your alumni profile "
+        "({alumniId}). Please sign in and complete it.\n",
+        "<p>Hi {name},</p><p>A few details are missing from your alumni "
+        "profile ({alumniId}). Please sign in and complete it.</p>",
+        (),
+    ),
+    # Used for job templates without an entry of their own.
+    "generic": (
+        "{college}: {template}",
+        "Hi {name},\nPlease check your profile.",
+        None,
+        (),
+    ),
+}
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _load_registry() -> dict:
+    if not _registry:
+        with _registry_lock:
+            if not _registry:
+                for name, (subject, text, html_body, raw) in (
+                    _SOURCES.items()
+                ):
+                    _registry[name] = EmailTemplate(
+                        name, subject, text, html_body, _DEFAULTS, raw
+                    )
+    return _registry
+
+
+def get_template(name: str, fallback: str = None) -> EmailTemplate:
+    """Return the compiled template ``name`` (or ``fallback``).
+
+    Raises KeyError if neither is registered.
+    """
+    registry = _load_registry()
+    if name in registry:
+        return registry[name]
+    if fallback is not None:
+        return registry[fallback]
+    raise KeyError(f"Unknown email template: {name}")
+
+
+def template_names() -> list:
+    return sorted(_load_registry())
+
+
+def compile_template(
+    name: str, subject: str, text: str, html_body: str = None
+) -> EmailTemplate:
+    """Compile free-form text (e.g. a bulk email written by an admin).
+
+    Only ``{college}`` and the recipient fields are treated as
+    placeholders, so other braces (CSS in HTML bodies) pass through.
+    """
+    return EmailTemplate(
+        name,
+        subject,
+        text,
+        html_body,
+        _DEFAULTS,
+        fields=RECIPIENT_FIELDS + ("college",),
+    )
+
+
+def text_to_html(text: str) -> str:
+    """Escape plain text for an HTML part, keeping line breaks."""
+    return html.escape(text or "").replace("\n", "<br>\n")
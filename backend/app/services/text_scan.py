@@ -0,0 +1,78 @@
+# app/services/text_scan.py
+"""Incremental regex scanning of text that arrives in chunks.
+
+``StreamScanner`` keeps only the tail of the previous chunk, so memory per
+scan is bounded by the chunk size plus ``overlap`` no matter how large the
+input is. A match is accepted once the regex has seen text past its end;
+one that runs into the end of the buffer is carried over with the tail and
+completed by the next chunk. ``overlap`` also gives the regexes left
+context, so it should be at least the longest match that is expected.
+Matches are de-duplicated and capped at ``max_matches`` per pattern.
+"""
+import codecs
+
+
+class StreamScanner:
+    def __init__(self, patterns: dict, overlap: int = 256, max_matches=100):
+        self.patterns = dict(patterns)
+        self.overlap = max(1, overlap)
+        self.max_matches = max_matches
+        self._tail = ""
+        # global offset of self._tail[0]
+        self._base = 0
+        # per pattern: global offset scanning resumes from
+        self._next = {name: 0 for name in self.patterns}
+        self._found = {name: {} for name in self.patterns}
+        self.chars = 0
+
+    def _scan(self, buffer: str, final: bool) -> int:
+        """Collect matches; return where the carried-over tail starts."""
+        limit = len(buffer) if final else len(buffer) - self.overlap
+        keep_from = max(0, limit)
+        for name, pattern in self.patterns.items():
+            found = self._found[name]
+            start = max(0, self._next[name] - self._base)
+            for m in pattern.finditer(buffer, start):
+                if m.start() >= limit:
+                    break
+                if not final and m.end() >= len(buffer):
+                    # may continue in the next chunk; rescan it from there
+                    # unless it is already longer than any sane match
+                    if len(buffer) - m.start() <= 4 * self.overlap:
+                        keep_from = min(keep_from, m.start())
+                    break
+                self._next[name] = self._base + m.end()
+                if len(found) < self.max_matches:
+                    found.setdefault(m.group(0), None)
+        return keep_from
+
+    def feed(self, text: str):
+        if not text:
+            return
+        self.chars += len(text)
+        buffer = self._tail + text
+        keep_from = self._scan(buffer, final=False)
+        self._tail = buffer[keep_from:]
+        self._base += keep_from
+
+    def close(self) -> dict:
+        """Scan what is left; return ``{name: [matches in order]}``."""
+        self._scan(self._tail, final=True)
+        self._tail = ""
+        return {name: list(found) for name, found in self._found.items()}
+
+
+def iter_text(chunks, encoding: str = "utf-8"):
+    """Decode an iterable of byte chunks, ignoring undecodable bytes."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def scan_chunks(chunks, patterns: dict, encoding: str = "utf-8", **kwargs):
+    """Decode an iterable of byte chunks and scan it with StreamScanner."""
+    scanner = StreamScanner(patterns, **kwargs)
+    for text in iter_text(chunks, encoding):
+        scanner.feed(text)
+    return scanner.close()
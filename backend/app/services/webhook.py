@@ -4,7 +4,7 @@ import hashlib
 import json
 import requests
 
-from firebase_admin import firestore
+from ..db import get_db_client
 
 
 def sign_payload(secret: str, payload: dict) -> str:
@@ -16,7 +16,7 @@ def sign_payload(secret: str, payload: dict) -> str:
 
 def dispatch_to_college(college_id: str, payload: dict):
     """Look up webhook registrations and dispatch signed payloads."""
-    db = firestore.client()
+    db = get_db_client()
     reg_doc = db.collection("webhook_registrations").document(college_id).get()
     if not reg_doc.exists:
         return False
@@ -0,0 +1,212 @@
+# app/smtp_pool.py
+"""Thread-safe pool of authenticated SMTP sessions.
+
+Opening a session costs a TCP connect, EHLO, STARTTLS and AUTH, which is
+far more than sending one message on an open session. ``SMTPPool`` keeps up
+to ``max_size`` sessions open and hands them to one thread at a time:
+
+- a session idle for longer than ``noop_after`` is checked with NOOP before
+  reuse, and one idle past ``max_idle`` is closed instead;
+- a session is closed after ``max_messages`` messages so servers that limit
+  messages per connection never reject one mid-stream;
+- a send that fails because the server dropped the connection is retried
+  once on a fresh session.
+"""
+from contextlib import contextmanager
+import logging
+import smtplib
+import ssl
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+def _is_connection_error(e: BaseException) -> bool:
+    """True if ``e`` means the session is unusable, not the message bad.
+
+    SMTPException subclasses OSError, so protocol replies are told apart
+    from socket failures explicitly; 421 is the server closing the session.
+    """
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421
+    return isinstance(e, OSError) and not isinstance(
+        e, smtplib.SMTPException
+    )
+
+
+class _Session:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        max_size: int = 4,
+        max_messages: int = 100,
+        noop_after: float = 30.0,
+        max_idle: float = 300.0,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max(1, max_size)
+        self.max_messages = max(1, max_messages)
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.connects = 0
+        self.reconnects = 0
+        self.recycled = 0
+        self.sent = 0
+
+    def _connect(self) -> _Session:
+        context = ssl.create_default_context()
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(
+                self.host, self.port, timeout=self.timeout, context=context
+            )
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls(context=context)
+                server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self.connects += 1
+        return _Session(server)
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _healthy(self, session: _Session) -> bool:
+        idle = time.monotonic() - session.last_used
+        if idle > self.max_idle:
+            return False
+        if idle <= self.noop_after:
+            return True
+        try:
+            return session.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _Session:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SMTP pool is closed")
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    session = None
+                    break
+                self._cond.wait()
+        if session is not None:
+            if self._healthy(session):
+                return session
+            self._quit(session.server)
+            self.reconnects += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, session: _Session, broken: bool = False):
+        recycle = broken or session.messages >= self.max_messages
+        with self._cond:
+            if recycle or self._closed:
+                self._open -= 1
+            else:
+                session.last_used = time.monotonic()
+                self._idle.append(session)
+            self._cond.notify()
+        if recycle or self._closed:
+            if not broken:
+                self.recycled += 1
+            self._quit(session.server)
+
+    @contextmanager
+    def session(self):
+        """Borrow an open, authenticated ``smtplib.SMTP`` session."""
+        session = self._acquire()
+        try:
+            yield session.server
+        except BaseException as e:
+            # a refused recipient or bad message leaves the session usable
+            self._release(session, broken=_is_connection_error(e))
+            raise
+        else:
+            session.messages += 1
+            self._release(session)
+
+    def send(self, from_addr: str, to_addrs: list, message: str) -> dict:
+        """Send ``message``, retrying once if the session was dropped.
+
+        Returns the recipients the server refused while accepting others,
+        as ``sendmail`` does: ``{address: (code, message)}``.
+        """
+        for attempt in range(2):
+            try:
+                with self.session() as server:
+                    refused = server.sendmail(from_addr, to_addrs, message)
+                self.sent += 1
+                return refused or {}
+            except Exception as e:
+                if attempt or not _is_connection_error(e):
+                    raise
+                self.reconnects += 1
+                log.info("SMTP session dropped (%s); reconnecting", e)
+
+    def close(self):
+        """Close idle sessions; sessions in use close when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session.server)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "open": self._open,
+                "idle": len(self._idle),
+                "maxSize": self.max_size,
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "recycled": self.recycled,
+                "sent": self.sent,
+            }
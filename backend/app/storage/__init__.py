@@ -0,0 +1,7 @@
+# app/storage/__init__.py
+"""In-process storage backends used in place of Firestore.
+
+STORAGE_BACKEND=memory keeps documents in this process and
+STORAGE_BACKEND=sqlite keeps them in a SQLite file; db.py picks the
+module. Both expose the ``firebase_admin.firestore`` names db.py uses.
+"""
@@ -0,0 +1,458 @@
+# app/storage/base.py
+"""Shared document model for the in-process storage backends.
+
+``InProcessClient`` mimics the subset of the Firestore client API the
+backend uses (documents, collections, ``where`` queries, batches and
+transactions) on top of four persistence primitives that the memory and
+SQLite backends implement. Both backend modules expose the same
+module-level names as ``firebase_admin.firestore`` (``client``,
+``transactional``, ``SERVER_TIMESTAMP``, ``DELETE_FIELD``, ``Increment``,
+``Query``) so db.py can use either one in place of Firestore.
+
+Each process holds its own data (SQLite shares it through the file), and
+transactions are serialized with a process-wide lock rather than retried.
+"""
+from datetime import datetime, timezone
+import copy
+import random
+import string
+import threading
+import time
+
+
+class _Sentinel:
+    def __init__(self, name: str):
+        self._name = name
+
+    def __repr__(self):
+        return f"Sentinel({self._name})"
+
+
+SERVER_TIMESTAMP = _Sentinel("SERVER_TIMESTAMP")
+DELETE_FIELD = _Sentinel("DELETE_FIELD")
+
+
+class Increment:
+    """Counterpart of ``firestore.Increment``: add ``value`` to a field."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+class NotFound(Exception):
+    """Raised when updating a document that does not exist."""
+
+
+def new_document_id() -> str:
+    """Return a 20-character id in the same alphabet Firestore uses."""
+    return "".join(random.choices(_ID_ALPHABET, k=20))
+
+
+def _resolve(value, now: datetime, current=None):
+    if value is SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, Increment):
+        base = current if isinstance(current, (int, float)) else 0
+        return base + value.value
+    if isinstance(value, dict):
+        return {
+            k: _resolve(v, now)
+            for k, v in value.items()
+            if v is not DELETE_FIELD
+        }
+    if isinstance(value, list):
+        return [_resolve(v, now) for v in value]
+    return copy.deepcopy(value)
+
+
+def _apply_update(data: dict, changes: dict, now: datetime) -> dict:
+    out = copy.deepcopy(data)
+    for path, value in changes.items():
+        target = out
+        *parents, leaf = path.split(".")
+        for part in parents:
+            child = target.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                target[part] = child
+            target = child
+        if value is DELETE_FIELD:
+            target.pop(leaf, None)
+        else:
+            target[leaf] = _resolve(value, now, target.get(leaf))
+    return out
+
+
+def _merge(data: dict, changes: dict, now: datetime) -> dict:
+    """Deep-merge ``changes`` into ``data`` like ``set(..., merge=True)``.
+
+    Unlike ``update``, keys are not field paths: nested maps are merged
+    key by key.
+    """
+    out = copy.deepcopy(data)
+    for key, value in changes.items():
+        if value is DELETE_FIELD:
+            out.pop(key, None)
+        elif isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = _merge(out[key], value, now)
+        else:
+            out[key] = _resolve(value, now, out.get(key))
+    return out
+
+
+_MISSING = object()
+
+
+def _get_path(data: dict, path: str):
+    value = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def project_fields(data: dict, field_paths) -> dict:
+    """Return only ``field_paths`` of ``data`` (dotted paths allowed).
+
+    Mirrors Firestore field masks: nested paths come back as nested maps and
+    missing fields are omitted.
+    """
+    if data is None or field_paths is None:
+        return data
+    out = {}
+    for path in field_paths:
+        value = _get_path(data, path)
+        if value is _MISSING:
+            continue
+        target = out
+        *parents, leaf = path.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = copy.deepcopy(value)
+    return out
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        value = _get_path(self._data or {}, field_path)
+        return None if value is _MISSING else copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, collection: str, doc_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    def get(self, field_paths=None, transaction=None, **_):
+        self._client._round_trip()
+        data = project_fields(self._client._read(self), field_paths)
+        return DocumentSnapshot(self, data)
+
+    def set(self, data: dict, merge: bool = False):
+        self._client._round_trip()
+        with self._client._atomic():
+            self._client._write_set(self, data, merge)
+
+    def update(self, changes: dict):
+        self._client._round_trip()
+        with self._client._atomic():
+            self._client._write_update(self, changes)
+
+    def delete(self):
+        self._client._round_trip()
+        with self._client._atomic():
+            self._client._delete(self._collection, self.id)
+
+
+DOCUMENT_ID = "__name__"
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(
+        self,
+        client,
+        collection: str,
+        filters=(),
+        fields=None,
+        order=None,
+        descending=False,
+        cursor=None,
+        limit=None,
+    ):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._order = order
+        self._descending = descending
+        self._cursor = cursor
+        self._limit = limit
+
+    def _copy(self, **overrides):
+        state = {
+            "filters": self._filters,
+            "fields": self._fields,
+            "order": self._order,
+            "descending": self._descending,
+            "cursor": self._cursor,
+            "limit": self._limit,
+        }
+        state.update(overrides)
+        return Query(self._client, self._collection, **state)
+
+    def order_by(self, field_path: str, direction: str = ASCENDING):
+        """Order by one field; like Firestore, ties go by document id in
+        the same direction and documents without the field are left out.
+        """
+        if direction not in (self.ASCENDING, self.DESCENDING):
+            raise ValueError(f"Unsupported order direction: {direction}")
+        if self._order is not None:
+            raise ValueError("Local store only supports one order_by")
+        return self._copy(
+            order=field_path, descending=direction == self.DESCENDING
+        )
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def _sort_key(self, doc_id: str, data: dict):
+        if self._order == DOCUMENT_ID:
+            return doc_id
+        return (_get_path(data, self._order), doc_id)
+
+    def _cursor_key(self):
+        cursor = self._cursor
+        if isinstance(cursor, DocumentSnapshot):
+            return self._sort_key(cursor.id, cursor._data or {})
+        if self._order == DOCUMENT_ID:
+            return cursor[DOCUMENT_ID] if isinstance(cursor, dict) else cursor
+        return (_get_path(cursor, self._order), "")
+
+    def where(self, field_path: str, op_string: str, value):
+        if op_string not in ("==", "in"):
+            raise ValueError(f"Unsupported query operator: {op_string}")
+        return self._copy(
+            filters=self._filters + ((field_path, op_string, value),)
+        )
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def _matches(self, data: dict) -> bool:
+        for field_path, op_string, value in self._filters:
+            actual = _get_path(data, field_path)
+            if actual is _MISSING:
+                return False
+            if op_string == "==" and actual != value:
+                return False
+            if op_string == "in" and actual not in value:
+                return False
+        return True
+
+    def stream(self, transaction=None, **_):
+        self._client._round_trip()
+        rows = (
+            (doc_id, data)
+            for doc_id, data in self._client._scan(self._collection)
+            if self._matches(data)
+        )
+        if self._order is not None:
+            if self._order != DOCUMENT_ID:
+                rows = (
+                    r for r in rows
+                    if _get_path(r[1], self._order) is not _MISSING
+                )
+            rows = sorted(
+                rows,
+                key=lambda r: self._sort_key(*r),
+                reverse=self._descending,
+            )
+            if self._cursor is not None:
+                after = self._cursor_key()
+                if self._descending:
+                    rows = [r for r in rows if self._sort_key(*r) < after]
+                else:
+                    rows = [r for r in rows if self._sort_key(*r) > after]
+        elif self._cursor is not None:
+            raise ValueError("start_after requires order_by")
+        for n, (doc_id, data) in enumerate(rows):
+            if self._limit is not None and n >= self._limit:
+                return
+            ref = DocumentReference(self._client, self._collection, doc_id)
+            yield DocumentSnapshot(ref, project_fields(data, self._fields))
+
+    def get(self, transaction=None, **_):
+        return list(self.stream(transaction=transaction))
+
+
+class CollectionReference(Query):
+    def __init__(self, client, name: str):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, document_id: str = None):
+        return DocumentReference(
+            self._client, self._collection, document_id or new_document_id()
+        )
+
+    def add(self, data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._writes.append(("set", reference, data, merge))
+        return self
+
+    def update(self, reference, changes: dict):
+        self._writes.append(("update", reference, changes, None))
+        return self
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, None))
+        return self
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self):
+        self._client._round_trip()
+        with self._client._atomic():
+            # validate first so the batch applies all-or-nothing
+            for kind, ref, _, _ in self._writes:
+                if kind == "update" and self._client._read(ref) is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+            for kind, ref, data, merge in self._writes:
+                if kind == "set":
+                    self._client._write_set(ref, data, merge)
+                elif kind == "update":
+                    self._client._write_update(ref, data)
+                else:
+                    self._client._delete(ref._collection, ref.id)
+        self._writes = []
+
+
+class Transaction(WriteBatch):
+    """Write batch whose reads and commit run under the store lock."""
+
+
+def transactional(func):
+    """Counterpart of ``firestore.transactional`` for local stores."""
+
+    def wrapper(transaction, *args, **kwargs):
+        with transaction._client._atomic():
+            result = func(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+
+    return wrapper
+
+
+class InProcessClient:
+    """Firestore-like client over ``_load``/``_store``/``_delete``/``_scan``.
+
+    ``rtt_ms`` adds a simulated round trip to every call that would reach
+    the network with Firestore, so benchmarks see realistic call counts.
+    """
+
+    def __init__(self, rtt_ms: float = 0.0):
+        self._lock = threading.RLock()
+        self._rtt = max(0.0, rtt_ms) / 1000.0
+        self.round_trips = 0
+
+    # persistence primitives -------------------------------------------------
+    def _load(self, collection: str, doc_id: str):
+        raise NotImplementedError
+
+    def _store(self, collection: str, doc_id: str, data: dict):
+        raise NotImplementedError
+
+    def _delete(self, collection: str, doc_id: str):
+        raise NotImplementedError
+
+    def _scan(self, collection: str):
+        raise NotImplementedError
+
+    def _atomic(self):
+        """Context manager that makes a group of writes all-or-nothing."""
+        return self._lock
+
+    # shared behaviour -------------------------------------------------------
+    def _round_trip(self):
+        self.round_trips += 1
+        if self._rtt:
+            time.sleep(self._rtt)
+
+    def _read(self, ref: DocumentReference):
+        return self._load(ref._collection, ref.id)
+
+    def _write_set(self, ref: DocumentReference, data: dict, merge: bool):
+        now = datetime.now(timezone.utc)
+        if merge:
+            current = self._load(ref._collection, ref.id) or {}
+            new = _merge(current, data, now)
+        else:
+            new = _resolve(data, now)
+        self._store(ref._collection, ref.id, new)
+
+    def _write_update(self, ref: DocumentReference, changes: dict):
+        current = self._load(ref._collection, ref.id)
+        if current is None:
+            raise NotFound(f"No document to update: {ref.path}")
+        now = datetime.now(timezone.utc)
+        self._store(
+            ref._collection, ref.id, _apply_update(current, changes, now)
+        )
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def document(self, path: str) -> DocumentReference:
+        collection, doc_id = path.split("/", 1)
+        return DocumentReference(self, collection, doc_id)
+
+    def get_all(self, references, field_paths=None, transaction=None, **_):
+        """Read several documents in one round trip."""
+        self._round_trip()
+        for ref in references:
+            data = project_fields(self._read(ref), field_paths)
+            yield DocumentSnapshot(ref, data)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, **_) -> Transaction:
+        return Transaction(self)
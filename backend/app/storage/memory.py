@@ -0,0 +1,47 @@
+# app/storage/memory.py
+"""Pure in-memory storage backend (STORAGE_BACKEND=memory).
+
+Data lives in this process only and is lost on restart; meant for local
+runs, load tests and benchmarks. Exposes the same module-level API as
+``firebase_admin.firestore``.
+"""
+from ..config import STORAGE_SIMULATED_RTT_MS
+from .base import (  # noqa: F401 - re-exported module API
+    DELETE_FIELD,
+    Increment,
+    SERVER_TIMESTAMP,
+    InProcessClient,
+    Query,
+    transactional,
+)
+
+
+class MemoryClient(InProcessClient):
+    def __init__(self, rtt_ms: float = 0.0):
+        super().__init__(rtt_ms=rtt_ms)
+        self._collections = {}
+
+    def _load(self, collection: str, doc_id: str):
+        return self._collections.get(collection, {}).get(doc_id)
+
+    def _store(self, collection: str, doc_id: str, data: dict):
+        self._collections.setdefault(collection, {})[doc_id] = data
+
+    def _delete(self, collection: str, doc_id: str):
+        self._collections.get(collection, {}).pop(doc_id, None)
+
+    def _scan(self, collection: str):
+        with self._lock:
+            items = list(self._collections.get(collection, {}).items())
+        return iter(items)
+
+
+_client = None
+
+
+def client() -> MemoryClient:
+    """Return the process-wide in-memory client."""
+    global _client
+    if _client is None:
+        _client = MemoryClient(rtt_ms=STORAGE_SIMULATED_RTT_MS)
+    return _client
@@ -0,0 +1,117 @@
+# app/storage/sqlite.py
+"""SQLite storage backend (STORAGE_BACKEND=sqlite).
+
+Documents are stored as JSON in a single ``documents`` table keyed by
+(collection, id) in the file named by SQLITE_PATH, so data survives
+restarts and can be shared by the API and workers on one machine. Exposes
+the same module-level API as ``firebase_admin.firestore``.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import sqlite3
+
+from ..config import SQLITE_PATH, STORAGE_SIMULATED_RTT_MS
+from .base import (  # noqa: F401 - re-exported module API
+    DELETE_FIELD,
+    Increment,
+    SERVER_TIMESTAMP,
+    InProcessClient,
+    Query,
+    transactional,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+)
+"""
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in SQLite backend")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class SQLiteClient(InProcessClient):
+    def __init__(self, path: str, rtt_ms: float = 0.0):
+        super().__init__(rtt_ms=rtt_ms)
+        self.path = path
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._depth = 0
+
+    @contextmanager
+    def _atomic(self):
+        with self._lock:
+            outer = self._depth == 0
+            if outer:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outer:
+                self._conn.execute("COMMIT")
+
+    def _load(self, collection: str, doc_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND id = ?",
+                (collection, doc_id),
+            ).fetchone()
+        return json.loads(row[0], object_hook=_decode) if row else None
+
+    def _store(self, collection: str, doc_id: str, data: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, id, data) "
+                "VALUES (?, ?, ?)",
+                (collection, doc_id, json.dumps(data, default=_encode)),
+            )
+
+    def _delete(self, collection: str, doc_id: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM documents WHERE collection = ? AND id = ?",
+                (collection, doc_id),
+            )
+
+    def _scan(self, collection: str):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM documents WHERE collection = ?",
+                (collection,),
+            ).fetchall()
+        for doc_id, raw in rows:
+            yield doc_id, json.loads(raw, object_hook=_decode)
+
+
+_client = None
+
+
+def client() -> SQLiteClient:
+    """Return the process-wide SQLite client."""
+    global _client
+    if _client is None:
+        _client = SQLiteClient(SQLITE_PATH, rtt_ms=STORAGE_SIMULATED_RTT_MS)
+    return _client
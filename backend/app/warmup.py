@@ -0,0 +1,159 @@
+# app/warmup.py
+"""Startup warm-up of external clients and the state behind /readyz.
+
+The storage client, the event publisher, the job queue and the SendGrid
+client are otherwise created on the first request that needs them, so the
+first requests after a deploy or worker recycle pay for credential
+resolution and channel setup (and the first resume parse for compiling the
+skill taxonomy). ``warm_up`` creates them in parallel and
+waits up to a deadline; anything slower keeps warming in the background and
+is reported as "pending" until it finishes. A required dependency that
+failed is probed again in the background when /readyz is polled, at most
+once per WARMUP_RETRY_SECONDS, so readiness recovers with the backend.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+from . import db
+from .config import WARMUP_RETRY_SECONDS
+from .queues import get_job_queue
+from .services import email_service
+from .services.taxonomy import get_taxonomy
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {}
+# name -> monotonic time of the last finished or started probe
+_probed_at = {}
+_probing = set()
+
+
+def _warm_storage():
+    client = db.get_db_client()
+    # One cheap read opens the channel and resolves credentials.
+    client.collection("_warmup").document("ping").get()
+    return "ready"
+
+
+def _warm_event_publisher():
+    return "ready" if db.event_publisher.warm() else "failed"
+
+
+def _warm_job_queue():
+    return "ready" if get_job_queue().warm() else "failed"
+
+
+def _warm_sendgrid():
+    if email_service._use_smtp() or not email_service.SENDGRID_API_KEY:
+        return "disabled"
+    email_service._get_sg_client()
+    return "ready"
+
+
+def _warm_resume_taxonomy():
+    get_taxonomy()
+    return "ready"
+
+
+# name -> (warm function, required for readiness)
+DEPENDENCIES = {
+    "storage": (_warm_storage, True),
+    "eventPublisher": (_warm_event_publisher, False),
+    "jobQueue": (_warm_job_queue, False),
+    "sendgrid": (_warm_sendgrid, False),
+    "resumeTaxonomy": (_warm_resume_taxonomy, False),
+}
+
+
+def _run(name: str, fn):
+    t0 = time.perf_counter()
+    error = None
+    try:
+        status = fn()
+    except Exception as e:
+        status, error = "failed", str(e)
+    if status == "failed" and error is None:
+        error = "client unavailable (see logs)"
+    elapsed = round((time.perf_counter() - t0) * 1000, 1)
+    with _lock:
+        _state[name].update(status=status, ms=elapsed, error=error)
+        _probed_at[name] = time.monotonic()
+        _probing.discard(name)
+    if status == "failed":
+        log.warning(
+            "Warm-up of %s failed after %sms: %s", name, elapsed, error
+        )
+    else:
+        log.info("Warm-up of %s: %s in %sms", name, status, elapsed)
+
+
+def warm_up(deadline: float) -> dict:
+    """Warm all dependencies in parallel, waiting at most ``deadline``."""
+    with _lock:
+        for name, (_, required) in DEPENDENCIES.items():
+            _state[name] = {
+                "status": "pending",
+                "required": required,
+                "ms": None,
+                "error": None,
+            }
+    pool = ThreadPoolExecutor(
+        max_workers=len(DEPENDENCIES), thread_name_prefix="warmup"
+    )
+    futures = [
+        pool.submit(_run, name, fn)
+        for name, (fn, _) in DEPENDENCIES.items()
+    ]
+    _, not_done = wait(futures, timeout=deadline)
+    # let stragglers finish in the background; /readyz reports them pending
+    pool.shutdown(wait=False)
+    if not_done:
+        log.warning(
+            "Warm-up deadline of %.1fs reached with %d dependencies pending",
+            deadline, len(not_done),
+        )
+    return readiness()
+
+
+def _reprobe_failed():
+    """Start background probes of failed required dependencies.
+
+    Called with ``_lock`` held; rate-limited per dependency.
+    """
+    now = time.monotonic()
+    for name, info in _state.items():
+        fn, required = DEPENDENCIES[name]
+        if (
+            not required
+            or info["status"] != "failed"
+            or name in _probing
+            or now - _probed_at.get(name, 0.0) < WARMUP_RETRY_SECONDS
+        ):
+            continue
+        _probing.add(name)
+        _probed_at[name] = now
+        threading.Thread(
+            target=_run, args=(name, fn), name=f"warmup-{name}", daemon=True
+        ).start()
+
+
+def readiness() -> dict:
+    """Return overall readiness plus per-dependency status and timings.
+
+    Ready means warm-up ran, every required dependency is ready and none is
+    still pending; failed optional dependencies are reported but don't
+    block traffic. Failed required dependencies are re-probed in the
+    background; the result shows up on a later call.
+    """
+    with _lock:
+        _reprobe_failed()
+        deps = {name: dict(info) for name, info in _state.items()}
+    ready = bool(deps) and all(
+        info["status"] != "pending"
+        and (info["status"] == "ready" or not info["required"])
+        for info in deps.values()
+    )
+    return {"ready": ready, "dependencies": deps}
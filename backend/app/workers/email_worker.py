@@ -1,56 +1,315 @@
 # app/workers/email_worker.py
+"""Worker that renders and sends queued email jobs (see app/queues).
+
+Leased messages are gathered into micro-batches of up to
+EMAIL_WORKER_BATCH_SIZE jobs or EMAIL_WORKER_BATCH_WINDOW_MS, whichever
+comes first; each batch reads its students with one ``get_all`` and writes
+its ``email_jobs`` entries in one batch commit, while messages are still
+acked or nacked one by one. Jobs whose idempotency key is already in the
+delivery ledger (delivery_ledger.py) are acked without sending. Failed
+jobs are retried with backoff or dead-lettered (dead_letters.py).
+
+Sends run on a bounded thread pool (EMAIL_WORKER_CONCURRENCY) and the
+subscriber leases at most EMAIL_WORKER_MAX_MESSAGES / _MAX_BYTES at once,
+so throughput scales with the pool while the SMTP pool and send rate
+limits in email_service keep the providers from being overwhelmed.
+SIGTERM/SIGINT stop pulling, let in-flight jobs finish (up to
+EMAIL_WORKER_DRAIN_SECONDS) and return unstarted leases to the queue.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import json
-from google.cloud import pubsub_v1
-from google.cloud import firestore
-from ..services.email_service import send_email_direct
-from ..config import PROJECT_ID, PUBSUB_EMAIL_TOPIC
+import logging
+import signal
+import threading
+import time
+from ..services.email_service import close_smtp_pool, send_email_direct
+from ..auth import FIREBASE_ADMIN_AVAILABLE  # noqa: F401 - init app
+from ..db import (
+    MAX_BATCH_WRITES,
+    dead_letter_sink,
+    delivery_ledger,
+    get_college,
+    get_db_client,
+)
+from ..dead_letters import RetryPolicy
+from ..delivery_ledger import job_key
+from ..queues import get_job_queue
+from ..services.templates import get_template
+from ..config import (
+    EMAIL_WORKER_BATCH_SIZE,
+    EMAIL_WORKER_BATCH_WINDOW_MS,
+    EMAIL_WORKER_CONCURRENCY,
+    EMAIL_WORKER_DRAIN_SECONDS,
+    EMAIL_WORKER_MAX_BYTES,
+    EMAIL_WORKER_MAX_MESSAGES,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+    PUBSUB_EMAIL_TOPIC,
+)
 
-subscriber = pubsub_v1.SubscriberClient()
-db = firestore.client()
+log = logging.getLogger(__name__)
 
+db = get_db_client()
+ledger = delivery_ledger()
+retry = RetryPolicy(
+    PUBSUB_EMAIL_TOPIC,
+    dead_letter_sink(),
+    max_attempts=JOB_MAX_ATTEMPTS,
+    base=JOB_RETRY_BASE_SECONDS,
+    max_delay=JOB_RETRY_MAX_SECONDS,
+)
+_send_pool = ThreadPoolExecutor(
+    max_workers=EMAIL_WORKER_CONCURRENCY, thread_name_prefix="email-send"
+)
 
-def callback(message):
-    data = json.loads(message.data.decode("utf-8"))
-    # job structure: {alumniId, collegeId, template, vars}
-    alumniId = data.get("alumniId")
-    # fetch student email
-    doc = db.collection("scl_students").document(alumniId).get()
-    if not doc.exists:
+
+def _job_vars(job: dict, student: dict) -> dict:
+    """Per-recipient template variables: job vars, then the student doc."""
+    vars = dict(job.get("vars") or {})
+    vars.setdefault("name", student.get("firstName"))
+    vars.setdefault("alumniId", job.get("alumniId"))
+    vars.setdefault("email", student.get("email"))
+    vars.setdefault("template", job.get("template"))
+    return vars
+
+
+def _template_for(job: dict, student: dict):
+    """Return the compiled template for a job, bound to its college."""
+    template = get_template(job.get("template"), fallback="generic")
+    college_id = job.get("collegeId") or student.get("collegeId")
+    college = (job.get("vars") or {}).get("college")
+    if not college and college_id and "college" in template.fields:
+        # full read: served from the entity cache after the first job
+        # (masked reads bypass it)
+        college = (get_college(college_id) or {}).get("name")
+    return template.bind({"college": college}) if college else template
+
+
+def _send_job(job: dict, student: dict) -> int:
+    email = _template_for(job, student).render(_job_vars(job, student))
+    status, headers = send_email_direct(
+        student.get("email"), email.subject, email.text, email.html
+    )
+    return status
+
+
+def _ack(messages: list):
+    for message in messages:
         message.ack()
+
+
+def _retry(messages: list, error: Exception):
+    """Back off and redeliver, or dead-letter permanent/exhausted jobs."""
+    for message in messages:
+        retry.failed(message, error)
+
+
+def process_batch(messages: list):
+    """Send a batch of jobs with one student read and batched log writes.
+
+    Each message is still settled on its own: jobs already in the
+    delivery ledger or whose student is gone are acked, failures go to the
+    retry policy (backoff or dead letter), and sent jobs are acked once their
+    ``email_jobs`` entry and ledger key are committed (in as many batches as
+    MAX_BATCH_WRITES requires). Copies of one job
+    within a batch are sent once and settled together.
+    """
+    groups = {}
+    for message in messages:
+        try:
+            # job structure: {alumniId, collegeId, template, vars}
+            job = json.loads(message.data.decode("utf-8"))
+        except ValueError as e:
+            retry.failed(message, e)
+            continue
+        if "event" in job:
+            # student.updated events share the topic by default; not a job
+            message.ack()
+            continue
+        groups.setdefault(job_key(job), (job, []))[1].append(message)
+    if not groups:
         return
-    student = doc.to_dict()
-    to = student.get("email")
-    template = data.get("template")
-    vars = data.get("vars", {})
-    subject = f"{vars.get('college', 'College')}: {template}"
-    plain = f"Hi {vars.get('name', '')},\nPlease check your profile."
+    ids = {job.get("alumniId") for job, _ in groups.values()}
+    students = db.collection("scl_students")
     try:
-        status, headers = send_email_direct(to, subject, plain)
-        # log
-        db.collection("email_jobs").add({
-            "alumniId": alumniId,
-            "collegeId": data.get("collegeId"),
-            "template": template,
-            "status": "sent" if status in (200, 202) else "failed"
+        done = ledger.delivered(groups)
+        snaps = db.get_all(
+            [students.document(i) for i in ids if i],
+            field_paths=["email", "firstName", "collegeId"],
+        )
+        found = {snap.id: snap.to_dict() for snap in snaps if snap.exists}
+    except Exception as e:
+        log.exception("Lookup failed for %d email jobs", len(messages))
+        for _, group in groups.values():
+            _retry(group, e)
+        return
+
+    sends = []
+    for key, (job, group) in groups.items():
+        student = found.get(job.get("alumniId"))
+        if key in done or student is None:
+            _ack(group)
+            continue
+        future = _send_pool.submit(_send_job, job, student)
+        sends.append((key, job, group, future))
+
+    # one email_jobs entry plus one ledger key per job, committed in
+    # batches that stay under Firestore's write limit
+    logs = db.collection("email_jobs")
+    chunks, writes = [], MAX_BATCH_WRITES
+    for key, job, group, future in sends:
+        try:
+            status = future.result()
+        except Exception as e:
+            log.warning("Send failed for %s: %s", job.get("alumniId"), e)
+            _retry(group, e)
+            continue
+        if writes + 2 > MAX_BATCH_WRITES:
+            chunks.append((db.batch(), [], []))
+            writes = 0
+        batch, sent, delivered = chunks[-1]
+        ok = status in (200, 202, 250)
+        batch.set(logs.document(), {
+            "alumniId": job.get("alumniId"),
+            "collegeId": job.get("collegeId"),
+            "template": job.get("template"),
+            "status": "sent" if ok else "failed"
         })
-        message.ack()
-    except Exception:
-        # for simplicity, nack to retry
-        print("Send failed")
-        message.nack()
+        writes += 1
+        if ok:
+            ledger.record(batch, key)
+            delivered.append(key)
+            writes += 1
+        sent.extend(group)
+    for batch, sent, delivered in chunks:
+        try:
+            batch.commit()
+        except Exception as e:
+            log.exception("Could not log %d email jobs", len(sent))
+            _retry(sent, e)
+            continue
+        ledger.remember(delivered)
+        _ack(sent)
+
+
+class MicroBatcher:
+    """Collect messages until ``max_size`` or ``window`` seconds pass.
+
+    ``submit`` blocks the calling (subscriber callback) thread until the
+    batch holding its message has been processed, so a drained subscriber
+    has acked or nacked everything it leased.
+    """
+
+    def __init__(self, handle, max_size: int, window: float):
+        self.handle = handle
+        self.max_size = max(1, max_size)
+        self.window = window
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flushing = False
+        self.batches = 0
+
+    def submit(self, message):
+        done = threading.Event()
+        with self._cond:
+            self._pending.append((message, done))
+            if len(self._pending) >= self.max_size:
+                self._cond.notify_all()
+            leader = not self._flushing
+            if leader:
+                self._flushing = True
+        if leader:
+            self._lead()
+        done.wait()
+
+    def _lead(self):
+        """Wait out the window, then flush batches until none are left."""
+        deadline = time.monotonic() + self.window
+        with self._cond:
+            while len(self._pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        while True:
+            with self._cond:
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+                if not batch:
+                    self._flushing = False
+                    return
+            self.batches += 1
+            try:
+                self.handle([message for message, _ in batch])
+            except Exception as e:
+                log.exception("Email job batch failed")
+                _retry([message for message, _ in batch], e)
+            finally:
+                for _, done in batch:
+                    done.set()
+
+
+batcher = MicroBatcher(
+    process_batch,
+    EMAIL_WORKER_BATCH_SIZE,
+    EMAIL_WORKER_BATCH_WINDOW_MS / 1000.0,
+)
+
+
+def callback(message):
+    batcher.submit(message)
+
+
+def subscribe():
+    """Start consuming email jobs; returns the subscription future."""
+    # callbacks mostly wait for their batch, so every leased message gets
+    # a thread; the sends themselves run on _send_pool
+    return get_job_queue().subscribe(
+        PUBSUB_EMAIL_TOPIC,
+        callback,
+        max_messages=EMAIL_WORKER_MAX_MESSAGES,
+        max_bytes=EMAIL_WORKER_MAX_BYTES,
+        concurrency=EMAIL_WORKER_MAX_MESSAGES,
+    )
+
+
+def drain(future, timeout: float = EMAIL_WORKER_DRAIN_SECONDS):
+    """Stop pulling and wait up to ``timeout`` for in-flight jobs."""
+    future.cancel()
+    try:
+        future.result(timeout=timeout)
+    except TimeoutError:
+        log.warning(
+            "Jobs still running after %.0fs; exiting anyway", timeout
+        )
 
 
 def run_worker():
-    topic_path = subscriber.subscription_path(
-        PROJECT_ID, f"{PUBSUB_EMAIL_TOPIC}-sub"
+    streaming_pull_future = subscribe()
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    print(
+        "Listening for email jobs on", PUBSUB_EMAIL_TOPIC,
+        f"(concurrency {EMAIL_WORKER_CONCURRENCY}, "
+        f"batches of {EMAIL_WORKER_BATCH_SIZE})",
     )
-    streaming_pull_future = subscriber.subscribe(topic_path, callback=callback)
-    print("Listening for email jobs on", topic_path)
     try:
-        streaming_pull_future.result()
+        while not stop.is_set() and not streaming_pull_future.done():
+            stop.wait(1.0)
+        if streaming_pull_future.done():
+            # the stream failed on its own; surface the error
+            streaming_pull_future.result()
+        log.info("Stopping email worker; draining in-flight jobs")
+        drain(streaming_pull_future)
     except Exception:
         streaming_pull_future.cancel()
         raise
+    finally:
+        get_job_queue().close()
+        _send_pool.shutdown(wait=False)
+        close_smtp_pool()
 
 
 if __name__ == "__main__":
@@ -1,54 +1,216 @@
 # app/workers/parse_worker.py
-# Simple parse worker: download file from GCS and extract email/phone via regex
-from google.cloud import pubsub_v1
-from google.cloud import storage
-from google.cloud import firestore
-
+# Simple parse worker: stream a file from GCS and extract email/phone via
+# regex, chunk by chunk (see services/text_scan.py), so memory per job stays
+# bounded and scanning starts with the first chunk. PDF/DOCX resumes are
+# converted to text in a process pool first (services/extract.py), and
+# files parsed before are served from services/resume_cache.py.
+import hashlib
+import itertools
 import json
+import logging
 import re
-from ..config import PROJECT_ID, PUBSUB_PARSE_TOPIC
+import threading
+from ..auth import FIREBASE_ADMIN_AVAILABLE  # noqa: F401 - init app
+from ..db import dead_letter_sink, get_db_client
+from ..dead_letters import PermanentJobError, RetryPolicy
+from ..queues import get_job_queue
+from ..services.extract import ExtractionPool, detect_format
+from ..services.resume_service import (
+    get_resume_cache,
+    parse_resume_text,
+)
+from ..services.text_scan import StreamScanner, iter_text
+from ..config import (
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+    PUBSUB_PARSE_TOPIC,
+    RESUME_CHUNK_BYTES,
+    RESUME_EXTRACT_MEMORY_MB,
+    RESUME_EXTRACT_TIMEOUT_SECONDS,
+    RESUME_EXTRACT_WORKERS,
+    RESUME_MAX_BYTES,
+    RESUME_MAX_TEXT_CHARS,
+    RESUME_SCAN_OVERLAP,
+)
+
+log = logging.getLogger(__name__)
+
+db = get_db_client()
+# missing files and bad paths are dead-lettered at once, others retried
+retry = RetryPolicy(
+    PUBSUB_PARSE_TOPIC,
+    dead_letter_sink(),
+    max_attempts=JOB_MAX_ATTEMPTS,
+    base=JOB_RETRY_BASE_SECONDS,
+    max_delay=JOB_RETRY_MAX_SECONDS,
+)
+extraction_pool = ExtractionPool(
+    workers=RESUME_EXTRACT_WORKERS,
+    timeout=RESUME_EXTRACT_TIMEOUT_SECONDS,
+    memory_mb=RESUME_EXTRACT_MEMORY_MB,
+    max_chars=RESUME_MAX_TEXT_CHARS,
+)
+storage_client = None
+_storage_lock = threading.Lock()
+
+
+def _get_storage_client():
+    """Create the GCS client on first use, not at import."""
+    global storage_client
+    if storage_client is None:
+        with _storage_lock:
+            if storage_client is None:
+                from google.cloud import storage  # type: ignore
+                storage_client = storage.Client()
+    return storage_client
 
-subscriber = pubsub_v1.SubscriberClient()
-storage_client = storage.Client()
-db = firestore.client()
 
 EMAIL_RE = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
 PHONE_RE = re.compile(r"(\+?\d{10,15})")
 
 
+def _split_path(resume_path) -> tuple:
+    """Return (bucket, object) for 'gs://bucket/path' or 'bucket/path'."""
+    if not isinstance(resume_path, str):
+        raise PermanentJobError(f"Parse job has no path: {resume_path!r}")
+    bucket_name, _, file_path = resume_path.replace("gs://", "").partition(
+        "/"
+    )
+    if not bucket_name or not file_path:
+        raise PermanentJobError(f"Invalid resume path: {resume_path!r}")
+    return bucket_name, file_path
+
+
+def _stream_blob(bucket_name: str, file_path: str):
+    """Yield the object's bytes in RESUME_CHUNK_BYTES pieces.
+
+    The size is checked against RESUME_MAX_BYTES before downloading and
+    again while reading, so an object replaced mid-download can't exceed
+    it either.
+    """
+    bucket = _get_storage_client().bucket(bucket_name)
+    blob = bucket.get_blob(file_path)
+    if blob is None:
+        raise PermanentJobError(f"Resume not found: {file_path}")
+    if blob.size is not None and blob.size > RESUME_MAX_BYTES:
+        raise PermanentJobError(
+            f"Resume is {blob.size} bytes; the limit is {RESUME_MAX_BYTES}"
+        )
+    read = 0
+    with blob.open("rb", chunk_size=RESUME_CHUNK_BYTES) as reader:
+        while True:
+            chunk = reader.read(RESUME_CHUNK_BYTES)
+            if not chunk:
+                return
+            read += len(chunk)
+            if read > RESUME_MAX_BYTES:
+                raise PermanentJobError(
+                    f"Resume exceeds the {RESUME_MAX_BYTES} byte limit"
+                )
+            yield chunk
+
+
+def _hashed(chunks, digest):
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _parse_blob(bucket_name: str, file_path: str) -> tuple:
+    """Return (cache key, cache entry, cached) for a resume object.
+
+    Plain text is scanned while it streams in; PDF and DOCX are read whole
+    (at most RESUME_MAX_BYTES) and turned into text in the extraction
+    pool. Either way the text goes through the email/phone regexes and
+    resume_service.parse_resume_text (its first RESUME_MAX_TEXT_CHARS).
+    The bytes are hashed as they arrive, and a file parsed before by the
+    same PARSER_VERSION skips extraction and parsing (``cached`` is True).
+    """
+    digest = hashlib.sha256()
+    chunks = _hashed(_stream_blob(bucket_name, file_path), digest)
+    first = next(chunks, b"")
+    fmt = detect_format(first, file_path)
+    scanner = StreamScanner(
+        {"emails": EMAIL_RE, "phones": PHONE_RE},
+        overlap=RESUME_SCAN_OVERLAP,
+    )
+    if fmt == "text":
+        head, kept = [], 0
+        for text in iter_text(itertools.chain([first], chunks)):
+            scanner.feed(text)
+            if kept < RESUME_MAX_TEXT_CHARS:
+                head.append(text[:RESUME_MAX_TEXT_CHARS - kept])
+                kept += len(head[-1])
+        text = "".join(head)
+    else:
+        data = b"".join(itertools.chain([first], chunks))
+    cache = get_resume_cache()
+    key = cache.key("file", digest.hexdigest())
+    entry = cache.get(key)
+    if entry is not None:
+        return key, entry, True
+    if fmt != "text":
+        text = extraction_pool.extract(data, fmt)
+        scanner.feed(text)
+    parsed = scanner.close()
+    parsed.update(parse_resume_text(text))
+    return key, {"format": fmt, "parsed": parsed}, False
+
+
 def callback(message):
-    data = json.loads(message.data.decode("utf-8"))
-    resume_path = data.get("path")  # expects 'resumes/{alumniId}/{filename}'
-    alumniId = data.get("alumniId")
     try:
-        bucket_name, *rest = resume_path.replace("gs://", "").split("/", 1)
-        file_path = rest[0]
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-        content = blob.download_as_text(errors="ignore")
-        emails = EMAIL_RE.findall(content)
-        phones = PHONE_RE.findall(content)
-        parsed = {"emails": emails, "phones": phones}
-        # save
-        db.collection("resumes").add({
+        data = json.loads(message.data.decode("utf-8"))
+        resume_path = data.get("path")  # 'resumes/{alumniId}/{filename}'
+        alumniId = data.get("alumniId")
+        bucket_name, file_path = _split_path(resume_path)
+        key, entry, cached = _parse_blob(bucket_name, file_path)
+        if cached and alumniId and alumniId in (entry.get("resumes") or {}):
+            # same file already saved for this student
+            message.ack()
+            return
+        # save the resume and remember it in the cache in one write
+        ref = db.collection("resumes").document()
+        batch = db.batch()
+        batch.set(ref, {
             "alumniId": alumniId,
             "storagePath": resume_path,
-            "parsedJson": parsed,
+            "format": entry.get("format"),
+            "parsedJson": entry.get("parsed"),
             "confidence": 0.7,
             "accepted": False
         })
+        update = {"resumes": {alumniId: ref.id}} if alumniId else {}
+        if not cached:
+            update.update(format=entry["format"], parsed=entry["parsed"])
+        cache = get_resume_cache()
+        cache.put(key, update, batch)
+        batch.commit()
+        cache.remember(key, update)
         message.ack()
     except Exception as e:
-        print("Parse failed", e)
-        message.nack()
+        log.warning("Parse failed: %s", e)
+        retry.failed(message, e)
+
+
+def subscribe():
+    """Start consuming parse jobs; returns the subscription future."""
+    return get_job_queue().subscribe(PUBSUB_PARSE_TOPIC, callback)
+
+
+def drain(future, timeout: float = 30.0):
+    """Stop pulling and wait up to ``timeout`` for in-flight parses."""
+    future.cancel()
+    try:
+        future.result(timeout=timeout)
+    except TimeoutError:
+        log.warning("Parse jobs still running after %.0fs", timeout)
+    extraction_pool.close()
 
 
 def run_worker():
-    topic_path = subscriber.subscription_path(
-        PROJECT_ID, f"{PUBSUB_PARSE_TOPIC}-sub"
-    )
-    streaming_pull_future = subscriber.subscribe(topic_path, callback=callback)
-    print("Listening for parse jobs on", topic_path)
+    streaming_pull_future = subscribe()
+    print("Listening for parse jobs on", PUBSUB_PARSE_TOPIC)
     try:
         streaming_pull_future.result()
     except Exception:
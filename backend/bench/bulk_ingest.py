@@ -0,0 +1,84 @@
+# bench/bulk_ingest.py
+"""Throughput benchmark for the bulk student import.
+
+Compares the old one-``set``-per-row loop with ``ingest_students`` against
+the in-memory storage backend, which charges a fixed simulated round trip
+per call. Run from the backend directory:
+
+    python -m bench.bulk_ingest --rows 5000 --rtt-ms 20
+
+Set FIRESTORE_EMULATOR_HOST and pass ``--emulator`` to run against the
+Firestore emulator instead.
+"""
+import argparse
+import time
+
+from app import db
+from app.services import ingest_service
+from app.storage.memory import MemoryClient
+
+
+def _rows(n: int):
+    return [
+        {
+            "firstName": f"Student{i}",
+            "lastName": "Bench",
+            "email": f"student{i}@example.edu",
+        }
+        for i in range(n)
+    ]
+
+
+def _serial(rows, college_id):
+    for row in rows:
+        db.create_student_doc(dict(row, collegeId=college_id))
+
+
+def _report(label, n, elapsed, calls):
+    rate = n / elapsed if elapsed else float("inf")
+    print(
+        f"{label:<10} rows={n:<6} time={elapsed:7.2f}s "
+        f"rows/s={rate:9.1f} round_trips={calls}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--batch-size", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-serial", action="store_true")
+    parser.add_argument("--emulator", action="store_true")
+    args = parser.parse_args()
+
+    rows = _rows(args.rows)
+    store = None
+    if not args.emulator:
+        store = MemoryClient(rtt_ms=args.rtt_ms)
+        db.db = store
+
+    if not args.skip_serial:
+        before = store.round_trips if store else 0
+        t0 = time.perf_counter()
+        _serial(rows, "bench-college")
+        calls = (store.round_trips - before) if store else "n/a"
+        _report("serial", len(rows), time.perf_counter() - t0, calls)
+
+    before = store.round_trips if store else 0
+    t0 = time.perf_counter()
+    summary = ingest_service.ingest_students(
+        rows,
+        "bench-college",
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        send_onboarding=False,
+    )
+    calls = (store.round_trips - before) if store else "n/a"
+    _report("batched", len(rows), time.perf_counter() - t0, calls)
+    if summary["failedCount"]:
+        print(f"failed rows: {summary['failedCount']}")
+
+
+if __name__ == "__main__":
+    main()
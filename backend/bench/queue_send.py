@@ -0,0 +1,108 @@
+# bench/queue_send.py
+"""End-to-end enqueue -> send throughput of the email worker, offline.
+
+Creates ``--jobs`` students in the in-memory storage backend (with
+``--rtt-ms`` of simulated round trip per storage call), enqueues one
+onboarding job each through ``enqueue_email_job`` on a local job queue
+(``--queue memory`` or ``spool``), and runs the email worker in-process
+against the local SMTP sink from bench.smtp_send until every message has
+arrived. Send rate limits are disabled. Run from the backend directory:
+
+    python -m bench.queue_send --jobs 2000 --queue spool --rtt-ms 10
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from bench.smtp_send import _Sink
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument(
+        "--queue", choices=["memory", "spool"], default="memory"
+    )
+    parser.add_argument("--rtt-ms", type=float, default=10.0)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    sink = _Sink(args.handshake_ms)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    host, port = sink.server_address
+    spool = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+    spool.close()
+    # config is read at import time
+    os.environ.update(
+        STORAGE_BACKEND="memory",
+        STORAGE_SIMULATED_RTT_MS=str(args.rtt_ms),
+        JOB_QUEUE_BACKEND=args.queue,
+        JOB_QUEUE_PATH=spool.name,
+        JOB_QUEUE_RUN_WORKERS="0",
+        SMTP_HOST=host,
+        SMTP_PORT=str(port),
+        SMTP_USERNAME="bench",
+        SMTP_PASSWORD="bench",
+        EMAIL_RATE_LIMITS="",
+        EMAIL_WORKER_BATCH_SIZE=str(args.batch_size),
+        EMAIL_WORKER_CONCURRENCY=str(args.concurrency),
+    )
+    from app import db
+    from app.queues import get_job_queue
+    from app.services.email_service import enqueue_email_job
+    from app.workers import email_worker
+
+    client = db.get_db_client()
+    ids = []
+    for start in range(0, args.jobs, 400):
+        created = db.create_student_docs([
+            {
+                "firstName": f"Student{i}",
+                "email": f"student{i}@example.edu",
+                "collegeId": "bench-college",
+            }
+            for i in range(start, min(args.jobs, start + 400))
+        ])
+        ids.extend(doc["alumniId"] for doc in created)
+
+    t0 = time.perf_counter()
+    for alumni_id in ids:
+        enqueue_email_job({
+            "alumniId": alumni_id,
+            "collegeId": "bench-college",
+            "template": "onboarding",
+            "vars": {"college": "Bench College"},
+        })
+    enqueued = time.perf_counter() - t0
+
+    trips = client.round_trips
+    t1 = time.perf_counter()
+    future = email_worker.subscribe()
+    deadline = t1 + args.timeout
+    while sink.received < len(ids) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t1
+    email_worker.drain(future, timeout=10.0)
+    trips = client.round_trips - trips
+    sink.shutdown()
+    os.unlink(spool.name)
+
+    n = sink.received
+    print(
+        f"queue={args.queue} jobs={len(ids)} "
+        f"enqueue/s={len(ids) / enqueued:9.1f}"
+    )
+    print(
+        f"sent={n} time={elapsed:7.2f}s sends/s={n / elapsed:8.1f} "
+        f"batches={email_worker.batcher.batches} storage_round_trips={trips}"
+    )
+    print(f"queue stats: {get_job_queue().stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# bench/routes.py
+"""Request throughput for the main API routes on a laptop.
+
+Runs the FastAPI app in-process (TestClient) on the in-memory storage
+backend with auth bypassed, seeds students, then times GET, PATCH and
+bulk-email preview requests. Run from the backend directory:
+
+    python -m bench.routes --students 2000 --requests 2000 --rtt-ms 0
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("DEV_AUTH_BYPASS", "1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import db  # noqa: E402
+from app.main import app  # noqa: E402
+
+HEADERS = {"Authorization": "Bearer bench"}
+
+
+def _timed(label: str, n: int, fn):
+    store = db.get_db_client()
+    before = store.round_trips
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{label:<16} requests={n:<6} time={elapsed:7.2f}s "
+        f"req/s={n / elapsed:9.1f} round_trips={store.round_trips - before}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    store = db.get_db_client()
+    store._rtt = args.rtt_ms / 1000.0
+    # No Pub/Sub locally; keep publish attempts out of the measurement.
+    db.publish_student_updated = lambda *a, **k: None
+
+    rows = [
+        {"firstName": f"S{i}", "email": f"s{i}@example.edu",
+         "schoolId": "bench-school"}
+        for i in range(args.students)
+    ]
+    # leave room for the recipient-index writes in each batch
+    ids = db.create_student_docs(rows[:400])
+    for start in range(400, len(rows), 400):
+        ids += db.create_student_docs(rows[start:start + 400])
+    ids = [d["alumniId"] for d in ids]
+    versions = {a: 1 for a in ids}
+
+    with TestClient(app) as client:
+        def get(i):
+            r = client.get(f"/scl/students/{ids[i % len(ids)]}",
+                           headers=HEADERS)
+            assert r.status_code == 200, r.text
+
+        def patch(i):
+            alumni_id = ids[i % len(ids)]
+            r = client.patch(
+                f"/scl/students/{alumni_id}",
+                headers=HEADERS,
+                json={"changes": {"bio": f"v{i}"},
+                      "version": versions[alumni_id]},
+            )
+            assert r.status_code == 200, r.text
+            versions[alumni_id] = r.json()["student"]["version"]
+
+        def preview(i):
+            r = client.post(
+                "/bulk-email",
+                headers=HEADERS,
+                json={"subject": "s", "body": "b", "scope": "school",
+                      "targetId": "bench-school", "previewOnly": True},
+            )
+            assert r.status_code == 200, r.text
+
+        _timed("GET student", args.requests, get)
+        _timed("PATCH student", args.requests, patch)
+        _timed("bulk preview", max(1, args.requests // 50), preview)
+    db.audit_writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# bench/smtp_send.py
+"""Messages/second of ``send_email_direct`` over SMTP against a local sink.
+
+Starts a minimal SMTP server on localhost that accepts every message and
+adds ``--handshake-ms`` of latency to EHLO and AUTH, standing in for the
+TLS and login round trips of a real provider. It then sends ``--messages``
+onboarding-sized emails with a new session per message (the old behaviour,
+a pool whose sessions carry one message) and with the session pool. Run
+from the backend directory:
+
+    python -m bench.smtp_send --messages 500 --threads 4 --handshake-ms 30
+"""
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, AUTH, MAIL, RCPT, DATA, NOOP."""
+
+    def _reply(self, line: str):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        delay = self.server.handshake_delay
+        self._reply("220 bench-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode("ascii", "replace").strip().split(" ")[0]
+            verb = verb.upper()
+            if verb in ("EHLO", "HELO"):
+                time.sleep(delay)
+                self._reply("250-bench-sink")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                time.sleep(delay)
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.received += 1
+                self._reply("250 2.0.0 Ok: queued")
+            elif verb == "QUIT":
+                self._reply("221 2.0.0 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self._reply("250 2.0.0 Ok")
+
+
+class _Sink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_ms: float):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.handshake_delay = handshake_ms / 1000.0
+        self.received = 0
+
+
+def _run(label, email_service, pool, messages, threads):
+    email_service.smtp_pool = pool
+    per_thread = messages // threads
+    errors = []
+
+    def _worker(n):
+        for i in range(per_thread):
+            try:
+                email_service.send_email_direct(
+                    f"student{n}-{i}@example.edu",
+                    "Welcome to Alumni Connect",
+                    "Hello, your alumni id is ABC123.",
+                )
+            except Exception as e:
+                errors.append(e)
+
+    workers = [
+        threading.Thread(target=_worker, args=(n,)) for n in range(threads)
+    ]
+    t0 = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    pool.close()
+    sent = per_thread * threads - len(errors)
+    stats = pool.stats()
+    print(
+        f"{label:<12} msgs={sent:<6} time={elapsed:7.2f}s "
+        f"msgs/s={sent / elapsed:8.1f} connects={stats['connects']} "
+        f"errors={len(errors)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    parser.add_argument("--max-messages", type=int, default=100)
+    args = parser.parse_args()
+
+    sink = _Sink(args.handshake_ms)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    host, port = sink.server_address
+    # email_service reads SMTP settings from config at import time
+    os.environ.update(
+        SMTP_HOST=host,
+        SMTP_PORT=str(port),
+        SMTP_USERNAME="bench",
+        SMTP_PASSWORD="bench",
+    )
+    from app.services import email_service
+    from app.smtp_pool import SMTPPool
+
+    def _pool(max_messages):
+        return SMTPPool(
+            host, port, "bench", "bench",
+            max_size=args.threads, max_messages=max_messages,
+        )
+
+    _run(
+        "per-message", email_service, _pool(1), args.messages, args.threads
+    )
+    _run(
+        "pooled", email_service, _pool(args.max_messages), args.messages,
+        args.threads,
+    )
+    sink.shutdown()
+    print(f"sink received {sink.received} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/taxonomy_match.py
+"""Resume keyword matching time as the skill taxonomy grows, offline.
+
+Pads the bundled taxonomy with ``--sizes`` synthetic skills (random
+lower-case terms of one to three words) and times ``Taxonomy.find`` over
+a resume-like text of ``--chars`` characters, best of ``--repeat`` runs.
+Matching time should stay roughly flat across sizes; compile time grows
+with the taxonomy but is paid once per process. Run from the backend
+directory:
+
+    python -m bench.taxonomy_match --sizes 0 1000 10000 50000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.services.taxonomy import DEFAULT_PATH, Taxonomy
+
+_SAMPLE = (
+    "B.Tech in Computer Science and Engineering, 2019 - 2023. Built REST "
+    "APIs with Python, FastAPI and PostgreSQL; deployed on AWS with Docker "
+    "and Kubernetes. Interned at a fintech where it was my job to tune "
+    "SQL queries, write React.js dashboards and automate tests in pytest. "
+)
+
+
+def _word(rng) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[0, 1000, 10000, 50000]
+    )
+    parser.add_argument("--chars", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(DEFAULT_PATH, encoding="utf-8") as f:
+        base = json.load(f)
+    text = (_SAMPLE * (args.chars // len(_SAMPLE) + 1))[:args.chars]
+    rng = random.Random(0)
+    for size in args.sizes:
+        data = {k: dict(v) for k, v in base.items()}
+        for i in range(size):
+            term = " ".join(_word(rng) for _ in range(rng.randint(1, 3)))
+            data["skills"][f"Synthetic {i}"] = [term]
+        t0 = time.perf_counter()
+        taxonomy = Taxonomy(data)
+        compiled = time.perf_counter() - t0
+        best = float("inf")
+        for _ in range(args.repeat):
+            t1 = time.perf_counter()
+            found = taxonomy.find(text)
+            best = min(best, time.perf_counter() - t1)
+        print(
+            f"terms={taxonomy.terms:6d} compile={compiled * 1000:8.1f}ms "
+            f"match={best * 1000:7.1f}ms "
+            f"({args.chars / best / 1e6:5.1f}M chars/s) "
+            f"skills={len(found['skills'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
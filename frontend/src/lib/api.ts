@@ -56,3 +56,28 @@ export async function triggerBulkEmail(params: {
   }
   return res.json();
 }
+
+// Bulk email sends run as background jobs: POST /bulk-email returns a jobId
+// and GET /bulk-email/{jobId} reports progress. Polls until the job reaches
+// a final status and resolves with the final job snapshot.
+export async function waitForBulkEmailJob(
+  jobId: string,
+  idToken: string,
+  onProgress?: (job: any) => void,
+  intervalMs = 2000,
+) {
+  const finalStatuses = ['completed', 'failed', 'cancelled', 'interrupted'];
+  for (;;) {
+    const res = await fetch(makeUrl(`/bulk-email/${jobId}`), {
+      headers: { Authorization: `Bearer ${idToken}` },
+    });
+    if (!res.ok) {
+      const txt = await res.text();
+      throw new Error(`BulkEmail ${res.status}: ${txt}`);
+    }
+    const { job } = await res.json();
+    onProgress?.(job);
+    if (finalStatuses.includes(job.status)) return job;
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
@@ -4,6 +4,7 @@ import useCollegeStudents from "../../hooks/useCollegeStudents";
 import useAuth from "../../hooks/useAuth";
 import { collection, addDoc, doc } from "firebase/firestore";
 import { db } from "../../lib/firebase";
+import { waitForBulkEmailJob } from "../../lib/api";
 
 export default function AdminDashboard() {
   const { user, loading: authLoading } = useAuth();
@@ -88,9 +89,16 @@ export default function AdminDashboard() {
       if (!resp.ok || !data.ok) {
         throw new Error(data.detail || data.message || 'Bulk email failed');
       }
-      setBulkStatus(`Sent ${data.sent} emails (skipped ${data.skipped})`);
       setBulkSubject('');
       setBulkBody('');
+      setBulkStatus('Bulk email queued…');
+      const job = await waitForBulkEmailJob(data.jobId, idToken, (j) =>
+        setBulkStatus(`Sending… ${j.counts.sent} sent, ${j.counts.failed} failed`)
+      );
+      if (job.status !== 'completed') {
+        throw new Error(job.errors?.[0] || job.message || `Bulk email ${job.status}`);
+      }
+      setBulkStatus(`Sent ${job.counts.sent} emails (skipped ${job.counts.skipped})`);
     } catch (err: any) {
       setBulkStatus(`Error: ${err.message}`);
     } finally {
@@ -3,6 +3,7 @@ import React, { useState, useEffect } from "react";
 import useAuth from "../../hooks/useAuth";
 import { collection, addDoc, doc, query, where, onSnapshot } from "firebase/firestore";
 import { db } from "../../lib/firebase";
+import { waitForBulkEmailJob } from "../../lib/api";
 import { Link } from "react-router-dom";
 
 export default function SchoolDashboard() {
@@ -234,9 +235,16 @@ export default function SchoolDashboard() {
       if (!resp.ok || !data.ok) {
         throw new Error(data.detail || data.message || 'Bulk email failed');
       }
-      setBulkStatus(`Sent ${data.sent} emails (skipped ${data.skipped})`);
       setBulkSubject('');
       setBulkBody('');
+      setBulkStatus('Bulk email queued…');
+      const job = await waitForBulkEmailJob(data.jobId, idToken, (j) =>
+        setBulkStatus(`Sending… ${j.counts.sent} sent, ${j.counts.failed} failed`)
+      );
+      if (job.status !== 'completed') {
+        throw new Error(job.errors?.[0] || job.message || `Bulk email ${job.status}`);
+      }
+      setBulkStatus(`Sent ${job.counts.sent} emails (skipped ${job.counts.skipped})`);
     } catch (err: any) {
       setBulkStatus(`Error: ${err.message}`);
     } finally {